@@ -16,6 +16,7 @@ import {
     View,
     Animated
 } from 'react-native';
+import { flushSalesQueue, newIdempotencyKey, queueSale } from '../../../components/salesQueue';
 
 const SALE_API_URL = 'http://127.0.0.1:8080/sales/';
 const PRODUCTS_API_URL = 'http://127.0.0.1:8080/api/products/'; 
@@ -86,6 +87,18 @@ const RecordSaleScreen = () => {
 
             setProducts(prodData || []);
             setCustomers(custData || []);
+
+            // Back online: upload sales recorded while offline, one request
+            try {
+                const { synced, rejected } = await flushSalesQueue(token);
+                if (rejected.length > 0) {
+                    triggerToast(`${rejected.length} offline sale(s) were refused: ${JSON.stringify(rejected[0].errors)}`);
+                } else if (synced > 0) {
+                    triggerToast(`${synced} offline sale(s) synced`, "info");
+                }
+            } catch (e) {
+                // Still queued, next time
+            }
         } catch (e) {
             triggerToast("Network Error: Could not load data");
         }
@@ -127,6 +140,7 @@ const RecordSaleScreen = () => {
             const token = await AsyncStorage.getItem('@authToken');
             
             const saleData = {
+                idempotency_key: newIdempotencyKey(),
                 customer_id: selectedCustomer?.id || null,
                 customer_name: customerSearch || "Walking Customer",
                 transaction_date: new Date().toISOString(),
@@ -138,26 +152,36 @@ const RecordSaleScreen = () => {
                 total_amount: totalAmount.toFixed(2)
             };
 
-            const response = await fetch(SALE_API_URL, {
-                method: 'POST',
-                headers: { 
-                    'Content-Type': 'application/json', 
-                    'Authorization': `Bearer ${token}` 
-                },
-                body: JSON.stringify(saleData),
-            });
+            let response;
+            try {
+                response = await fetch(SALE_API_URL, {
+                    method: 'POST',
+                    headers: { 
+                        'Content-Type': 'application/json', 
+                        'Authorization': `Bearer ${token}` 
+                    },
+                    body: JSON.stringify(saleData),
+                });
+            } catch (networkError) {
+                // Offline (fetch only rejects when no response came back):
+                // keep it, it's uploaded with the rest of the queue next
+                // time this screen loads with a connection
+                await queueSale(saleData);
+                return triggerToast("Offline: sale saved and will sync when back online", "success");
+            }
 
             if (response.status === 401) return handleAuthError();
 
             if (response.ok) {
                 triggerToast("Sale recorded successfully!", "success");
             } else {
-                const err = await response.json();
-                // Show server validation errors
+                // Show server validation errors; the server answered, so
+                // queueing it would only be refused again
+                const err = await response.json().catch(() => ({ error: `Server error (${response.status})` }));
                 triggerToast(JSON.stringify(err));
             }
         } catch (error) {
-            triggerToast("Network Error: Check server status");
+            triggerToast(`Could not record the sale: ${error instanceof Error ? error.message : error}`);
         } finally {
             setIsLoading(false);
         }
@@ -170,9 +194,9 @@ const RecordSaleScreen = () => {
             {toast.visible && (
                 <Animated.View style={[
                     styles.toast, 
-                    { opacity: fadeAnim, backgroundColor: toast.type === 'success' ? '#34C759' : '#FF3B30' }
+                    { opacity: fadeAnim, backgroundColor: toast.type === 'success' ? '#34C759' : toast.type === 'info' ? '#007AFF' : '#FF3B30' }
                 ]}>
-                    <Ionicons name={toast.type === 'success' ? "checkmark-circle" : "alert-circle"} size={20} color="#fff" />
+                    <Ionicons name={toast.type === 'error' ? "alert-circle" : "checkmark-circle"} size={20} color="#fff" />
                     <Text style={styles.toastText}>{toast.message}</Text>
                 </Animated.View>
             )}
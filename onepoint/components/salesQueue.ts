@@ -0,0 +1,78 @@
+// salesQueue.ts
+// Checkouts recorded while the till is offline. Each one keeps the
+// idempotency key it was created with, so uploading the queue twice (say the
+// connection drops before the response arrives) never records a sale twice.
+import AsyncStorage from '@react-native-async-storage/async-storage';
+import * as Crypto from 'expo-crypto';
+
+const QUEUE_KEY = '@pendingSales';
+const SYNC_API_URL = 'http://127.0.0.1:8080/orders_api/sync/';
+const MAX_BATCH = 500; // same limit as the server
+
+export interface QueuedSale {
+  idempotency_key: string;
+  customer_name: string;
+  transaction_date: string;
+  total_amount: string;
+  items: { product: string | number; quantity_sold: number; price_per_unit: string }[];
+}
+
+interface SyncResult {
+  idempotency_key: string;
+  status: 'created' | 'duplicate' | 'rejected';
+  order: number | null;
+  errors?: unknown;
+}
+
+export const newIdempotencyKey = () => Crypto.randomUUID();
+
+async function readQueue(): Promise<QueuedSale[]> {
+  const raw = await AsyncStorage.getItem(QUEUE_KEY);
+  return raw ? JSON.parse(raw) : [];
+}
+
+export async function queueSale(sale: QueuedSale) {
+  const queue = await readQueue();
+  queue.push(sale);
+  await AsyncStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+}
+
+export async function pendingSalesCount() {
+  return (await readQueue()).length;
+}
+
+// Upload the queue, MAX_BATCH checkouts per request. Recorded (or already
+// recorded) checkouts leave the queue; rejected ones are returned so the
+// screen can tell the cashier, and dropped since resending can't fix them.
+// Throws on network errors with the queue untouched.
+export async function flushSalesQueue(token: string) {
+  const rejected: SyncResult[] = [];
+  let synced = 0;
+  let queue = await readQueue();
+  while (queue.length > 0) {
+    const batch = queue.slice(0, MAX_BATCH);
+    const response = await fetch(SYNC_API_URL, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${token}`,
+      },
+      body: JSON.stringify({ transactions: batch }),
+    });
+    if (!response.ok) {
+      throw new Error(`Sync failed with status ${response.status}`);
+    }
+    const { results } = await response.json();
+    const done = new Set<string>();
+    for (const result of results as SyncResult[]) {
+      done.add(result.idempotency_key);
+      if (result.status === 'rejected') rejected.push(result);
+      else synced += 1;
+    }
+    // Sales queued while this batch was in flight stay in the queue
+    queue = (await readQueue()).filter(sale => !done.has(sale.idempotency_key));
+    await AsyncStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+    if (done.size === 0) break;
+  }
+  return { synced, rejected };
+}
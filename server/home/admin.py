@@ -1,5 +1,6 @@
+from django import forms
 from django.contrib import admin
-from .models import Product, Vehicle, Sale, Customer,Business
+from .models import InsufficientStock, Product, Vehicle, Sale, Customer,Business
 
 admin.site.register(Vehicle)
 admin.site.register(Customer)
@@ -12,7 +13,24 @@ class ProductAdmin(admin.ModelAdmin):
     ordering = ('name',)
     
 
+class SaleAdminForm(forms.ModelForm):
+    class Meta:
+        model = Sale
+        fields = '__all__'
+
+    def clean(self):
+        # Friendly error for the common case, Sale.save() still does the
+        # atomic check if someone sells the units in between
+        cleaned_data = super().clean()
+        product = cleaned_data.get('product')
+        quantity_sold = cleaned_data.get('quantity_sold')
+        if self.instance._state.adding and product and quantity_sold and quantity_sold > (product.quantity or 0):
+            raise forms.ValidationError(InsufficientStock.message)
+        return cleaned_data
+
+
 class SaleAdmin(admin.ModelAdmin):
+    form = SaleAdminForm
     list_display = ( 'quantity_sold', 'date_sold', 'aproved')
     list_display = ('product', 'quantity_sold', 'created_by','date_sold', 'customer', 'aproved')
     search_fields = ( 'quantity_sold', 'date_sold', 'aproved')
@@ -0,0 +1,84 @@
+"""
+Bulk approval queue: approve or reject many of a user's pending sales with
+one UPDATE and one notification, instead of a get + save + signal per sale.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import list_cache, rollups, stock
+from .models import Sale
+from .notifications import notify_user
+
+APPROVE = 'approve'
+REJECT = 'reject'
+
+# Soft-deleted sales are out of the queue: nothing counts them, so approving
+# one would add it to the rollups and the leaderboard behind a rebuild's back
+PENDING = Q(aproved=False, rejected=False, deleted=False)
+
+
+def pending_sales(user):
+    """The approval queue of `user`: pending sales of the products they own."""
+    return Sale.objects.filter(PENDING, product__created_by=user)
+
+
+def review_sales(user, action, ids=None, before=None):
+    """
+    Approve or reject `user`'s pending sales, picked by `ids` or by
+    date_sold < `before`. Sales outside the queue (someone else's, already
+    reviewed) are left alone.
+
+    Returns (count, total_amount) of the sales that changed.
+    """
+    sales = pending_sales(user)
+    if ids is not None:
+        sales = sales.filter(id__in=ids)
+    if before is not None:
+        sales = sales.filter(date_sold__lt=before)
+
+    with transaction.atomic():
+        # Lock the rows we are about to flip so the totals we report are
+        # exactly what the UPDATE changed
+        rows = list(
+            sales.select_for_update(of=('self',))
+            .values_list('id', 'total_amount', 'product__business_id', 'product__created_by_id',
+                         'product_id', 'date_sold', 'quantity_sold')
+        )
+        if not rows:
+            return 0, 0
+        changes = {'aproved': True} if action == APPROVE else {'rejected': True}
+        Sale.objects.filter(id__in=[row[0] for row in rows]).update(updated_at=timezone.now(), **changes)
+
+        # update() sends no signals and skips Sale.save(), do what
+        # clear_sales_cache and the rollup bookkeeping would have
+        if action == APPROVE:
+            # pending sales aren't in the rollups, approved ones are
+            deltas = defaultdict(lambda: [0, 0, 0])
+            for _, total_amount, _, _, product_id, date_sold, quantity_sold in rows:
+                delta = deltas[(product_id, date_sold)]
+                delta[0] += 1
+                delta[1] += quantity_sold
+                delta[2] += total_amount
+            rollups.apply(deltas)
+        else:
+            # Rejected sales give their units back
+            stock.reverse_sales([
+                (sale_id, product_id, quantity_sold, total_amount)
+                for sale_id, total_amount, _, _, product_id, _, quantity_sold in rows
+            ])
+        cache.delete('sales_summary')
+        list_cache.bump_on_commit(*{
+            scope for _, _, business_id, created_by_id, *_ in rows
+            for scope in list_cache.product_scopes(business_id, created_by_id)
+        })
+
+        count = len(rows)
+        total = sum(row[1] for row in rows)
+        verb = 'approved' if action == APPROVE else 'rejected'
+        message = f"{count} sale{'s' if count != 1 else ''} {verb} ({total:,.2f})."
+        transaction.on_commit(lambda: notify_user(user.pk, message))
+    return count, total
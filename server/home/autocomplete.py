@@ -0,0 +1,240 @@
+"""
+In-process prefix index for part number / name autocomplete.
+
+One index per scope (the product's business, or its creator for legacy rows
+without one). Each index is a sorted list of (normalized key, product id), so a
+prefix lookup is a bisect plus a short slice, no database round trip.
+
+Indexes are built lazily on first use and kept current by the Product
+post_save/post_delete receivers in models.py. Those only fire in the process
+that did the write, so they also bump a version per scope in the shared
+cache (list_cache versions, under an 'autocomplete' scope). Every
+STALE_CHECK_INTERVAL seconds a lookup compares its index's version with the
+cache's and rebuilds if another worker changed a product. Sales move stock
+with update(), which sends no signals, so they never cost a rebuild.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.db.models import Q
+
+from . import list_cache
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+STALE_CHECK_INTERVAL = 5  # seconds
+
+_NON_ALNUM = re.compile(r'[^0-9A-Z]+')
+
+
+def normalize(value):
+    """'aa-070 ' -> 'AA070'"""
+    return _NON_ALNUM.sub('', (value or '').upper())
+
+
+def index_keys(part_number, name):
+    keys = set()
+    if normalize(part_number):
+        keys.add(normalize(part_number))
+    for word in (name or '').split():
+        if normalize(word):
+            keys.add(normalize(word))
+    if normalize(name):
+        keys.add(normalize(name))
+    return keys
+
+
+def scope_for_product(business_id, created_by_id):
+    if business_id is not None:
+        return ('business', business_id)
+    return ('user', str(created_by_id))
+
+
+def scope_for_user(user):
+    business = user.businesses.first()
+    if business is not None:
+        return ('business', business.id)
+    return ('user', str(user.pk))
+
+
+def _version_scope(scope):
+    """The list_cache scope whose version tracks `scope`'s products."""
+    kind, value = scope
+    return ('autocomplete', kind, str(value))
+
+
+def _scope_filter(scope):
+    kind, value = scope
+    if kind == 'business':
+        return Q(business_id=value)
+    return Q(business_id=None, created_by_id=value)
+
+
+class PrefixIndex:
+    def __init__(self, scope):
+        self.scope = scope
+        self.lock = threading.Lock()
+        self.entries = []    # sorted [(key, product_id)]
+        self.products = {}   # product_id -> {'id', 'name', 'part_number', 'keys', 'updated_at'}
+        self.built_at = None
+        self.rebuild_seconds = None
+        self.checked_at = 0
+        self.version = None  # the cache's version of the scope this index matches
+
+    # --- building ---
+
+    def rebuild(self):
+        from .models import Product
+
+        started = time.perf_counter()
+        # Read first: a change landing while we read makes us stale again
+        version = list_cache.get_versions([_version_scope(self.scope)])[0]
+        rows = (
+            Product.objects.filter(_scope_filter(self.scope), deleted=False)
+            .values_list('id', 'name', 'part_number', 'updated_at')
+        )
+        products = {}
+        entries = []
+        for pk, name, part_number, updated_at in rows.iterator(chunk_size=2000):
+            keys = index_keys(part_number, name)
+            products[pk] = {'id': pk, 'name': name, 'part_number': part_number,
+                            'keys': keys, 'updated_at': updated_at}
+            entries.extend((key, pk) for key in keys)
+        entries.sort()
+        with self.lock:
+            self.entries = entries
+            self.products = products
+            self.version = version
+            self.built_at = time.time()
+            self.checked_at = time.monotonic()
+            self.rebuild_seconds = time.perf_counter() - started
+        with _indexes_lock:
+            for pk in products:
+                _product_scopes[pk] = self.scope
+
+    def is_stale(self):
+        return list_cache.get_versions([_version_scope(self.scope)])[0] != self.version
+
+    def caught_up(self, version):
+        """Our own change bumped the scope to `version`: still current if nothing else did."""
+        with self.lock:
+            if version is not None and self.version is not None and version == self.version + 1:
+                self.version = version
+
+    # --- incremental updates ---
+
+    def _remove_locked(self, pk):
+        product = self.products.pop(pk, None)
+        if product is None:
+            return
+        for key in product['keys']:
+            i = bisect_left(self.entries, (key, pk))
+            if i < len(self.entries) and self.entries[i] == (key, pk):
+                del self.entries[i]
+
+    def upsert(self, pk, name, part_number, updated_at):
+        keys = index_keys(part_number, name)
+        with self.lock:
+            self._remove_locked(pk)
+            self.products[pk] = {'id': pk, 'name': name, 'part_number': part_number,
+                                 'keys': keys, 'updated_at': updated_at}
+            for key in keys:
+                insort(self.entries, (key, pk))
+
+    def remove(self, pk):
+        with self.lock:
+            self._remove_locked(pk)
+
+    # --- lookups ---
+
+    def lookup(self, query, limit=DEFAULT_LIMIT):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self.lock:
+            i = bisect_left(self.entries, (prefix,))
+            while i < len(self.entries) and len(results) < limit:
+                key, pk = self.entries[i]
+                if not key.startswith(prefix):
+                    break
+                if pk not in seen:
+                    seen.add(pk)
+                    product = self.products[pk]
+                    results.append({'id': pk, 'name': product['name'], 'part_number': product['part_number']})
+                i += 1
+        return results
+
+    def stats(self):
+        with self.lock:
+            return {
+                'products': len(self.products),
+                'entries': len(self.entries),
+                'built_at': self.built_at,
+                'rebuild_ms': round(self.rebuild_seconds * 1000, 2) if self.rebuild_seconds is not None else None,
+            }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+# product_id -> scope it is currently indexed under, so a product moving
+# between businesses is dropped from the old index
+_product_scopes = {}
+
+
+def get_index(scope):
+    with _indexes_lock:
+        index = _indexes.get(scope)
+        if index is None:
+            index = _indexes[scope] = PrefixIndex(scope)
+    if index.built_at is None:
+        index.rebuild()
+    elif time.monotonic() - index.checked_at > STALE_CHECK_INTERVAL:
+        index.checked_at = time.monotonic()
+        if index.is_stale():
+            index.rebuild()
+    return index
+
+
+def _changed(scope, apply):
+    """Bump `scope`'s version for the other workers, and apply() to our index if we have it."""
+    version = list_cache.bump_version(_version_scope(scope))
+    with _indexes_lock:
+        index = _indexes.get(scope)
+    if index is None or index.built_at is None:
+        return
+    apply(index)
+    index.caught_up(version)
+
+
+def product_saved(pk, business_id, created_by_id, name, part_number, deleted, updated_at):
+    scope = scope_for_product(business_id, created_by_id)
+    with _indexes_lock:
+        old_scope = _product_scopes.get(pk)
+        if deleted:
+            _product_scopes.pop(pk, None)
+        else:
+            _product_scopes[pk] = scope
+    if old_scope is not None and old_scope != scope:
+        # Moved to another business
+        _changed(old_scope, lambda index: index.remove(pk))
+    if deleted:
+        _changed(scope, lambda index: index.remove(pk))
+    else:
+        _changed(scope, lambda index: index.upsert(pk, name, part_number, updated_at))
+
+
+def product_deleted(pk, business_id, created_by_id):
+    with _indexes_lock:
+        scope = _product_scopes.pop(pk, None) or scope_for_product(business_id, created_by_id)
+    _changed(scope, lambda index: index.remove(pk))
+
+
+def reset():
+    """Drop every index, they are rebuilt on next use."""
+    with _indexes_lock:
+        _indexes.clear()
+        _product_scopes.clear()
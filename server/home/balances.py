@@ -0,0 +1,207 @@
+"""
+Customer account ledger: every charge, payment and correction of
+Customer.remaining_balance is a CustomerLedgerEntry with the balance it
+left behind.
+
+The balance itself only ever moves with UPDATE ... SET remaining_balance =
+remaining_balance + amount, so two tills charging the same account at once
+both land (the row lock serializes them; nobody writes back a balance they
+read earlier). The entry is written under that same lock, so balance_after
+is exactly the balance after this entry and a statement never has to
+replay history: the balance at any moment is the last entry before it.
+
+Aging: payments settle the oldest charges first, so what a customer owes is
+made of their newest charges, back until they add up to the balance. Each
+charge's age bucket gets the part of it still owed.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connections, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When, Window
+from django.db.models.functions import Least
+from django.db.models.expressions import RowRange
+from django.utils import timezone
+
+from . import list_cache
+from .models import Customer, CustomerLedgerEntry
+
+
+def post(customer_id, amount, kind, order=None, created_by=None, note=''):
+    """Move the balance by `amount` (negative pays it down) and log it. Returns the entry."""
+    with transaction.atomic():
+        Customer.objects.filter(pk=customer_id).update(remaining_balance=F('remaining_balance') + amount)
+        # Our row lock is held until commit, so this is our balance
+        row = Customer.objects.filter(pk=customer_id).values_list('remaining_balance', 'business_id').first()
+        if row is None:
+            raise Customer.DoesNotExist(customer_id)
+        balance, business_id = row
+        list_cache.bump_on_commit(*list_cache.receivables_scopes(business_id))
+        return CustomerLedgerEntry.objects.create(
+            customer_id=customer_id, kind=kind, amount=amount, balance_after=balance,
+            order=order, created_by=created_by, note=note, created_at=timezone.now(),
+        )
+
+
+def charge(customer_id, amount, order=None, created_by=None):
+    return post(customer_id, amount, CustomerLedgerEntry.CHARGE, order=order, created_by=created_by)
+
+
+def pay(customer_id, amount, created_by=None, note=''):
+    """
+    Pay `amount` off the balance, never below zero (what pay_balance always
+    did). The entry records what was actually taken off. Returns it.
+    """
+    with transaction.atomic():
+        # Common case: the balance covers it, one conditional UPDATE like a charge
+        covered = Customer.objects.filter(pk=customer_id, remaining_balance__gte=amount).update(
+            remaining_balance=F('remaining_balance') - amount
+        )
+        if covered:
+            balance, business_id = Customer.objects.filter(pk=customer_id).values_list(
+                'remaining_balance', 'business_id').get()
+            paid = amount
+        else:
+            # Paying more than is owed: clear the balance
+            owed, business_id = Customer.objects.select_for_update().filter(pk=customer_id).values_list(
+                'remaining_balance', 'business_id').get()
+            paid = max(owed, 0)
+            Customer.objects.filter(pk=customer_id).update(remaining_balance=F('remaining_balance') - paid)
+            balance = owed - paid
+        list_cache.bump_on_commit(*list_cache.receivables_scopes(business_id))
+        return CustomerLedgerEntry.objects.create(
+            customer_id=customer_id, kind=CustomerLedgerEntry.PAYMENT, amount=-paid, balance_after=balance,
+            created_by=created_by, note=note, created_at=timezone.now(),
+        )
+
+
+def balance_at(customer_id, moment):
+    """The balance just before the aware datetime `moment`: one index lookup."""
+    balance = (
+        CustomerLedgerEntry.objects.filter(customer_id=customer_id, created_at__lt=moment)
+        .order_by('-created_at', '-id').values_list('balance_after', flat=True).first()
+    )
+    return balance if balance is not None else Decimal(0)
+
+
+def statement(customer_id, start, end):
+    """
+    The account between the aware datetimes [start, end): opening and
+    closing balance, the period's charges (sales), payments and adjustments,
+    and its entries. An account opened during the period starts from its
+    opening entry, which is not a charge; opening + charges - payments +
+    adjustments is the closing balance.
+    """
+    entries = CustomerLedgerEntry.objects.filter(customer_id=customer_id, created_at__gte=start, created_at__lt=end)
+    totals = entries.aggregate(**{
+        kind: Sum('amount', filter=Q(kind=kind))
+        for kind in (CustomerLedgerEntry.OPENING, CustomerLedgerEntry.CHARGE,
+                     CustomerLedgerEntry.PAYMENT, CustomerLedgerEntry.ADJUSTMENT)
+    })
+    return {
+        'opening_balance': balance_at(customer_id, start) + (totals[CustomerLedgerEntry.OPENING] or 0),
+        'closing_balance': balance_at(customer_id, end),
+        'charges': totals[CustomerLedgerEntry.CHARGE] or 0,
+        'payments': -(totals[CustomerLedgerEntry.PAYMENT] or 0),
+        'adjustments': totals[CustomerLedgerEntry.ADJUSTMENT] or 0,
+        'entries': entries.order_by('created_at', 'id'),
+    }
+
+
+def receivables(customers, start=None, end=None):
+    """
+    What `customers` owe now (from the balances, not the history), and what
+    was charged to and paid by them in [start, end) if given.
+    """
+    totals = customers.filter(remaining_balance__gt=0).aggregate(
+        customers_owing=Count('id'), outstanding=Sum('remaining_balance'),
+    )
+    result = {'customers_owing': totals['customers_owing'], 'outstanding': totals['outstanding'] or 0}
+    if start is not None and end is not None:
+        period = CustomerLedgerEntry.objects.filter(
+            customer__in=customers, created_at__gte=start, created_at__lt=end,
+        ).aggregate(
+            charged=Sum('amount', filter=Q(kind=CustomerLedgerEntry.CHARGE)),
+            paid=Sum('amount', filter=Q(kind=CustomerLedgerEntry.PAYMENT)),
+        )
+        result['charged'] = period['charged'] or 0
+        result['paid'] = -(period['paid'] or 0)
+    return result
+
+
+# (label, oldest age in days the bucket holds), None for no limit
+AGING_BUCKETS = [('0-30', 30), ('31-60', 60), ('61-90', 90), ('90+', None)]
+AGING_CHUNK_SIZE = 500
+
+
+def _money(value):
+    # SQLite hands SUM() of decimals back as float
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
+def aging_rows(customers, today=None, tz=None, chunk_size=AGING_CHUNK_SIZE):
+    """
+    {'customer', 'name', 'phone', 'balance', <bucket label>...} for every
+    customer in `customers` that owes something, biggest balance first.
+    One grouped query: a window over each customer's charges (newest first)
+    gives the part of each still owed, the outer GROUP BY sums it per
+    bucket. Rows are read chunk_size at a time. Ages are whole days in `tz`
+    (default the current time zone).
+    """
+    tz = tz or timezone.get_current_timezone()
+    today = today or timezone.localdate(timezone=tz)
+    cutoffs = [
+        timezone.make_aware(datetime.combine(today - timedelta(days=days), time.min), tz)
+        for _, days in AGING_BUCKETS if days is not None
+    ]
+    charges = (
+        CustomerLedgerEntry.objects
+        .filter(customer__in=customers, customer__remaining_balance__gt=0, amount__gt=0)
+        .annotate(
+            newer_or_this=Window(
+                Sum('amount'), partition_by=[F('customer_id')],
+                order_by=[F('created_at').desc(), F('id').desc()], frame=RowRange(start=None, end=0),
+            ),
+        )
+        .annotate(
+            owed=Least(F('amount'), F('customer__remaining_balance') - F('newer_or_this') + F('amount')),
+            bucket=Case(
+                *[When(created_at__gte=cutoff, then=Value(i)) for i, cutoff in enumerate(cutoffs)],
+                default=Value(len(cutoffs)), output_field=IntegerField(),
+            ),
+            customer_name=F('customer__name'),
+            customer_phone=F('customer__phone'),
+            balance=F('customer__remaining_balance'),
+        )
+        .values('customer_id', 'customer_name', 'customer_phone', 'balance', 'owed', 'bucket')
+    )
+    inner_sql, params = charges.query.sql_with_params()
+    bucket_sums = ', '.join(
+        f'SUM(CASE WHEN bucket = {i} THEN owed ELSE 0 END)' for i in range(len(AGING_BUCKETS))
+    )
+    sql = (
+        f'SELECT customer_id, customer_name, customer_phone, balance, {bucket_sums} '
+        f'FROM ({inner_sql}) charges WHERE owed > 0 '
+        f'GROUP BY customer_id, customer_name, customer_phone, balance '
+        f'ORDER BY balance DESC, customer_id'
+    )
+    with connections[charges.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for customer_id, name, phone, balance, *owed in rows:
+                row = {'customer': customer_id, 'name': name, 'phone': phone, 'balance': _money(balance)}
+                row.update({label: _money(amount) for (label, _), amount in zip(AGING_BUCKETS, owed)})
+                yield row
+
+
+def aging(customers, today=None, tz=None):
+    """aging_rows() plus the totals per bucket."""
+    tz = tz or timezone.get_current_timezone()
+    today = today or timezone.localdate(timezone=tz)
+    rows = list(aging_rows(customers, today, tz))
+    totals = {label: sum((row[label] for row in rows), Decimal('0.00')) for label, _ in AGING_BUCKETS}
+    totals['balance'] = sum((row['balance'] for row in rows), Decimal('0.00'))
+    return {'as_of': today, 'buckets': [label for label, _ in AGING_BUCKETS], 'customers': rows, 'totals': totals}
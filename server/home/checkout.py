@@ -0,0 +1,114 @@
+"""
+Bulk checkout: record a multi-line counter sale in a fixed number of queries.
+
+Sale.objects.create per line runs Sale.save(), which calls
+Product.update_stock(), which saves the product and refreshes it: three or
+four round trips per line. Here all lines go in with one bulk INSERT, every
+product's stock and revenue move in one UPDATE, and the customer's balance in
+another (plus its ledger entry, see home/balances.py), whatever the number of
+lines. The stock UPDATE is conditional
+(quantity >= units asked for), so a checkout can never oversell.
+
+bulk_create and update() don't send model signals, so the cache
+invalidation clear_sales_cache/clear_product_cache would have done is done
+here, and the lines go in the stock ledger with one more INSERT.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from . import balances, list_cache, stock
+from .models import InsufficientStock, Product, Sale
+
+
+def _per_product(deltas, index, field):
+    output_field = Product._meta.get_field(field)
+    return Case(
+        *[When(pk=pk, then=Value(delta[index])) for pk, delta in deltas.items()],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def apply_stock_deltas(deltas):
+    """
+    deltas: {product_id: (units_sold, amount_collected)}, applied with one
+    conditional UPDATE. F() expressions, so concurrent checkouts can't lose
+    each other's writes, and every row must still have enough stock when it
+    is locked or InsufficientStock is raised (the caller's atomic block then
+    rolls back the rows that did match).
+    """
+    if not deltas:
+        return
+    needed = _per_product(deltas, 0, 'quantity')
+    updated = Product.objects.filter(pk__in=deltas, quantity__gte=needed).update(
+        sold_units=F('sold_units') + _per_product(deltas, 0, 'sold_units'),
+        quantity=F('quantity') - needed,
+        amount_collected=F('amount_collected') + _per_product(deltas, 1, 'amount_collected'),
+        updated_at=timezone.now(),
+    )
+    if updated != len(deltas):
+        raise InsufficientStock(deltas)
+
+
+def short_products(deltas):
+    """Products in `deltas` that don't have the units asked for, for error messages."""
+    stock = dict(Product.objects.filter(pk__in=deltas).values_list('pk', 'quantity'))
+    return [pk for pk, (units, _) in deltas.items() if (stock.get(pk) or 0) < units]
+
+
+def lines_total(lines):
+    """What `lines` (see checkout()) come to, the only total a checkout is charged."""
+    return sum((line['quantity_sold'] * line['price_per_unit'] for line in lines), Decimal(0))
+
+
+def checkout(lines, created_by=None, customer=None, order=None):
+    """
+    lines: [{'product': Product, 'quantity_sold': int, 'price_per_unit': Decimal}]
+
+    Returns the created Sale rows, in line order, as lines of `order` if one
+    is given. The customer, if any, is charged what the lines add up to
+    (once).
+    """
+    sales = [
+        Sale(
+            product=line['product'],
+            quantity_sold=line['quantity_sold'],
+            price_per_unit=line['price_per_unit'],
+            total_amount=line['quantity_sold'] * line['price_per_unit'],
+            created_by=created_by,
+            customer=customer,
+            order=order,
+        )
+        for line in lines
+    ]
+
+    deltas = defaultdict(lambda: [0, 0])
+    for sale in sales:
+        deltas[sale.product_id][0] += sale.quantity_sold
+        deltas[sale.product_id][1] += sale.total_amount
+
+    try:
+        with transaction.atomic():
+            apply_stock_deltas(deltas)
+            Sale.objects.bulk_create(sales)
+            stock.log_sales(sales)
+            balance_due = sum((sale.total_amount for sale in sales), Decimal(0))
+            if customer is not None and balance_due:
+                balances.charge(customer.pk, balance_due, order=order, created_by=created_by)
+    except InsufficientStock:
+        # Rolled back by now, name the lines that are actually short
+        raise InsufficientStock(short_products(deltas))
+
+    cache.delete('sales_summary')
+    scopes = {
+        scope
+        for sale in sales
+        for scope in list_cache.product_scopes(sale.product.business_id, sale.product.created_by_id)
+    }
+    list_cache.bump_on_commit(*scopes)
+    return sales
@@ -0,0 +1,57 @@
+"""
+Conditional GET (ETag / Last-Modified) for list APIs.
+
+The validators come from one aggregate over the same queryset the view is
+about to serialize: row count plus max(updated_at). Inserts and edits move
+updated_at, deletes and rows leaving the filter (approved, soft-deleted...)
+move the count. If the client already has that state we answer 304 before
+the serializer runs.
+
+Responses are marked private/no-cache: clients may keep them but must
+revalidate on every use, which is what replaces the old no-store policy.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.cache import cache_control
+
+# max_age=0 also keeps the site-wide cache middleware out of the way
+revalidate = cache_control(private=True, no_cache=True, max_age=0)
+
+
+class ListValidators:
+    """
+    `modified_fields` are the timestamps that can change the serialized rows,
+    e.g. sales also embed their product's name and part number.
+    """
+    def __init__(self, request, queryset, modified_fields=('updated_at',)):
+        self.request = request
+        aggregates = {f'latest_{i}': Max(field) for i, field in enumerate(modified_fields)}
+        state = queryset.order_by().aggregate(count=Count('id'), **aggregates)
+        stamps = [state[name] for name in aggregates]
+        self.last_modified = max((stamp for stamp in stamps if stamp), default=None)
+        raw = ':'.join([
+            str(request.user.pk),
+            request.get_full_path(),
+            request.headers.get('Accept', ''),
+            str(state['count']),
+            *(stamp.isoformat() if stamp else '' for stamp in stamps),
+        ])
+        self.etag = '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+    def not_modified(self):
+        """A 304 response if the client's copy is current, else None."""
+        # Only the ETag decides. Rows dropping out of the list (deleted,
+        # approved...) don't move max(updated_at), so an If-Modified-Since
+        # match on its own could hand out a stale list.
+        return get_conditional_response(self.request, etag=self.etag)
+
+    def finalize(self, response):
+        response['ETag'] = self.etag
+        # the body (and so the ETag) depends on the negotiated renderer
+        patch_vary_headers(response, ('Accept',))
+        if self.last_modified:
+            response['Last-Modified'] = http_date(self.last_modified.timestamp())
+        return response
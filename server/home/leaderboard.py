@@ -0,0 +1,323 @@
+"""
+Top sellers leaderboard: approved units per product, per scope (see
+list_cache.product_scopes: the product's business, its creator, and 'all'
+for the staff accounts), over today, the last 7 and 30 days and all time.
+
+Every window is its own sorted set, so a top-N read is one ZREVRANGE with no
+grouping or sorting of sales. The sliding windows are kept by end day: a sale
+on day s is added to 7d:{s} ... 7d:{s+6} (and likewise for 30d), and each
+set expires once its day has passed. Reading the last 7 days is reading
+7d:{today}. Days already gone are never read, so backdated changes only touch
+the sets from today on.
+
+The sets live in Redis (LEADERBOARD_REDIS_URL) so every worker shares them.
+Without it, or once Redis can't be reached (at first use or on a later
+read), they are kept in this process's memory instead. Either way a scope is built from the sales
+the first time it is read (a fresh deploy, a flushed Redis), and in memory
+again once it is LOCAL_REFRESH_INTERVAL seconds old, so other workers'
+sales show up too. Only the scope being read is rebuilt.
+
+Updated from rollups.apply() after the transaction commits, i.e. whenever a
+sale starts or stops counting (approve, reject, edit, delete). Redis isn't
+part of the database transaction, so `manage.py rebuild_leaderboard`
+recomputes everything from the Sale rows if the two drift apart.
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import list_cache
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'leaderboard'
+# window -> days it covers, None for all time
+WINDOWS = {'today': 1, '7d': 7, '30d': 30, 'all': None}
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+LOCAL_REFRESH_INTERVAL = 60  # seconds
+
+COUNTED = Q(aproved=True, rejected=False, deleted=False)
+
+
+def scope_for_user(user):
+    if user.username in ['nsaro', 'testuser']:
+        return list_cache.ALL
+    business = user.businesses.first()
+    if business is not None:
+        return list_cache.business_scope(business.id)
+    return list_cache.user_scope(user.pk)
+
+
+def _prefix(scope):
+    return f"{PREFIX}:{':'.join(scope)}:"
+
+
+def _key(scope, window, day=None):
+    key = f'{_prefix(scope)}{window}'
+    return key if day is None else f'{key}:{day.isoformat()}'
+
+
+def _built_key(prefix):
+    """Set along with a scope's sets: missing means the scope was never built."""
+    return f'{prefix}built'
+
+
+def _expires_at(day):
+    """A day after `day` has ended, so the set outlives any clock skew."""
+    end = datetime.combine(day + timedelta(days=2), datetime.min.time())
+    return int(timezone.make_aware(end).timestamp())
+
+
+def _entries(scopes, product_id, day, units, today, windows=WINDOWS):
+    """(key, product_id, units, expires_at) for every set a change on `day` moves."""
+    for scope in scopes:
+        for window, days in windows.items():
+            if days is None:
+                yield _key(scope, window), product_id, units, None
+                continue
+            for offset in range(days):
+                end_day = day + timedelta(days=offset)
+                if end_day >= today:
+                    yield _key(scope, window, end_day), product_id, units, _expires_at(end_day)
+
+
+class LocalBoard:
+    errors = ()  # nothing to fall back from
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sets = defaultdict(dict)   # key -> {product_id: units}
+        self.expires = {}               # key -> timestamp
+        self.built_at = {}              # scope prefix -> time.monotonic() of its last rebuild
+
+    def is_stale(self, prefix):
+        with self.lock:
+            built_at = self.built_at.get(prefix)
+        return built_at is None or time.monotonic() - built_at > LOCAL_REFRESH_INTERVAL
+
+    def _purge_locked(self):
+        now = time.time()
+        for key in [key for key, expires_at in self.expires.items() if expires_at <= now]:
+            self.sets.pop(key, None)
+            del self.expires[key]
+
+    def increment(self, entries):
+        # Scopes not built yet are replaced on their first read anyway
+        with self.lock:
+            self._purge_locked()
+            for key, product_id, units, expires_at in entries:
+                members = self.sets[key]
+                members[product_id] = members.get(product_id, 0) + units
+                if members[product_id] <= 0:
+                    del members[product_id]
+                if expires_at is not None:
+                    self.expires[key] = expires_at
+
+    def top(self, key, limit):
+        with self.lock:
+            self._purge_locked()
+            members = self.sets.get(key, {})
+            return heapq.nlargest(limit, members.items(), key=lambda item: (item[1], -item[0]))
+
+    def replace(self, prefix, sets, expires, built):
+        with self.lock:
+            for key in [key for key in self.sets if key.startswith(prefix)]:
+                del self.sets[key]
+                self.expires.pop(key, None)
+            for key, members in sets.items():
+                self.sets[key] = dict(members)
+                if expires.get(key) is not None:
+                    self.expires[key] = expires[key]
+            for scope_prefix in [scope_prefix for scope_prefix in self.built_at if scope_prefix.startswith(prefix)]:
+                del self.built_at[scope_prefix]
+            now = time.monotonic()
+            self.built_at.update(dict.fromkeys(built, now))
+
+
+class RedisBoard:
+    def __init__(self, client):
+        import redis
+
+        self.client = client
+        self.errors = (redis.RedisError,)
+
+    def increment(self, entries):
+        pipe = self.client.pipeline(transaction=False)
+        for key, product_id, units, expires_at in entries:
+            pipe.zincrby(key, units, product_id)
+            if units < 0:
+                pipe.zremrangebyscore(key, '-inf', 0)
+            if expires_at is not None:
+                pipe.expireat(key, expires_at)
+        pipe.execute()
+
+    def top(self, key, limit):
+        return [(int(member), int(units)) for member, units in self.client.zrevrange(key, 0, limit - 1, withscores=True)]
+
+    def is_stale(self, prefix):
+        return not self.client.exists(_built_key(prefix))
+
+    def replace(self, prefix, sets, expires, built):
+        old_keys = list(self.client.scan_iter(match=f'{prefix}*', count=1000))
+        pipe = self.client.pipeline(transaction=True)
+        if old_keys:
+            pipe.delete(*old_keys)
+        for key, members in sets.items():
+            if members:
+                pipe.zadd(key, members)
+                if expires.get(key) is not None:
+                    pipe.expireat(key, expires[key])
+        for scope_prefix in built:
+            pipe.set(_built_key(scope_prefix), 1)
+        pipe.execute()
+
+
+_board = None
+_board_lock = threading.Lock()
+
+
+def get_board():
+    global _board
+    with _board_lock:
+        if _board is None:
+            _board = _connect()
+        return _board
+
+
+def _connect():
+    url = getattr(settings, 'LEADERBOARD_REDIS_URL', None)
+    if url:
+        try:
+            import redis
+
+            client = redis.Redis.from_url(url, socket_connect_timeout=1, socket_timeout=2)
+            client.ping()
+            return RedisBoard(client)
+        except Exception as e:
+            logger.warning("Leaderboard Redis at %s unavailable (%s), keeping it in memory", url, e)
+    return LocalBoard()
+
+
+def _fall_back(board):
+    """Swap a Redis `board` that stopped answering for one in memory."""
+    global _board
+    with _board_lock:
+        if _board is board:
+            _board = LocalBoard()
+    return get_board()
+
+
+def reset():
+    """Forget the board (and its connection), the next use picks one again."""
+    global _board
+    with _board_lock:
+        _board = None
+
+
+def record(changes):
+    """
+    changes: [(business_id, created_by_id, product_id, day, units)], applied
+    once the current transaction commits.
+    """
+    changes = [change for change in changes if change[4]]
+    if not changes:
+        return
+
+    def write():
+        today = timezone.localdate()
+        entries = [
+            entry
+            for business_id, created_by_id, product_id, day, units in changes
+            for entry in _entries(list_cache.product_scopes(business_id, created_by_id), product_id, day, units, today)
+        ]
+        try:
+            get_board().increment(entries)
+        except Exception:
+            # Never fail a sale over the leaderboard; rebuild_leaderboard fixes it
+            logger.exception("Leaderboard update failed")
+
+    transaction.on_commit(write)
+
+
+def top(scope, window='all', limit=DEFAULT_LIMIT):
+    """[(product_id, units)] best first."""
+    if window not in WINDOWS:
+        raise ValueError(f"Unknown window: {window}")
+    key = _key(scope, window) if WINDOWS[window] is None else _key(scope, window, timezone.localdate())
+    board = get_board()
+    try:
+        return _read(board, scope, key, limit)
+    except board.errors as e:
+        logger.warning("Leaderboard Redis unavailable (%s), keeping it in memory", e)
+        return _read(_fall_back(board), scope, key, limit)
+
+
+def _read(board, scope, key, limit):
+    if board.is_stale(_prefix(scope)):
+        rebuild(scope)
+    return board.top(key, limit)
+
+
+def _scope_filter(scope):
+    """The sales counted in `scope`, see list_cache.product_scopes."""
+    kind, *ids = scope
+    if kind == 'business':
+        return Q(product__business_id=ids[0])
+    if kind == 'user':
+        return Q(product__created_by_id=ids[0])
+    return Q()
+
+
+def rebuild(scope=None):
+    """
+    Recompute the sets from the approved sales: every scope, or just
+    `scope`. Increments that land while this runs can be lost; run it again
+    if that matters.
+    """
+    from .models import Sale
+
+    today = timezone.localdate()
+    sales = Sale.objects.filter(COUNTED)
+    if scope is not None:
+        sales = sales.filter(_scope_filter(scope))
+    fields = ('product_id', 'product__business_id', 'product__created_by_id')
+    all_time = sales.values(*fields).annotate(units=Sum('quantity_sold')).order_by()
+    longest = max(days for days in WINDOWS.values() if days is not None)
+    window_start = timezone.make_aware(datetime.combine(today - timedelta(days=longest - 1), datetime.min.time()))
+    recent = (
+        sales.filter(date_sold__gte=window_start)
+        .annotate(day=TruncDate('date_sold', tzinfo=timezone.get_current_timezone()))
+        .values(*fields, 'day').annotate(units=Sum('quantity_sold')).order_by()
+    )
+
+    def scopes(row):
+        if scope is not None:
+            return [scope]
+        return list_cache.product_scopes(row['product__business_id'], row['product__created_by_id'])
+
+    sets = defaultdict(lambda: defaultdict(int))
+    expires = {}
+    built = {_prefix(scope)} if scope is not None else set()
+    for row in all_time:
+        for row_scope in scopes(row):
+            built.add(_prefix(row_scope))
+            sets[_key(row_scope, 'all')][row['product_id']] += row['units']
+    sliding = {window: days for window, days in WINDOWS.items() if days is not None}
+    for row in recent:
+        for key, product_id, units, expires_at in _entries(scopes(row), row['product_id'], row['day'],
+                                                           row['units'], today, sliding):
+            sets[key][product_id] += units
+            expires[key] = expires_at
+
+    get_board().replace(f'{PREFIX}:' if scope is None else _prefix(scope), sets, expires, built)
+    return len(sets)
@@ -0,0 +1,138 @@
+"""
+Versioned cache for list responses.
+
+Every scope (a user, a business, or 'all' for the staff accounts that see the
+whole catalog) has a version number in the cache. Cached lists are stored
+under keys that embed the versions of the scopes they were built from, so
+invalidating a scope is a single incr on its version key: old entries are
+never read again and age out of the cache on their own, after
+LIST_CACHE_TIMEOUT at the latest.
+
+Needs a cache every worker shares (settings.CACHES, Redis in production): a
+per-process cache would keep serving lists another worker has changed, and
+DummyCache turns the cache off.
+
+Versions are bumped from the Product and Sale signals in models.py, and by
+home/balances.py for the receivables reports.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIX = 'list_cache'
+# Seconds a cached list is kept, so entries nobody reads again don't fill
+# the cache until eviction
+TIMEOUT = getattr(settings, 'LIST_CACHE_TIMEOUT', 60 * 60)
+HITS_KEY = f'{PREFIX}:hits'
+MISSES_KEY = f'{PREFIX}:misses'
+
+ALL = ('all',)
+# Everything computed from the whole customer ledger (home/balances.py), the
+# staff accounts' view; a business's own reports use its business scope
+RECEIVABLES = ('receivables',)
+
+
+def user_scope(user_id):
+    return ('user', str(user_id))
+
+
+def business_scope(business_id):
+    return ('business', str(business_id))
+
+
+def _version_key(scope):
+    return f"{PREFIX}:version:{':'.join(scope)}"
+
+
+def get_versions(scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock rather than 1, so a version key that was
+            # evicted can't come back at a number old entries were stored under.
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    for scope in scopes:
+        bump_version(scope)
+
+
+def bump_version(scope):
+    """Bump one scope; its new version, None if it had none."""
+    try:
+        return cache.incr(_version_key(scope))
+    except ValueError:
+        # Not set yet (or evicted), nothing is cached under it
+        return None
+
+
+def bump_on_commit(*scopes):
+    # Bumping before commit would let a concurrent reader cache the old rows
+    # under the new version.
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def product_scopes(business_id, created_by_id):
+    scopes = [ALL]
+    if created_by_id is not None:
+        scopes.append(user_scope(created_by_id))
+    if business_id is not None:
+        scopes.append(business_scope(business_id))
+    return scopes
+
+
+def receivables_scopes(business_id):
+    """What a charge or payment on a customer of `business_id` makes stale."""
+    scopes = [RECEIVABLES]
+    if business_id is not None:
+        scopes.append(business_scope(business_id))
+    return scopes
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def cached_list(name, request, scopes, build):
+    """
+    Return build() from the cache, keyed by `name`, the requesting user, the
+    full query string and the current versions of `scopes`.
+    """
+    versions = get_versions(scopes)
+    query = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    key = f"{PREFIX}:{name}:{request.user.pk}:{query}:" + '.'.join(str(v) for v in versions)
+
+    data = cache.get(key)
+    if data is not None:
+        _count(HITS_KEY)
+        return data
+    _count(MISSES_KEY)
+    data = build()
+    cache.set(key, data, TIMEOUT)
+    return data
+
+
+def stats():
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total * 100, 2) if total else 0,
+    }
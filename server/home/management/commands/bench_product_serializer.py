@@ -0,0 +1,71 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from home.models import Product, Vehicle
+from home.serializers import FastProductListSerializer, ProductSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compares ProductSerializer(many=True) with FastProductListSerializer on throwaway products.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 50000],
+                            help='Catalog sizes to benchmark. (Default: 1000 10000 50000)')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Runs per size, the best one is reported. (Default: 3)')
+
+    def handle(self, *args, **options):
+        # Everything runs inside a transaction that is rolled back at the end,
+        # so this is safe to point at a real database.
+        try:
+            with transaction.atomic():
+                self.run(options['sizes'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def best_of(self, repeat, fn):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def run(self, sizes, repeat):
+        vehicles = Vehicle.objects.bulk_create(Vehicle(name=f"Bench vehicle {i}") for i in range(20))
+        created = 0
+        renderer = JSONRenderer()
+        marker = 'bench-serializer'
+
+        self.stdout.write(f"{'rows':>8} {'ProductSerializer':>18} {'fast path':>10} {'speedup':>8}  identical")
+        for size in sorted(sizes):
+            products = Product.objects.bulk_create(
+                Product(name=f"Bench part {i}", brand=marker, part_number=f"BP{i:06}",
+                        price=Decimal('12.50'), buying_price=Decimal('8.00'), quantity=i % 50)
+                for i in range(created, size)
+            )
+            Product.vehicles.through.objects.bulk_create(
+                Product.vehicles.through(product_id=product.id, vehicle_id=vehicles[i % len(vehicles)].id)
+                for i, product in enumerate(products)
+            )
+            created = size
+            queryset = Product.objects.filter(brand=marker).order_by('id')
+
+            slow, slow_data = self.best_of(repeat, lambda: renderer.render(
+                ProductSerializer(queryset.prefetch_related('vehicles'), many=True).data))
+            fast, fast_data = self.best_of(repeat, lambda: renderer.render(
+                FastProductListSerializer(queryset).data))
+
+            self.stdout.write(
+                f"{size:>8} {slow * 1000:>16.0f}ms {fast * 1000:>8.0f}ms {slow / fast:>7.1f}x  {slow_data == fast_data}"
+            )
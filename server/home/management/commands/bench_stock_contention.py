@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+
+from home.checkout import checkout
+from home.models import InsufficientStock, Product, Sale
+
+
+class Command(BaseCommand):
+    help = ('Hammers one hot product from several threads at once and checks that '
+            'stock never goes below zero.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Concurrent cashiers. (Default: 8)')
+        parser.add_argument('--attempts', type=int, default=50,
+                            help='Sales each cashier tries. (Default: 50)')
+        parser.add_argument('--stock', type=int, default=200,
+                            help='Units of the hot product on hand. (Default: 200)')
+        parser.add_argument('--units', type=int, default=1,
+                            help='Units per sale. (Default: 1)')
+        parser.add_argument('--path', choices=['sale', 'checkout'], default='sale',
+                            help='Sale.objects.create (product_sale_view, HTMX, admin) '
+                                 'or the bulk checkout (TransactionSerializer). (Default: sale)')
+
+    def handle(self, *args, **options):
+        # Threads need committed rows, so this can't run in a rolled back
+        # transaction like bench_product_serializer. The product (and its
+        # sales, by cascade) is deleted at the end instead.
+        product = Product.objects.create(
+            name='Bench hot SKU', brand='bench-stock', price=Decimal('10.00'), quantity=options['stock']
+        )
+        try:
+            self.run(product, options)
+        finally:
+            product.delete()
+
+    def sell(self, product_id, options, outcomes, barrier):
+        product = Product.objects.get(pk=product_id)
+        barrier.wait()
+        try:
+            for _ in range(options['attempts']):
+                try:
+                    if options['path'] == 'checkout':
+                        checkout([{'product': product, 'quantity_sold': options['units'],
+                                   'price_per_unit': product.price}])
+                    else:
+                        Sale.objects.create(product=product, quantity_sold=options['units'],
+                                            price_per_unit=product.price)
+                    outcomes['sold'] += 1
+                except InsufficientStock:
+                    outcomes['refused'] += 1
+                except Exception as e:
+                    outcomes[type(e).__name__] += 1
+        finally:
+            connection.close()
+
+    def run(self, product, options):
+        outcomes = Counter()
+        barrier = threading.Barrier(options['threads'] + 1)
+        threads = [
+            threading.Thread(target=self.sell, args=(product.pk, options, outcomes, barrier))
+            for _ in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        recorded = Sale.objects.filter(product=product).aggregate(units=Sum('quantity_sold'))['units'] or 0
+        attempts = options['threads'] * options['attempts']
+        oversold = max(0, recorded - options['stock'])
+
+        self.stdout.write(f"path:        {options['path']} ({connection.vendor})")
+        self.stdout.write(f"attempts:    {attempts} from {options['threads']} threads in {elapsed:.2f}s "
+                          f"({attempts / elapsed:.0f}/s)")
+        self.stdout.write(f"sold:        {outcomes['sold']} sales, {recorded} units "
+                          f"({outcomes['sold'] / elapsed:.0f} sales/s)")
+        self.stdout.write(f"refused:     {outcomes['refused']} (not enough stock)")
+        errors = {name: count for name, count in outcomes.items() if name not in ('sold', 'refused')}
+        if errors:
+            self.stdout.write(f"errors:      {errors}")
+        self.stdout.write(f"stock left:  {product.quantity} of {options['stock']}")
+
+        consistent = product.quantity == options['stock'] - recorded and product.sold_units == recorded
+        if oversold or not consistent:
+            self.stdout.write(self.style.ERROR(f"OVERSOLD by {oversold} units, stock consistent: {consistent}"))
+        else:
+            self.stdout.write(self.style.SUCCESS('oversells:   0'))
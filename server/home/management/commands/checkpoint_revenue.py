@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from home import rollups
+
+
+class Command(BaseCommand):
+    help = "Folds each business's new days of revenue into a running-total checkpoint. Run it periodically (cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-days', type=int, default=1,
+                            help='Only checkpoint businesses with at least this many new days. (Default: 1)')
+        parser.add_argument('--lag', type=int, default=rollups.CHECKPOINT_LAG.days,
+                            help='Leave the last this many days out of the checkpoint. (Default: 2)')
+
+    def handle(self, *args, **options):
+        taken = rollups.take_revenue_checkpoints(min_days=options['min_days'],
+                                                 lag=timedelta(days=options['lag']))
+        self.stdout.write(self.style.SUCCESS(f"Took {taken} revenue checkpoints."))
@@ -2,6 +2,7 @@ import pandas as pd
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from home.models import Product  # Adjust 'inventory' to your app name
+from home import stock
 
 class Command(BaseCommand):
     help = 'Imports products from a CSV or Excel file into the database.'
@@ -103,6 +104,8 @@ class Command(BaseCommand):
 
         # --- 3. Bulk Insert (Faster way to save many objects) ---
         Product.objects.bulk_create(products_to_create)
+        # bulk_create skips Product.save(), so open their stock ledger here
+        stock.log_opening(products_to_create)
         
         self.stdout.write(self.style.SUCCESS(f'Successfully imported {len(products_to_create)} products.'))
         self.stdout.write(self.style.WARNING('NOTE: Vehicles field was skipped. You will need to manage this via the admin or another script if needed.'))
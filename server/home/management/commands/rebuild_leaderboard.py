@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from home import leaderboard, list_cache
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the top sellers leaderboard from the approved sales.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, default=None,
+                            help='Only rebuild this business id. (Default: all)')
+
+    def handle(self, *args, **options):
+        board = leaderboard.get_board()
+        if isinstance(board, leaderboard.LocalBoard):
+            self.stdout.write(self.style.WARNING(
+                "No Redis (LEADERBOARD_REDIS_URL): the leaderboard lives in each worker's "
+                "memory and rebuilds itself there, nothing to do from here."
+            ))
+            return
+        business_id = options['business']
+        scope = list_cache.business_scope(business_id) if business_id is not None else None
+        written = leaderboard.rebuild(scope)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} leaderboard sets."))
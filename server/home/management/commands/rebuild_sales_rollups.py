@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from home import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily sales rollups and running revenue totals from the approved sales.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, default=None,
+                            help='Only rebuild this business id. (Default: all)')
+
+    def handle(self, *args, **options):
+        created = rollups.rebuild(business_id=options['business'])
+        totals = rollups.rebuild_revenue(business_id=options['business'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {created} daily rollup rows, {totals} revenue total rows."))
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from home import stock
+
+
+class Command(BaseCommand):
+    help = 'Folds the stock movements of every product into a new snapshot. Run it periodically (cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-movements', type=int, default=50,
+                            help='Only snapshot products with at least this many new movements. (Default: 50)')
+        parser.add_argument('--lag', type=int, default=int(stock.SNAPSHOT_LAG.total_seconds()),
+                            help='Leave movements younger than this many seconds in the tail. (Default: 300)')
+
+    def handle(self, *args, **options):
+        taken = stock.take_snapshots(min_movements=options['min_movements'],
+                                     lag=timedelta(seconds=options['lag']))
+        self.stdout.write(self.style.SUCCESS(f"Took {taken} stock snapshots."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from home import stock
+
+
+class Command(BaseCommand):
+    help = "Checks every product's stock counters against the stock movement ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', default=None,
+                            help='Only check this product id (repeatable). (Default: all)')
+
+    def handle(self, *args, **options):
+        mismatches = stock.verify(options['product'])
+        for product_id, counters, ledger in mismatches:
+            differences = ', '.join(
+                f"{field} {counters[field]} (ledger {ledger[field]})"
+                for field in stock.COUNTERS if counters[field] != ledger[field]
+            )
+            self.stdout.write(f"Product {product_id}: {differences}")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} products disagree with the stock ledger.")
+        self.stdout.write(self.style.SUCCESS("Stock counters match the ledger."))
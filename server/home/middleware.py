@@ -0,0 +1,19 @@
+from django.utils.cache import patch_vary_headers
+
+
+class ApiVaryMiddleware:
+    """
+    API responses differ by who asks and by what they accept: DRF picks JSON
+    or msgpack from the Accept header, and the body is the caller's own
+    business's data, picked by the JWT in Authorization. Say so with Vary,
+    so no client or proxy cache hands one user's response (or one format)
+    to another.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if hasattr(response, 'accepted_renderer'):
+            patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
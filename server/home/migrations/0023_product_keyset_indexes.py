@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:19
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_created_at(apps, schema_editor):
+    # Keyset pagination orders on created_at, and NULLs sort differently on
+    # PostgreSQL and SQLite. Park legacy rows at the oldest known timestamp.
+    Product = apps.get_model('home', 'Product')
+    oldest = Product.objects.exclude(created_at=None).order_by('created_at').values_list('created_at', flat=True).first()
+    if oldest is None:
+        oldest = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    Product.objects.filter(created_at=None).update(created_at=oldest)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0022_business_owner'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at', '-id'], name='product_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_by', '-created_at', '-id'], name='product_owner_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+from django.db import migrations
+
+# Frozen copy of the DDL in home/search.py as of this migration; later
+# changes to that module don't change what this migration does.
+SQLITE_FTS_TABLE = 'home_product_fts'
+
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        name, part_number, brand, description,
+        content='home_product', content_rowid='id', prefix='2 3 4'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ai AFTER INSERT ON home_product BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, part_number, brand, description)
+        VALUES (new.id, new.name, new.part_number, new.brand, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ad AFTER DELETE ON home_product BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, part_number, brand, description)
+        VALUES ('delete', old.id, old.name, old.part_number, old.brand, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_au AFTER UPDATE OF name, part_number, brand, description ON home_product BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, part_number, brand, description)
+        VALUES ('delete', old.id, old.name, old.part_number, old.brand, old.description);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, part_number, brand, description)
+        VALUES (new.id, new.name, new.part_number, new.brand, new.description);
+    END""",
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')",
+]
+
+POSTGRES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS product_name_trgm_idx ON home_product USING gin ((UPPER(name::text)) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS product_part_number_trgm_idx ON home_product USING gin ((UPPER(part_number::text)) gin_trgm_ops)",
+]
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        for statement in SQLITE_FTS_SQL:
+            schema_editor.execute(statement)
+    elif connection.vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        from django.contrib.postgres.search import SearchVector
+
+        for statement in POSTGRES_SQL:
+            schema_editor.execute(statement)
+        schema_editor.add_index(
+            apps.get_model('home', 'Product'),
+            GinIndex(SearchVector('name', 'part_number', 'brand', 'description', config='simple'),
+                     name='product_search_tsv_idx'),
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}")
+    elif connection.vendor == 'postgresql':
+        for index in ('product_search_tsv_idx', 'product_name_trgm_idx', 'product_part_number_trgm_idx'):
+            schema_editor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0024_product_updated_at_tombstones'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:31
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    Sale = apps.get_model('home', 'Sale')
+    Sale.objects.filter(updated_at=None).update(updated_at=F('date_sold'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0025_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
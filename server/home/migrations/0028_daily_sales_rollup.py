@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def build_rollups(apps, schema_editor):
+    # Frozen copy of home.rollups.rebuild as of this migration
+    Sale = apps.get_model('home', 'Sale')
+    DailySalesRollup = apps.get_model('home', 'DailySalesRollup')
+
+    rows = (
+        Sale.objects.filter(aproved=True, rejected=False, deleted=False)
+        .annotate(day=TruncDate('date_sold', tzinfo=timezone.get_current_timezone()))
+        .values('product_id', 'product__business_id', 'day')
+        .annotate(
+            sales_count=Count('id'),
+            units=Sum('quantity_sold'),
+            revenue=Sum('total_amount'),
+            cost=Sum(ExpressionWrapper(
+                F('quantity_sold') * F('product__buying_price'),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            )),
+        )
+        .order_by()
+    )
+    DailySalesRollup.objects.bulk_create(
+        (DailySalesRollup(
+            business_id=row['product__business_id'], product_id=row['product_id'], day=row['day'],
+            sales_count=row['sales_count'], units=row['units'] or 0,
+            revenue=row['revenue'] or 0, cost=row['cost'] or 0,
+        ) for row in rows.iterator(chunk_size=1000)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0027_order_header'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sales_count', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('business', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='home.business')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='home.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['business', 'day'], name='rollup_business_day_idx'), models.Index(fields=['day'], name='rollup_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='rollup_product_day_uniq')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:48
+
+import home.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0028_daily_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='business',
+            name='time_zone',
+            field=models.CharField(blank=True, default='', max_length=64, validators=[home.models.validate_time_zone]),
+        ),
+    ]
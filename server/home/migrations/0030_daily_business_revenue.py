@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:51
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def build_revenue_totals(apps, schema_editor):
+    # Frozen copy of home.rollups.rebuild_revenue as of this migration:
+    # per business and day from the rollups, with the running total
+    DailySalesRollup = apps.get_model('home', 'DailySalesRollup')
+    DailyBusinessRevenue = apps.get_model('home', 'DailyBusinessRevenue')
+
+    rows = (
+        DailySalesRollup.objects.filter(business__isnull=False)
+        .values('business_id', 'day').annotate(revenue=Sum('revenue'))
+        .exclude(revenue=0).order_by('business_id', 'day')
+    )
+    batch = []
+    business_id, cumulative = None, Decimal(0)
+    for row in rows.iterator(chunk_size=1000):
+        if row['business_id'] != business_id:
+            business_id, cumulative = row['business_id'], Decimal(0)
+        cumulative += row['revenue']
+        batch.append(DailyBusinessRevenue(
+            business_id=row['business_id'], day=row['day'],
+            revenue=row['revenue'], cumulative_revenue=cumulative,
+        ))
+        if len(batch) >= 1000:
+            DailyBusinessRevenue.objects.bulk_create(batch)
+            batch = []
+    DailyBusinessRevenue.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0029_business_time_zone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBusinessRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cumulative_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='home.business')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('business', 'day'), name='revenue_business_day_uniq')],
+            },
+        ),
+        migrations.RunPython(build_revenue_totals, migrations.RunPython.noop),
+    ]
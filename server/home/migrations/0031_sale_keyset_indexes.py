@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0030_daily_business_revenue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['-date_sold', '-id'], name='sale_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['product', '-date_sold', '-id'], name='sale_product_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['customer', '-date_sold', '-id'], name='sale_customer_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['created_by', '-date_sold', '-id'], name='sale_seller_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['aproved', 'rejected', '-date_sold', '-id'], name='sale_status_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_stock_ledger(apps, schema_editor):
+    # The counters as they stand become every product's opening movement
+    Product = apps.get_model('home', 'Product')
+    StockMovement = apps.get_model('home', 'StockMovement')
+    batch = []
+    for pk, quantity, sold_units, amount_collected in Product.objects.values_list(
+        'pk', 'quantity', 'sold_units', 'amount_collected'
+    ).iterator(chunk_size=1000):
+        if quantity or sold_units or amount_collected:
+            batch.append(StockMovement(product_id=pk, kind='opening', quantity=quantity or 0,
+                                       sold_units=sold_units or 0, amount_collected=amount_collected or 0))
+        if len(batch) >= 1000:
+            StockMovement.objects.bulk_create(batch)
+            batch = []
+    StockMovement.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0032_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('opening', 'Opening stock'), ('sale', 'Sale'), ('reversal', 'Sale reversed'), ('restock', 'Restock'), ('adjustment', 'Adjustment')], max_length=16)),
+                ('sale_id', models.BigIntegerField(blank=True, null=True)),
+                ('quantity', models.IntegerField(default=0)),
+                ('sold_units', models.IntegerField(default=0)),
+                ('amount_collected', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='home.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'id'], name='stock_movement_product_idx'), models.Index(fields=['product', 'created_at'], name='stock_movement_time_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('through_movement_id', models.BigIntegerField()),
+                ('as_of', models.DateTimeField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('sold_units', models.IntegerField(default=0)),
+                ('amount_collected', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='home.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-through_movement_id'], name='stock_snapshot_latest_idx'), models.Index(fields=['product', '-as_of'], name='stock_snapshot_time_idx')],
+            },
+        ),
+        migrations.RunPython(open_stock_ledger, migrations.RunPython.noop),
+    ]
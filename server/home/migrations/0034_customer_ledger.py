@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_customer_ledger(apps, schema_editor):
+    # Every balance owed so far becomes the account's opening entry
+    Customer = apps.get_model('home', 'Customer')
+    CustomerLedgerEntry = apps.get_model('home', 'CustomerLedgerEntry')
+    batch = []
+    for pk, balance in Customer.objects.exclude(remaining_balance=0).values_list(
+        'pk', 'remaining_balance'
+    ).iterator(chunk_size=1000):
+        batch.append(CustomerLedgerEntry(customer_id=pk, kind='opening', amount=balance, balance_after=balance))
+        if len(batch) >= 1000:
+            CustomerLedgerEntry.objects.bulk_create(batch)
+            batch = []
+    CustomerLedgerEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0033_stock_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('opening', 'Opening balance'), ('charge', 'Charge'), ('payment', 'Payment'), ('adjustment', 'Adjustment')], max_length=16)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='remaining_balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(condition=models.Q(('remaining_balance__gt', 0)), fields=['remaining_balance'], name='customer_owing_idx'),
+        ),
+        migrations.AddField(
+            model_name='customerledgerentry',
+            name='created_by',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='customerledgerentry',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to='home.customer'),
+        ),
+        migrations.AddField(
+            model_name='customerledgerentry',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='home.order'),
+        ),
+        migrations.AddIndex(
+            model_name='customerledgerentry',
+            index=models.Index(fields=['customer', 'created_at', 'id'], name='ledger_customer_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerledgerentry',
+            index=models.Index(fields=['created_at', 'kind'], name='ledger_time_kind_idx'),
+        ),
+        migrations.RunPython(open_customer_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:15
+
+import re
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copies of home.customers.normalize_name / normalize_phone
+def normalize_name(name):
+    return ' '.join((name or '').split()).casefold()[:100]
+
+
+def normalize_phone(phone):
+    return re.sub(r'\D', '', phone or '')[:15]
+
+
+def fill_customer_directory(apps, schema_editor):
+    """
+    Normalize names and phones and file every customer under the businesses
+    that sold to them. A customer several businesses sold to (the old global
+    get_or_create(name=)) stays with the business of their latest order and
+    gets a copy at each of the others, which takes that business's orders
+    and sales along. The balance and its ledger stay on the first account:
+    the old data kept one balance for all of them.
+
+    Accounts that then share a (business, name), no business included, are
+    merged into the oldest one: orders, sales and ledger entries move over,
+    the balances add up and the survivor's running balances are redone.
+    """
+    from django.db.models import F
+
+    Customer = apps.get_model('home', 'Customer')
+    Order = apps.get_model('home', 'Order')
+    Sale = apps.get_model('home', 'Sale')
+    CustomerLedgerEntry = apps.get_model('home', 'CustomerLedgerEntry')
+
+    businesses = defaultdict(list)  # customer -> businesses, latest order first
+    for customer_id, business_id in Order.objects.filter(
+        customer__isnull=False, business__isnull=False,
+    ).order_by('customer_id', '-created_at').values_list('customer_id', 'business_id').iterator():
+        if business_id not in businesses[customer_id]:
+            businesses[customer_id].append(business_id)
+
+    kept = {}  # (business, normalized name) -> the account
+    merged = set()
+    for customer in Customer.objects.order_by('pk').iterator():
+        name, phone = normalize_name(customer.name), normalize_phone(customer.phone)
+        first, *others = businesses.get(customer.pk) or [None]
+
+        # That business's share of the history goes to its own account
+        for business_id in others:
+            account = kept.get((business_id, name))
+            if account is None:
+                account = kept[(business_id, name)] = Customer.objects.create(
+                    business_id=business_id, name=customer.name, email=customer.email, phone=customer.phone,
+                    normalized_name=name, normalized_phone=phone,
+                )
+            orders = Order.objects.filter(customer_id=customer.pk, business_id=business_id)
+            Sale.objects.filter(customer_id=customer.pk, order__in=orders).update(customer_id=account.pk)
+            Sale.objects.filter(customer_id=customer.pk, order__isnull=True,
+                                product__business_id=business_id).update(customer_id=account.pk)
+            orders.update(customer_id=account.pk)
+
+        survivor = kept.get((first, name))
+        if survivor is None:
+            customer.business_id = first
+            customer.normalized_name = name
+            customer.normalized_phone = phone
+            customer.save(update_fields=['business', 'normalized_name', 'normalized_phone'])
+            kept[(first, name)] = customer
+            continue
+        Order.objects.filter(customer_id=customer.pk).update(customer_id=survivor.pk)
+        Sale.objects.filter(customer_id=customer.pk).update(customer_id=survivor.pk)
+        # Keep the duplicate's history, the delete below would cascade to it
+        CustomerLedgerEntry.objects.filter(customer_id=customer.pk).update(customer_id=survivor.pk)
+        Customer.objects.filter(pk=survivor.pk).update(
+            remaining_balance=F('remaining_balance') + customer.remaining_balance)
+        customer.delete()
+        merged.add(survivor.pk)
+
+    # Two interleaved histories: redo balance_after as one running total
+    for customer_id in merged:
+        balance = 0
+        for entry in CustomerLedgerEntry.objects.filter(customer_id=customer_id).order_by('created_at', 'id'):
+            balance += entry.amount
+            if entry.balance_after != balance:
+                entry.balance_after = balance
+                entry.save(update_fields=['balance_after'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0034_customer_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='business',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='customers', to='home.business'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='normalized_phone',
+            field=models.CharField(blank=True, default='', editable=False, max_length=15),
+        ),
+        migrations.RunPython(fill_customer_directory, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['business', 'normalized_name'], name='customer_name_prefix_idx', opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['business', 'normalized_phone'], name='customer_phone_prefix_idx', opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddConstraint(
+            model_name='customer',
+            constraint=models.UniqueConstraint(fields=('business', 'normalized_name'), name='customer_business_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='customer',
+            constraint=models.UniqueConstraint(condition=models.Q(('business__isnull', True)), fields=('normalized_name',), name='customer_unowned_name_uniq'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:40
+
+import zoneinfo
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def _zone(name):
+    # Frozen copy of home.models.time_zone_or_default
+    if name:
+        try:
+            return zoneinfo.ZoneInfo(name)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            pass
+    return timezone.get_default_timezone()
+
+
+def rebucket_revenue(apps, schema_editor):
+    """The rows were the server's days; make them each business's own."""
+    Business = apps.get_model('home', 'Business')
+    Sale = apps.get_model('home', 'Sale')
+    DailyBusinessRevenue = apps.get_model('home', 'DailyBusinessRevenue')
+
+    zones = defaultdict(list)
+    for name in Business.objects.values_list('time_zone', flat=True).distinct():
+        zones[str(_zone(name))].append(name)
+    DailyBusinessRevenue.objects.all().delete()
+    for names in zones.values():
+        rows = (
+            Sale.objects.filter(aproved=True, rejected=False, deleted=False, product__business__time_zone__in=names)
+            .annotate(day=TruncDate('date_sold', tzinfo=_zone(names[0])))
+            .values('product__business_id', 'day').annotate(revenue=Sum('total_amount'))
+            .exclude(revenue=0).order_by()
+        )
+        DailyBusinessRevenue.objects.bulk_create(
+            (DailyBusinessRevenue(business_id=row['product__business_id'], day=row['day'], revenue=row['revenue'])
+             for row in rows.iterator(chunk_size=1000)),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0035_customer_directory'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='dailybusinessrevenue',
+            name='cumulative_revenue',
+        ),
+        migrations.RunPython(rebucket_revenue, migrations.RunPython.noop),
+    ]
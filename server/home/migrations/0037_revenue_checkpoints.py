@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:12
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+
+def take_checkpoints(apps, schema_editor):
+    """One checkpoint per business through its last day older than two days."""
+    DailyBusinessRevenue = apps.get_model('home', 'DailyBusinessRevenue')
+    RevenueCheckpoint = apps.get_model('home', 'RevenueCheckpoint')
+
+    rows = (
+        DailyBusinessRevenue.objects.filter(day__lte=timezone.localdate() - timedelta(days=2))
+        .values('business_id').annotate(through=Max('day'), total=Sum('revenue')).order_by()
+    )
+    RevenueCheckpoint.objects.bulk_create(
+        (RevenueCheckpoint(business_id=row['business_id'], day=row['through'], cumulative_revenue=row['total'])
+         for row in rows.iterator(chunk_size=1000)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0036_revenue_business_days'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('cumulative_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='home.business')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('business', 'day'), name='revenue_checkpoint_uniq')],
+            },
+        ),
+        migrations.RunPython(take_checkpoints, migrations.RunPython.noop),
+    ]
@@ -1,20 +1,59 @@
 import os
+import zoneinfo
 from django.db import models
 from django.core.cache import cache
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.utils import timezone
 from django.dispatch import receiver
+from django.core.exceptions import ValidationError
 from authentication.models import User
 
+class InsufficientStock(Exception):
+    """Raised when a sale asks for more units than a product has left."""
+    message = 'Not enough stock available.'
+
+    def __init__(self, product_ids):
+        self.product_ids = list(product_ids)
+        super().__init__(self.message)
+
+
 class Vehicle(models.Model):
     name = models.CharField(max_length=100)
     def __str__(self):
         return self.name
 
 from django.db.models import F
+
+
+def validate_time_zone(value):
+    try:
+        zoneinfo.ZoneInfo(value)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(f"Unknown time zone: {value}")
+
+
+def time_zone_or_default(name):
+    """The zone called `name` (Business.time_zone); settings.TIME_ZONE if blank or unknown."""
+    if name:
+        try:
+            return zoneinfo.ZoneInfo(name)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            pass
+    return timezone.get_default_timezone()
+
+
 class Business(models.Model):
     name = models.CharField(max_length=100)
     owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="owned_businesses")
     members = models.ManyToManyField(User, related_name="businesses")
+    # IANA name (Africa/Dar_es_Salaam); blank means settings.TIME_ZONE
+    time_zone = models.CharField(max_length=64, blank=True, default='', validators=[validate_time_zone])
+
+    @property
+    def tzinfo(self):
+        """Where this business's days start and end, for reports."""
+        return time_zone_or_default(self.time_zone)
     
     
 class Product(models.Model):
@@ -30,6 +69,8 @@ class Product(models.Model):
     sold_units = models.PositiveIntegerField(default=0, null=True)
     amount_collected = models.DecimalField(max_digits=12, decimal_places=2, default=0, null=True)
     created_at = models.DateTimeField(auto_now_add=True, null=True)
+    # Bumped on every save(); queryset.update() callers must set it themselves
+    updated_at = models.DateTimeField(auto_now=True, null=True)
     deleted = models.BooleanField(default=False, null=True)
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name="products", null=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="created_products")
@@ -42,19 +83,43 @@ class Product(models.Model):
         models.Index(fields=['name']),
         models.Index(fields=['brand']),
         models.Index(fields=['part_number']),
+        # Keyset pagination, see home/pagination.py
+        models.Index(fields=['-created_at', '-id'], name='product_keyset_idx'),
+        models.Index(fields=['created_by', '-created_at', '-id'], name='product_owner_keyset_idx'),
+        # Delta sync, see product_sync_view
+        models.Index(fields=['updated_at', 'id'], name='product_sync_idx'),
+        models.Index(fields=['created_by', 'updated_at', 'id'], name='product_owner_sync_idx'),
     ]
 
 
     def __str__(self):
         return f"{self.name}"
 
-    
+    def save(self, *args, **kwargs):
+        from . import stock
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not set(update_fields) & set(stock.COUNTERS):
+            return super().save(*args, **kwargs)
+        # Counters set by hand (new product, restock, corrections) go in the
+        # stock ledger too, see home/stock.py
+        with transaction.atomic():
+            before = None if self._state.adding else stock.stored_counters(self.pk)
+            adding = self._state.adding or before is None
+            super().save(*args, **kwargs)
+            stock.product_saved(self, None if adding else before)
+
     def update_stock(self, sold_units, amount_collected):
-        self.sold_units = F('sold_units') + sold_units
-        self.quantity = F('quantity') - sold_units
-        self.amount_collected = F('amount_collected') + amount_collected
-        self.save()
-        self.refresh_from_db() # Reload to get the new calculated values
+        # Conditional decrement: the WHERE is re-checked on the locked row, so
+        # two cashiers racing for the last units can't both get them.
+        updated = Product.objects.filter(pk=self.pk, quantity__gte=sold_units).update(
+            sold_units=F('sold_units') + sold_units,
+            quantity=F('quantity') - sold_units,
+            amount_collected=F('amount_collected') + amount_collected,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            raise InsufficientStock([self.pk])
+        self.refresh_from_db(fields=['quantity', 'sold_units', 'amount_collected', 'updated_at'])
         
         
         
@@ -69,27 +134,194 @@ class Product(models.Model):
 
 
 
+class ProductTombstone(models.Model):
+    """
+    Left behind when a product row is hard deleted so the delta sync can
+    still tell clients to drop it. Soft deletes (deleted=True) don't need one.
+    """
+    product_id = models.BigIntegerField()
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name="product_tombstones", null=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="+")
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at']),
+            models.Index(fields=['created_by', 'deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"Deleted product #{self.product_id}"
+
+
 class Customer(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=False,blank=True)
     phone = models.CharField(max_length=15, blank=True)
     # sale = models.ManyToManyField(Sale, related_name="customers")
-    remaining_balance = models.IntegerField(default=0)
-    
-    def pay_balance(self, amount):
-        self.remaining_balance = max(0, self.remaining_balance - amount)
-        self.save()
+    # Only moved through home/balances.py (F() updates + a ledger entry);
+    # save() turns a changed value into an adjustment entry
+    remaining_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, null=True, blank=True, related_name="customers")
+    # Set by save() from name / phone (home/customers.py), what lookups and
+    # the directory search compare against
+    normalized_name = models.CharField(max_length=100, editable=False, default='')
+    normalized_phone = models.CharField(max_length=15, editable=False, default='', blank=True)
+
+    class Meta:
+        constraints = [
+            # One account per name per business: checkout lookups are an
+            # index hit and can't create the same customer twice
+            models.UniqueConstraint(fields=['business', 'normalized_name'], name='customer_business_name_uniq'),
+            # NULLs are never equal, so the accounts with no business need their own
+            models.UniqueConstraint(fields=['normalized_name'], condition=models.Q(business__isnull=True),
+                                    name='customer_unowned_name_uniq'),
+        ]
+        indexes = [
+            # Receivables totals only read the accounts that owe something
+            models.Index(fields=['remaining_balance'], name='customer_owing_idx',
+                         condition=models.Q(remaining_balance__gt=0)),
+            # Prefix search (LIKE 'abc%'), the pattern opclasses are PostgreSQL's
+            models.Index(fields=['business', 'normalized_name'], name='customer_name_prefix_idx',
+                         opclasses=['int8_ops', 'varchar_pattern_ops']),
+            models.Index(fields=['business', 'normalized_phone'], name='customer_phone_prefix_idx',
+                         opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What save() compares against to tell a hand edit of the balance
+        instance._loaded_balance = instance.__dict__.get('remaining_balance')
+        return instance
+
+    def pay_balance(self, amount, created_by=None):
+        from . import balances
+        entry = balances.pay(self.pk, amount, created_by=created_by)
+        self.remaining_balance = self._loaded_balance = entry.balance_after
+        return entry
+
+    def save(self, *args, **kwargs):
+        from . import balances, customers
+        self.normalized_name = customers.normalize_name(self.name)
+        self.normalized_phone = customers.normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            update_fields |= {'normalized_name'} if 'name' in update_fields else set()
+            update_fields |= {'normalized_phone'} if 'phone' in update_fields else set()
+            kwargs['update_fields'] = update_fields
+        if self._state.adding:
+            opening = self.remaining_balance or 0
+            with transaction.atomic():
+                self.remaining_balance = 0
+                super().save(*args, **kwargs)
+                self.remaining_balance = self._loaded_balance = opening
+                if opening:
+                    balances.post(self.pk, opening, CustomerLedgerEntry.OPENING)
+            return
+        if update_fields is not None and 'remaining_balance' not in update_fields:
+            return super().save(*args, **kwargs)
+        # Never write the balance back as a whole: a sale may have moved it
+        # since this instance was loaded. A changed value becomes an F()
+        # adjustment of the difference instead.
+        fields = [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.name != 'remaining_balance'
+            and (update_fields is None or field.name in update_fields)
+        ]
+        with transaction.atomic():
+            loaded = getattr(self, '_loaded_balance', None)
+            if loaded is None:
+                loaded = Customer.objects.select_for_update().values_list('remaining_balance', flat=True).get(pk=self.pk)
+            if fields:
+                kwargs['update_fields'] = fields
+                super().save(*args, **kwargs)
+            change = (self.remaining_balance or 0) - loaded
+            if change:
+                entry = balances.post(self.pk, change, CustomerLedgerEntry.ADJUSTMENT)
+                self.remaining_balance = self._loaded_balance = entry.balance_after
 
-    
     def __str__(self):
         return self.name
 
+
+class CustomerLedgerEntry(models.Model):
+    """
+    One change of a customer's remaining_balance, with the balance it left
+    (home/balances.py). Charges are positive, payments negative.
+    """
+    OPENING = 'opening'
+    CHARGE = 'charge'
+    PAYMENT = 'payment'
+    ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = [
+        (OPENING, 'Opening balance'),
+        (CHARGE, 'Charge'),
+        (PAYMENT, 'Payment'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="ledger")
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    balance_after = models.DecimalField(max_digits=14, decimal_places=2)
+    order = models.ForeignKey('Order', on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    note = models.CharField(max_length=255, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="+")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Statements and balance-at lookups
+            models.Index(fields=['customer', 'created_at', 'id'], name='ledger_customer_time_idx'),
+            # Period totals for receivables
+            models.Index(fields=['created_at', 'kind'], name='ledger_time_kind_idx'),
+        ]
+
+class Order(models.Model):
+    """
+    Header for one checkout, its Sale rows are the lines. Receipts and the
+    day-close report read one order (or one business-day range of the index)
+    instead of guessing baskets from date_sold and customer.
+    """
+    business = models.ForeignKey(Business, on_delete=models.SET_NULL, null=True, related_name="orders")
+    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, related_name="orders")
+    customer_name = models.CharField(max_length=100, blank=True)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # As sent by the till, created_at is when we received it
+    transaction_date = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="orders")
+    # Generated by the till for every queued checkout, a retried upload with
+    # the same key gets the order that was already recorded (home/sync.py)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['business', '-transaction_date', '-id'], name='order_business_date_idx'),
+            models.Index(fields=['created_by', '-transaction_date', '-id'], name='order_owner_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['created_by', 'idempotency_key'], name='order_idempotency_uniq',
+                                    condition=models.Q(idempotency_key__isnull=False)),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.pk} - {self.customer_name}"
+
+
 class Sale(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="sales")
+    # Set for sales recorded through a checkout, older rows and single-item
+    # sales have none
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name="lines")
     quantity_sold = models.PositiveIntegerField()
     price_per_unit = models.DecimalField(max_digits=10, decimal_places=2)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, editable=False)
     date_sold = models.DateTimeField(auto_now_add=True)
+    # Bumped on every save(); queryset.update() callers must set it themselves
+    updated_at = models.DateTimeField(auto_now=True, null=True)
     aproved = models.BooleanField(default=False,)
     deleted = models.BooleanField(default=False,)
     rejected = models.BooleanField(default=False,)
@@ -101,27 +333,234 @@ class Sale(models.Model):
         related_name="sales"
     )
 
+    class Meta:
+        indexes = [
+            # SaleKeysetPagination pages on (date_sold, id); one per list filter
+            # (home/sale_filters.py) so every filtered page is a range scan
+            models.Index(fields=['-date_sold', '-id'], name='sale_keyset_idx'),
+            models.Index(fields=['product', '-date_sold', '-id'], name='sale_product_keyset_idx'),
+            models.Index(fields=['customer', '-date_sold', '-id'], name='sale_customer_keyset_idx'),
+            models.Index(fields=['created_by', '-date_sold', '-id'], name='sale_seller_keyset_idx'),
+            models.Index(fields=['aproved', 'rejected', '-date_sold', '-id'], name='sale_status_keyset_idx'),
+        ]
+
     def __str__(self):
         return f"Sale of {self.product.name} - {self.quantity_sold} units"
 
     def save(self, *args, **kwargs):
+        from . import rollups, stock
         # Auto-calculate total amount
         self.total_amount = self.quantity_sold * self.price_per_unit
-        super().save(*args, **kwargs)
-        # Update product after saving sale
-        self.product.update_stock(self.quantity_sold, self.total_amount)
-        
+        with transaction.atomic():
+            # Take the stock first (only when the sale is recorded, not on
+            # every later save), so a short product never gets a sale row
+            if self._state.adding:
+                if stock.held_by(self) is not None:
+                    self.product.update_stock(self.quantity_sold, self.total_amount)
+                before = None
+            else:
+                # Edits, reject and soft delete move only the difference;
+                # one locked read of the stored row serves both ledgers
+                stored = Sale.objects.select_for_update().filter(pk=self.pk).values(
+                    *{*stock.HELD_FIELDS, *rollups.STATE_FIELDS}).first()
+                stock.sale_changed(self.pk, stock.held_of_row(stored), stock.held_by(self))
+                before = rollups.state_of_row(stored)
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            if adding and stock.held_by(self) is not None:
+                stock.log_sales([self])
+            rollups.sale_changed(before, rollups.state_of(self))
+
+
+class DailySalesRollup(models.Model):
+    """
+    Approved sales per product per (local) day, kept in step with Sale by
+    home/rollups.py. Reports read these instead of raw sales; rebuild with
+    `manage.py rebuild_sales_rollups`.
+    """
+    business = models.ForeignKey(Business, on_delete=models.SET_NULL, null=True, related_name="+")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_rollups")
+    day = models.DateField()
+    sales_count = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # quantity * product.buying_price at the time the sale was counted
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='rollup_product_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['business', 'day'], name='rollup_business_day_idx'),
+            models.Index(fields=['day'], name='rollup_day_idx'),
+        ]
+
+
+class DailyBusinessRevenue(models.Model):
+    """
+    Approved revenue per business per day, the business's own days
+    (Business.tzinfo). Running totals are the latest RevenueCheckpoint plus
+    the days after it, see rollups.revenue_through. Kept in step by
+    rollups.apply(); rebuilt by `manage.py rebuild_sales_rollups`.
+    """
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index behind the "days since the checkpoint" sums
+            models.UniqueConstraint(fields=['business', 'day'], name='revenue_business_day_uniq'),
+        ]
+
+
+class RevenueCheckpoint(models.Model):
+    """
+    A business's approved revenue up to and including `day`, folded from its
+    DailyBusinessRevenue rows (`manage.py checkpoint_revenue`). Changes to
+    earlier days add to it, see rollups.apply_revenue.
+    """
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    cumulative_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index behind the "latest checkpoint on or before day" lookups
+            models.UniqueConstraint(fields=['business', 'day'], name='revenue_checkpoint_uniq'),
+        ]
+
+
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger of Product.quantity / sold_units / amount_collected:
+    each row is the signed change one event made to them. Written by
+    home/stock.py, never updated. product and sale aren't foreign keys so
+    the history outlives them.
+    """
+    OPENING = 'opening'
+    SALE = 'sale'
+    REVERSAL = 'reversal'
+    RESTOCK = 'restock'
+    ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = [
+        (OPENING, 'Opening stock'),
+        (SALE, 'Sale'),
+        (REVERSAL, 'Sale reversed'),
+        (RESTOCK, 'Restock'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    sale_id = models.BigIntegerField(null=True, blank=True)
+    quantity = models.IntegerField(default=0)
+    sold_units = models.IntegerField(default=0)
+    amount_collected = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Tail after a snapshot, and stock as of a time
+            models.Index(fields=['product', 'id'], name='stock_movement_product_idx'),
+            models.Index(fields=['product', 'created_at'], name='stock_movement_time_idx'),
+        ]
+
+
+class StockSnapshot(models.Model):
+    """
+    A product's counters folded up to and including movement
+    through_movement_id (`manage.py snapshot_stock`).
+    """
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    through_movement_id = models.BigIntegerField()
+    as_of = models.DateTimeField()
+    quantity = models.IntegerField(default=0)
+    sold_units = models.IntegerField(default=0)
+    amount_collected = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-through_movement_id'], name='stock_snapshot_latest_idx'),
+            models.Index(fields=['product', '-as_of'], name='stock_snapshot_time_idx'),
+        ]
 
 
 @receiver(post_save, sender=Product)
 @receiver(post_delete, sender=Product)
 def clear_product_cache(sender, instance, **kwargs):
-    cache.delete('product_list')
+    from . import list_cache
+    list_cache.bump_on_commit(*list_cache.product_scopes(instance.business_id, instance.created_by_id))
     print("Product cache cleared.")
 
+@receiver(post_delete, sender=Product)
+def record_product_tombstone(sender, instance, **kwargs):
+    ProductTombstone.objects.create(
+        product_id=instance.pk,
+        business_id=instance.business_id,
+        created_by_id=instance.created_by_id,
+    )
+
+@receiver(post_save, sender=Product)
+def update_autocomplete_index(sender, instance, **kwargs):
+    from . import autocomplete
+    # Snapshot now, the instance may be changed again before commit
+    args = (instance.pk, instance.business_id, instance.created_by_id, instance.name,
+            instance.part_number, instance.deleted, instance.updated_at)
+    transaction.on_commit(lambda: autocomplete.product_saved(*args))
+
+@receiver(post_delete, sender=Product)
+def remove_from_autocomplete_index(sender, instance, **kwargs):
+    from . import autocomplete
+    # pk is cleared on the instance once the delete finishes
+    args = (instance.pk, instance.business_id, instance.created_by_id)
+    transaction.on_commit(lambda: autocomplete.product_deleted(*args))
+
+@receiver(m2m_changed, sender=Product.vehicles.through)
+def touch_products_on_vehicles_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # vehicle_list is part of the product payload, so relinking vehicles has
+    # to move updated_at (ETags, delta sync) and the list cache versions
+    from . import list_cache
+    if reverse and action == 'pre_clear':
+        # vehicle.product_set.clear(): post_clear has no pk_set, remember them
+        instance._cleared_product_ids = list(instance.product_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        products = Product.objects.filter(pk=instance.pk)
+    else:
+        if action == 'post_clear':
+            pk_set = instance.__dict__.pop('_cleared_product_ids', None)
+        if not pk_set:
+            return
+        products = Product.objects.filter(pk__in=pk_set)
+    products.update(updated_at=timezone.now())
+    for business_id, created_by_id in products.values_list('business_id', 'created_by_id').distinct():
+        list_cache.bump_on_commit(*list_cache.product_scopes(business_id, created_by_id))
+
+@receiver(pre_delete, sender=Sale)
+def give_back_deleted_sale_stock(sender, instance, **kwargs):
+    from . import stock
+    stock.sale_changed(instance.pk, stock.stored_held(instance.pk), None)
+
+@receiver(post_delete, sender=Sale)
+def remove_sale_from_rollups(sender, instance, **kwargs):
+    from . import rollups
+    rollups.sale_changed(rollups.state_of(instance), None)
+
 @receiver(post_save, sender=Sale)
 @receiver(post_delete, sender=Sale)
 def clear_sales_cache(sender, instance, **kwargs):
+    from . import list_cache
     cache.delete('sales_summary')
+    if Sale.product.is_cached(instance):
+        product = {'business_id': instance.product.business_id, 'created_by_id': instance.product.created_by_id}
+    else:
+        product = Product.objects.filter(pk=instance.product_id).values('business_id', 'created_by_id').first()
+    if product is not None:
+        list_cache.bump_on_commit(*list_cache.product_scopes(product['business_id'], product['created_by_id']))
     print("Product cache cleared.")
 
@@ -0,0 +1,19 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+
+def notify_user(user_id, message):
+    """
+    Push a message to the user's open websockets (ChatConsumer joins every
+    connection to the "user_<id>" group). Best effort: a dead channel layer
+    must not fail the request that triggered the notification.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            f"user_{user_id}", {"type": "send_notification", "message": message}
+        )
+    except Exception as e:
+        print(f"Notification to user {user_id} failed: {e}")
@@ -0,0 +1,154 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_position(key, pk):
+    """Opaque token for a (timestamp, id) position."""
+    raw = f"{key.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_position(token):
+    """Inverse of encode_position, raises ValueError on garbage."""
+    try:
+        raw = base64.urlsafe_b64decode(token.encode()).decode()
+        key, pk = raw.rsplit('|', 1)
+        key = parse_datetime(key)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid position token: {token!r}")
+    if key is None:
+        raise ValueError(f"Invalid position token: {token!r}")
+    return key, pk
+
+
+def encode_text_position(key, pk):
+    """Like encode_position, for a text key."""
+    return base64.urlsafe_b64encode(json.dumps([key, pk]).encode()).decode()
+
+
+def decode_text_position(token):
+    try:
+        key, pk = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid position token: {token!r}")
+    if not isinstance(key, str) or not isinstance(pk, int):
+        raise ValueError(f"Invalid position token: {token!r}")
+    return key, pk
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (key_field, id), newest first (oldest or A to
+    Z first with descending = False).
+
+    The cursor is the (key_field, id) pair of the last row on the page, so the
+    next page is a single range scan on the composite index instead of an
+    OFFSET, and page N costs the same as page 1.
+
+    Opt-in: the views only use it when the request carries ?pagination=cursor
+    (or a cursor), everything else keeps getting the plain list.
+    """
+    key_field = 'created_at'
+    descending = True
+    page_size = 100
+    max_page_size = 1000
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    @classmethod
+    def is_requested(cls, request):
+        return (request.query_params.get(cls.mode_query_param) == 'cursor'
+                or cls.cursor_query_param in request.query_params)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def encode_cursor(self, obj):
+        return encode_position(getattr(obj, self.key_field), obj.pk)
+
+    def decode_token(self, token):
+        return decode_position(token)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return self.decode_token(encoded)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        sign, before, at_or_before = ('-', 'lt', 'lte') if self.descending else ('', 'gt', 'gte')
+        queryset = queryset.order_by(f'{sign}{self.key_field}', f'{sign}id')
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            key, pk = cursor
+            # The leading "<=" gives the planner an index range to start from,
+            # the OR breaks ties on id for rows sharing the same timestamp.
+            queryset = queryset.filter(
+                Q(**{f'{self.key_field}__{at_or_before}': key}),
+                Q(**{f'{self.key_field}__{before}': key}) | Q(**{f'id__{before}': pk}),
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_cursor = self.encode_cursor(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.mode_query_param, 'cursor')
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        })
+
+
+class ProductKeysetPagination(KeysetPagination):
+    key_field = 'created_at'
+
+
+class SaleKeysetPagination(KeysetPagination):
+    """Sales newest first on (date_sold, id), see the sale_*_keyset_idx indexes."""
+    key_field = 'date_sold'
+    page_size = 50
+
+
+class CustomerKeysetPagination(KeysetPagination):
+    """Customers A to Z on (normalized_name, id), see customer_name_prefix_idx."""
+    key_field = 'normalized_name'
+    descending = False
+    page_size = 50
+
+    def encode_cursor(self, obj):
+        return encode_text_position(obj.normalized_name, obj.pk)
+
+    def decode_token(self, token):
+        return decode_text_position(token)
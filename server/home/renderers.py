@@ -0,0 +1,71 @@
+"""
+MessagePack (and LZ4-framed MessagePack) renderers and parsers for DRF.
+
+Picked by content negotiation, so a client opts in with
+    Accept: application/msgpack
+    Accept: application/x-msgpack-lz4
+and can post the same formats with a matching Content-Type. Everyone else
+keeps getting JSON.
+
+Anything msgpack can't pack natively (Decimal, UUID, datetime, lazy strings...)
+goes through DRF's own JSONEncoder.default, so a decoded msgpack body is the
+same data the JSON renderer would have produced.
+"""
+import lz4.frame
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_default = JSONEncoder().default
+
+
+def packb(data):
+    return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+def unpackb(body):
+    return msgpack.unpackb(body, raw=False)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return packb(data)
+
+
+class LZ4MessagePackRenderer(MessagePackRenderer):
+    media_type = 'application/x-msgpack-lz4'
+    format = 'msgpack-lz4'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return lz4.frame.compress(packb(data))
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def decode(self, body):
+        return body
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return unpackb(self.decode(stream.read()))
+        except Exception as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
+
+
+class LZ4MessagePackParser(MessagePackParser):
+    media_type = 'application/x-msgpack-lz4'
+
+    def decode(self, body):
+        return lz4.frame.decompress(body)
@@ -0,0 +1,350 @@
+"""
+Daily sales rollups (DailySalesRollup): one row per product per local day
+with count, units, revenue and cost of the approved sales.
+
+Kept current inside the same transaction as the sale change:
+- Sale.save() compares the stored row with the new one (approve, reject,
+  edits), the post_delete receiver removes deleted sales,
+- bulk paths that skip save() (approvals.review_sales) call apply() with
+  their own deltas.
+
+Only positive deltas may create a row, so removing a sale whose rollup is
+already gone (product cascade deletes) is a no-op.
+
+Cost uses the product's buying price when the delta is applied; rebuild()
+recomputes everything from the sales if the two drift apart.
+
+The same deltas move DailyBusinessRevenue, revenue per business and day,
+with days counted in the business's own time zone. Each change is an F()
+update of its own day's row, plus the RevenueCheckpoints after that day
+(none, unless the day is older than the latest checkpoint). A running total
+is the latest checkpoint on or before the day plus the few days after it;
+`manage.py checkpoint_revenue` folds new days into a checkpoint every now
+and then. The top sellers leaderboard gets the deltas too, once the
+transaction commits.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from . import leaderboard
+
+# Days this recent stay out of checkpoints: sales are still being approved
+CHECKPOINT_LAG = timedelta(days=2)
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+STATE_FIELDS = ('product_id', 'date_sold', 'quantity_sold', 'total_amount', 'aproved', 'rejected', 'deleted')
+
+
+def _counted(aproved, rejected, deleted):
+    return aproved and not rejected and not deleted
+
+
+def local_day(date_sold, tz=None):
+    """The day `date_sold` falls on in `tz` (default the current time zone)."""
+    return timezone.localtime(date_sold, tz).date() if timezone.is_aware(date_sold) else date_sold.date()
+
+
+def state_of(sale):
+    """(product_id, date_sold, units, revenue) if the sale counts towards the rollups, else None."""
+    if not _counted(sale.aproved, sale.rejected, sale.deleted) or sale.date_sold is None:
+        return None
+    return (sale.product_id, sale.date_sold, sale.quantity_sold, sale.total_amount)
+
+
+def state_of_row(row):
+    """state_of() a sale's .values() row (with STATE_FIELDS), None for no row."""
+    if row is None or not _counted(row['aproved'], row['rejected'], row['deleted']):
+        return None
+    return (row['product_id'], row['date_sold'], row['quantity_sold'], row['total_amount'])
+
+
+def sale_changed(before, after):
+    if before == after:
+        return
+    deltas = defaultdict(lambda: [0, 0, Decimal(0)])
+    for state, sign in ((before, -1), (after, 1)):
+        if state is not None:
+            product_id, date_sold, units, revenue = state
+            delta = deltas[(product_id, date_sold)]
+            delta[0] += sign
+            delta[1] += sign * units
+            delta[2] += sign * revenue
+    apply(deltas)
+
+
+def apply(deltas):
+    """deltas: {(product_id, date_sold): [sales_count, units, revenue]}"""
+    from .models import DailySalesRollup, Product, time_zone_or_default
+
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    products = {
+        pk: (business_id, created_by_id, buying_price or 0, time_zone_or_default(time_zone))
+        for pk, business_id, created_by_id, buying_price, time_zone in Product.objects.filter(
+            pk__in={product_id for product_id, _ in deltas}
+        ).values_list('pk', 'business_id', 'created_by_id', 'buying_price', 'business__time_zone')
+    }
+    # Rollups go by the server's days, revenue by each business's own
+    day_deltas = defaultdict(lambda: [0, 0, Decimal(0)])
+    revenue_deltas = defaultdict(Decimal)
+    for (product_id, date_sold), delta in deltas.items():
+        if product_id not in products:
+            continue
+        business_id, _, _, tz = products[product_id]
+        day_delta = day_deltas[(product_id, local_day(date_sold))]
+        for i, value in enumerate(delta):
+            day_delta[i] += value
+        if business_id is not None:
+            revenue_deltas[(business_id, local_day(date_sold, tz))] += delta[2]
+
+    board_changes = []
+    for (product_id, day), (count, units, revenue) in day_deltas.items():
+        if not any((count, units, revenue)):
+            continue
+        business_id, created_by_id, buying_price, _ = products[product_id]
+        cost = units * buying_price
+        changes = dict(
+            sales_count=F('sales_count') + count,
+            units=F('units') + units,
+            revenue=F('revenue') + revenue,
+            cost=F('cost') + cost,
+        )
+        rollups = DailySalesRollup.objects.filter(product_id=product_id, day=day)
+        if rollups.update(**changes):
+            if count < 0:
+                # Last sale of the day gone, keep the table what rebuild() makes
+                rollups.filter(sales_count__lte=0).delete()
+        elif count <= 0:
+            continue
+        else:
+            try:
+                with transaction.atomic():
+                    DailySalesRollup.objects.create(
+                        business_id=business_id, product_id=product_id, day=day,
+                        sales_count=count, units=units, revenue=revenue, cost=cost,
+                    )
+            except IntegrityError:
+                # Another transaction created the row first
+                rollups.update(**changes)
+        board_changes.append((business_id, created_by_id, product_id, day, units))
+    apply_revenue(revenue_deltas)
+    leaderboard.record(board_changes)
+
+
+def apply_revenue(deltas):
+    """deltas: {(business_id, day): revenue}"""
+    from .models import DailyBusinessRevenue, RevenueCheckpoint
+
+    deltas = {key: revenue for key, revenue in deltas.items() if revenue}
+    # Same order everywhere, so two writers can't deadlock on each other:
+    # the day rows first, then the checkpoints
+    for (business_id, day), revenue in sorted(deltas.items()):
+        rows = DailyBusinessRevenue.objects.filter(business_id=business_id, day=day)
+        if rows.update(revenue=F('revenue') + revenue):
+            if revenue < 0:
+                # Nothing left that day, like rebuild_revenue() leaves it
+                rows.filter(revenue=0).delete()
+            continue
+        if revenue < 0:
+            continue
+        try:
+            with transaction.atomic():
+                DailyBusinessRevenue.objects.create(business_id=business_id, day=day, revenue=revenue)
+        except IntegrityError:
+            # Another transaction created the row first
+            rows.update(revenue=F('revenue') + revenue)
+    for (business_id, day), revenue in sorted(deltas.items()):
+        RevenueCheckpoint.objects.filter(business_id=business_id, day__gte=day).update(
+            cumulative_revenue=F('cumulative_revenue') + revenue
+        )
+
+
+def revenue_through(days, businesses):
+    """
+    {day: approved revenue of `businesses` up to and including day}, in one
+    query: per business and day, the latest checkpoint on or before it plus
+    the days after that checkpoint, index lookups that don't grow with the
+    history.
+    """
+    from .models import DailyBusinessRevenue, RevenueCheckpoint
+
+    days = sorted(set(days))
+    lookups = {}
+    for i, day in enumerate(days):
+        checkpoint = Subquery(
+            RevenueCheckpoint.objects.filter(business=OuterRef('pk'), day__lte=day)
+            .order_by('-day').values('cumulative_revenue')[:1]
+        )
+        since = Subquery(
+            RevenueCheckpoint.objects.filter(business=OuterRef('business'), day__lte=day)
+            .order_by('-day').values('day')[:1]
+        )
+        tail = (
+            DailyBusinessRevenue.objects.filter(business=OuterRef('pk'), day__lte=day)
+            .filter(day__gt=Coalesce(since, Value(date.min)))
+            .order_by().values('business').annotate(total=Sum('revenue')).values('total')
+        )
+        lookups[f'checkpoint_{i}'] = Coalesce(checkpoint, Value(Decimal(0)), output_field=MONEY)
+        lookups[f'tail_{i}'] = Coalesce(Subquery(tail), Value(Decimal(0)), output_field=MONEY)
+    totals = businesses.order_by().annotate(**lookups).aggregate(
+        **{f'total_{i}': Sum(F(f'checkpoint_{i}') + F(f'tail_{i}'), output_field=MONEY) for i in range(len(days))}
+    )
+    return {day: totals[f'total_{i}'] or 0 for i, day in enumerate(days)}
+
+
+def take_revenue_checkpoints(business_id=None, min_days=1, lag=CHECKPOINT_LAG, apps=None):
+    """
+    Fold each business's days older than `lag` since its latest checkpoint
+    into a new one, for the businesses with at least `min_days` of them.
+    Returns how many were taken.
+    """
+    if apps is None:
+        from django.apps import apps
+    DailyBusinessRevenue = apps.get_model('home', 'DailyBusinessRevenue')
+    RevenueCheckpoint = apps.get_model('home', 'RevenueCheckpoint')
+
+    cutoff = timezone.localdate() - lag
+    rows = DailyBusinessRevenue.objects.filter(day__lte=cutoff)
+    if business_id is not None:
+        rows = rows.filter(business_id=business_id)
+    since = Subquery(
+        RevenueCheckpoint.objects.filter(business=OuterRef('business')).order_by('-day').values('day')[:1]
+    )
+    rows = rows.annotate(since=since).filter(day__gt=Coalesce(F('since'), Value(date.min)))
+
+    with transaction.atomic():
+        # Changes to these days wait for us, then add to the new checkpoint.
+        # A backdated sale on a day with no row yet can still slip past;
+        # rebuild_revenue() puts that right
+        folded = defaultdict(lambda: [0, None, Decimal(0)])  # business -> [days, through, revenue]
+        for business, day, revenue in rows.select_for_update().values_list('business_id', 'day', 'revenue'):
+            fold = folded[business]
+            fold[0] += 1
+            fold[1] = max(fold[1] or day, day)
+            fold[2] += revenue
+        folded = {business: fold for business, fold in folded.items() if fold[0] >= min_days}
+        previous = {
+            business: total for business, total in
+            RevenueCheckpoint.objects.filter(business_id__in=folded)
+            .annotate(latest=Subquery(
+                RevenueCheckpoint.objects.filter(business=OuterRef('business')).order_by('-day').values('pk')[:1]
+            )).filter(pk=F('latest')).values_list('business_id', 'cumulative_revenue')
+        }
+        RevenueCheckpoint.objects.bulk_create(
+            RevenueCheckpoint(business_id=business, day=through,
+                              cumulative_revenue=previous.get(business, 0) + revenue)
+            for business, (_, through, revenue) in folded.items()
+        )
+    return len(folded)
+
+
+def rebuild(business_id=None, apps=None, batch_size=1000):
+    """
+    Recompute rollups from the sales (all of them, or one business's).
+    `apps` is for running from a migration with historical models.
+    """
+    if apps is None:
+        from django.apps import apps
+    Sale = apps.get_model('home', 'Sale')
+    DailySalesRollup = apps.get_model('home', 'DailySalesRollup')
+
+    sales = Sale.objects.filter(aproved=True, rejected=False, deleted=False)
+    rollups = DailySalesRollup.objects.all()
+    if business_id is not None:
+        sales = sales.filter(product__business_id=business_id)
+        rollups = rollups.filter(product__business_id=business_id)
+
+    rows = (
+        sales.annotate(day=TruncDate('date_sold', tzinfo=timezone.get_current_timezone()))
+        .values('product_id', 'product__business_id', 'day')
+        .annotate(
+            sales_count=Count('id'),
+            units=Sum('quantity_sold'),
+            revenue=Sum('total_amount'),
+            cost=Sum(ExpressionWrapper(
+                F('quantity_sold') * F('product__buying_price'),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            )),
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        created = 0
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(DailySalesRollup(
+                business_id=row['product__business_id'], product_id=row['product_id'], day=row['day'],
+                sales_count=row['sales_count'], units=row['units'] or 0,
+                revenue=row['revenue'] or 0, cost=row['cost'] or 0,
+            ))
+            if len(batch) >= batch_size:
+                DailySalesRollup.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        DailySalesRollup.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def rebuild_revenue(business_id=None, apps=None, batch_size=1000):
+    """
+    Recompute the daily revenue from the approved sales, in each business's
+    time zone, and checkpoint it afresh.
+    """
+    from .models import time_zone_or_default
+
+    if apps is None:
+        from django.apps import apps
+    Business = apps.get_model('home', 'Business')
+    Sale = apps.get_model('home', 'Sale')
+    DailyBusinessRevenue = apps.get_model('home', 'DailyBusinessRevenue')
+
+    RevenueCheckpoint = apps.get_model('home', 'RevenueCheckpoint')
+
+    businesses = Business.objects.all()
+    totals = DailyBusinessRevenue.objects.all()
+    checkpoints = RevenueCheckpoint.objects.all()
+    sales = Sale.objects.filter(aproved=True, rejected=False, deleted=False, product__business__isnull=False)
+    if business_id is not None:
+        businesses = businesses.filter(pk=business_id)
+        totals = totals.filter(business_id=business_id)
+        checkpoints = checkpoints.filter(business_id=business_id)
+        sales = sales.filter(product__business_id=business_id)
+
+    # One query per time zone in use, by the names that resolve to it
+    zones = defaultdict(list)
+    for name in businesses.values_list('time_zone', flat=True).distinct():
+        zones[str(time_zone_or_default(name))].append(name)
+
+    with transaction.atomic():
+        totals.delete()
+        checkpoints.delete()
+        batch = []
+        created = 0
+        for zone, names in zones.items():
+            rows = (
+                sales.filter(product__business__time_zone__in=names)
+                .annotate(day=TruncDate('date_sold', tzinfo=time_zone_or_default(names[0])))
+                .values('product__business_id', 'day').annotate(revenue=Sum('total_amount'))
+                .exclude(revenue=0).order_by()
+            )
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(DailyBusinessRevenue(
+                    business_id=row['product__business_id'], day=row['day'], revenue=row['revenue'],
+                ))
+                if len(batch) >= batch_size:
+                    DailyBusinessRevenue.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+        DailyBusinessRevenue.objects.bulk_create(batch)
+        created += len(batch)
+        take_revenue_checkpoints(business_id, apps=apps)
+    return created
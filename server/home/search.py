@@ -0,0 +1,195 @@
+"""
+Ranked product search.
+
+PostgreSQL: a GIN index over a 'simple' tsvector of name/part_number/brand/
+description for word matches (ranked with ts_rank), plus pg_trgm GIN indexes
+on name and part_number so the substring fallback (icontains) is an index scan
+too. Partial part numbers like "AA07" are what counter staff actually type.
+
+SQLite: an external-content FTS5 table kept in sync by triggers, queried with
+prefix terms and ranked by bm25. A search for the best few matches (limit=)
+pulls their ids out of FTS5 in order; a full result list (a paginated
+page) filters and ranks with subqueries, so it is never cut short.
+
+Anything else falls back to the old icontains scan.
+
+The index DDL lives here (and not only in the migration) because SQLite drops
+triggers whenever Django remakes the home_product table, so ensure_search_index
+is also run after every migrate, see HomeConfig.ready.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+SEARCH_FIELDS = ('name', 'part_number', 'brand', 'description')
+SEARCH_CONFIG = 'simple'
+
+SQLITE_FTS_TABLE = 'home_product_fts'
+
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        name, part_number, brand, description,
+        content='home_product', content_rowid='id', prefix='2 3 4'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ai AFTER INSERT ON home_product BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, part_number, brand, description)
+        VALUES (new.id, new.name, new.part_number, new.brand, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ad AFTER DELETE ON home_product BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, part_number, brand, description)
+        VALUES ('delete', old.id, old.name, old.part_number, old.brand, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_au AFTER UPDATE OF name, part_number, brand, description ON home_product BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, part_number, brand, description)
+        VALUES ('delete', old.id, old.name, old.part_number, old.brand, old.description);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, part_number, brand, description)
+        VALUES (new.id, new.name, new.part_number, new.brand, new.description);
+    END""",
+]
+
+# Django compiles icontains to UPPER(col::text) LIKE UPPER(%s) on PostgreSQL,
+# so the trigram indexes are built on that exact expression.
+POSTGRES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS product_name_trgm_idx ON home_product USING gin ((UPPER(name::text)) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS product_part_number_trgm_idx ON home_product USING gin ((UPPER(part_number::text)) gin_trgm_ops)",
+]
+
+
+def product_search_vector():
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector(*SEARCH_FIELDS, config=SEARCH_CONFIG)
+
+
+def ensure_search_index(connection, model=None):
+    """Create the search index objects for this backend if they are missing."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{SQLITE_FTS_TABLE}_a_'],
+            )
+            in_sync = cursor.fetchone()[0] == 3
+            for statement in SQLITE_FTS_SQL:
+                cursor.execute(statement)
+            if not in_sync:
+                cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+    elif connection.vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        if model is None:
+            from .models import Product as model
+
+        with connection.cursor() as cursor:
+            for statement in POSTGRES_SQL:
+                cursor.execute(statement)
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'product_search_tsv_idx'")
+            exists = cursor.fetchone() is not None
+        if not exists:
+            # Built through the schema editor so the indexed expression is
+            # exactly what the ORM emits for product_search_vector()
+            with connection.schema_editor() as schema_editor:
+                schema_editor.add_index(
+                    model, GinIndex(product_search_vector(), name='product_search_tsv_idx')
+                )
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}")
+        elif connection.vendor == 'postgresql':
+            for index in ('product_search_tsv_idx', 'product_name_trgm_idx', 'product_part_number_trgm_idx'):
+                cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def _fts5_match(query):
+    # Quote every token so user input can't inject FTS syntax, and make the
+    # last one a prefix so results update while the user is still typing.
+    tokens = re.findall(r'\w+', query)
+    if not tokens:
+        return None
+    terms = ['"%s"' % token for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _search_postgres(queryset, query):
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset
+        .alias(search_vector=product_search_vector())
+        .filter(
+            Q(search_vector=search_query)
+            | Q(part_number__icontains=query)
+            | Q(name__icontains=query)
+        )
+        .annotate(search_rank=SearchRank(F('search_vector'), search_query))
+        .order_by('-search_rank', '-id')
+    )
+
+
+def _search_sqlite(queryset, query, limit=None):
+    match = _fts5_match(query)
+    if match is None:
+        return queryset.none()
+    if limit is None:
+        product_id = f'"{queryset.model._meta.db_table}"."id"'
+        matching = RawSQL(f"SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s", [match])
+        rank = RawSQL(
+            f"SELECT bm25({SQLITE_FTS_TABLE}) FROM {SQLITE_FTS_TABLE} "
+            f"WHERE {SQLITE_FTS_TABLE} MATCH %s AND rowid = {product_id}",
+            [match], output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matching).annotate(search_rank=rank).order_by('search_rank', '-id')
+
+    scope_sql, scope_params = queryset.values('id').query.sql_with_params()
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {SQLITE_FTS_TABLE} "
+            f"WHERE {SQLITE_FTS_TABLE} MATCH %s AND rowid IN ({scope_sql}) "
+            f"ORDER BY bm25({SQLITE_FTS_TABLE}), rowid DESC LIMIT %s",
+            [match, *scope_params, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+
+    if not ids:
+        return queryset.none()
+    rank = Case(
+        *[When(id=pk, then=Value(float(position))) for position, pk in enumerate(ids)],
+        output_field=FloatField(),
+    )
+    return queryset.filter(id__in=ids).annotate(search_rank=rank).order_by('search_rank')
+
+
+def _search_icontains(queryset, query):
+    return queryset.filter(
+        Q(name__icontains=query) |
+        Q(description__icontains=query) |
+        Q(brand__icontains=query) |
+        Q(part_number__icontains=query)
+    )
+
+
+def search_product_queryset(queryset, query, limit=None):
+    """
+    Filter a Product queryset down to rows matching `query`, best match
+    first: all of them, or only the best `limit` (a search box).
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        return _search_sqlite(queryset, query, limit)
+    if vendor == 'postgresql':
+        results = _search_postgres(queryset, query)
+    else:
+        results = _search_icontains(queryset, query)
+    return results if limit is None else results[:limit]
@@ -1,10 +1,17 @@
 # serializers.py
+import functools
+from decimal import Decimal
+
+from django.conf import settings
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
 from rest_framework import serializers
 from django.db import transaction
-from .models import Sale, Product, Customer
+from django.utils import timezone
+from .models import Sale, Product, Customer, InsufficientStock, Order
+from .checkout import checkout, lines_total
+from . import customers
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -30,6 +37,103 @@ class ProductSerializer(serializers.ModelSerializer):
         # fields = ['id', 'name', 'description', 'brand', 'price', 'part_number', 'quantity', 'amount', 'sold_units', 'amount_collected', 'created_at']
 
 
+class FastProductListSerializer:
+    """
+    Read-only stand-in for ProductSerializer(queryset, many=True).
+
+    Pulls plain rows with .values() and all vehicle links with one query,
+    then only runs DRF's to_representation for the decimal and datetime
+    columns. Output (keys, key order and formatting) matches
+    ProductSerializer, see ProductSerializerParityTests.
+    """
+    _layout = None
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    @classmethod
+    def layout(cls):
+        # [(output key, values() column, converter or None)] in the same order
+        # ProductSerializer emits its fields
+        if cls._layout is None:
+            layout = []
+            for name, field in ProductSerializer().fields.items():
+                if name in ('vehicle_list', 'vehicles'):
+                    layout.append((name, None, None))
+                    continue
+                column = Product._meta.get_field(name).attname
+                convert = None
+                if isinstance(field, serializers.DecimalField):
+                    convert = cls._decimal_converter(field)
+                elif isinstance(field, serializers.DateTimeField):
+                    convert = cls._datetime_converter(field)
+                layout.append((name, column, convert))
+            cls._layout = layout
+        return cls._layout
+
+    @staticmethod
+    def _decimal_converter(field):
+        # Values read back from a DECIMAL column already carry the column's
+        # scale, so the DRF quantize step is a no-op and can be skipped.
+        exponent = -field.decimal_places
+
+        def convert(value):
+            if value.as_tuple().exponent == exponent:
+                return f'{value:f}'
+            return field.to_representation(value)
+        return convert
+
+    @staticmethod
+    def _datetime_converter(field):
+        def convert(value, tz):
+            if tz is None or timezone.is_naive(value):
+                return field.to_representation(value)
+            # Same as DRF's enforce_timezone + ISO 8601 output
+            value = value.astimezone(tz).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        convert.needs_timezone = True
+        return convert
+
+    @property
+    def data(self):
+        # Resolve the active timezone once per call, not once per value
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        layout = [
+            (name, column, functools.partial(convert, tz=tz) if getattr(convert, 'needs_timezone', False) else convert)
+            for name, column, convert in self.layout()
+        ]
+        columns = [column for _, column, _ in layout if column is not None]
+        rows = list(self.queryset.values(*columns))
+
+        vehicle_ids = {}
+        vehicle_names = {}
+        links = (
+            Product.vehicles.through.objects
+            .filter(product_id__in=self.queryset.values('id'))
+            .order_by('id')
+            .values_list('product_id', 'vehicle_id', 'vehicle__name')
+        )
+        for product_id, vehicle_id, vehicle_name in links:
+            vehicle_ids.setdefault(product_id, []).append(vehicle_id)
+            vehicle_names.setdefault(product_id, []).append(vehicle_name)
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in layout:
+                if name == 'vehicle_list':
+                    item[name] = vehicle_names.get(row['id'], [])
+                elif name == 'vehicles':
+                    item[name] = vehicle_ids.get(row['id'], [])
+                else:
+                    value = row[column]
+                    item[name] = convert(value) if convert is not None and value is not None else value
+            data.append(item)
+        return data
+
+
 class SaleSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     part_number = serializers.CharField(source='product.part_number', read_only=True)
@@ -88,22 +192,51 @@ class TransactionSerializer(serializers.Serializer):
 
     
 from rest_framework import serializers
-from django.db import transaction
+from django.db import IntegrityError, transaction
+
+
+class PrefetchedProductField(serializers.PrimaryKeyRelatedField):
+    """
+    Reads products from context['products'] ({pk: Product}) when the caller
+    loaded them in bulk (the batch sync), instead of one SELECT per line.
+    """
+    def to_internal_value(self, data):
+        products = self.context.get('products')
+        if products is None:
+            return super().to_internal_value(data)
+        try:
+            return products[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
 class SaleItemSerializer(serializers.ModelSerializer):
     quantity_sold = serializers.IntegerField()
     price_per_unit = serializers.DecimalField(max_digits=12, decimal_places=2)
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    product = PrefetchedProductField(queryset=Product.objects.all())
 
     class Meta:
         model = Sale
         fields = ['product', 'quantity_sold', 'price_per_unit']
     
 class TransactionSerializer(serializers.Serializer):
+    order = serializers.IntegerField(read_only=True)
     customer_name = serializers.CharField(max_length=100)
-    total_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    # Whatever the till sends is ignored: the order and the customer's
+    # balance go by the lines (tills add up floats), and the response
+    # carries the total that was recorded
+    total_amount = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
     transaction_date = serializers.DateTimeField()
     items = SaleItemSerializer(many=True)
+    # Optional here, a retry with the same key returns the first order
+    idempotency_key = serializers.CharField(max_length=64, required=False)
+    duplicate = serializers.BooleanField(read_only=True)
     
+    def validate(self, attrs):
+        attrs['total_amount'] = lines_total(attrs['items'])
+        return attrs
     
     def create(self, validated_data):
         # Get request from context passed by the View
@@ -117,41 +250,115 @@ class TransactionSerializer(serializers.Serializer):
         items_data = validated_data.pop('items')
         customer_name = validated_data.pop('customer_name')
         total_amount = validated_data.get('total_amount')
+        idempotency_key = validated_data.get('idempotency_key')
+
+        if idempotency_key and user and not self.context.get('keys_checked'):
+            recorded = Order.objects.filter(created_by=user, idempotency_key=idempotency_key).first()
+            if recorded is not None:
+                return self.recorded(recorded)
+        # The batch sync looks the business up once for all its transactions
+        if 'business' in self.context:
+            business = self.context['business']
+        else:
+            business = user.businesses.first() if user else None
         
         with transaction.atomic():
             customer = None
-            if customer_name.lower() != "walking customer":
-                customer, created = Customer.objects.get_or_create(name=customer_name)
-                # Use Decimal math directly since total_amount is a DecimalField
-                customer.remaining_balance += total_amount
-                customer.save()
+            if customers.normalize_name(customer_name) != customers.WALK_IN:
+                # Index hit on (business, normalized_name), see home/customers.py
+                customer = customers.find_or_create(business, customer_name)
+
+            try:
+                with transaction.atomic():
+                    order = Order.objects.create(
+                        business=business,
+                        customer=customer,
+                        customer_name=customer_name,
+                        total_amount=total_amount,
+                        transaction_date=validated_data.get('transaction_date'),
+                        created_by=user,
+                        idempotency_key=idempotency_key if user else None,
+                    )
+            except IntegrityError:
+                # The same upload raced us here and won
+                return self.recorded(Order.objects.get(created_by=user, idempotency_key=idempotency_key))
+
+            # One INSERT for the lines, one UPDATE for all the stock and one
+            # for the balance, see home/checkout.py
+            try:
+                created_sales = checkout(items_data, created_by=user, customer=customer, order=order)
+            except InsufficientStock as e:
+                # raised before anything was written, the whole checkout is refused
+                raise serializers.ValidationError({
+                    'items': [f"{e.message} (product {pk})" for pk in e.product_ids] or [e.message]
+                })
 
-            created_sales = []
-            for item in items_data:
-                # We assign 'user' to the 'created_by' field defined in your Model
-                sale = Sale.objects.create(
-                    created_by=user, 
-                    customer=customer,
-                    product=item['product'],
-                    quantity_sold=item['quantity_sold'],
-                    price_per_unit=item['price_per_unit']
-                    # total_amount is calculated in Sale.save() automatically
-                )
-                created_sales.append(sale)
-                
-                # Note: Your Sale.save() already calls self.product.update_stock.
-                # If update_stock handles quantity deduction, you don't need 
-                # to manually subtract it here.
-                
         return {
+            "order": order.pk,
             "customer_name": customer_name,
             "total_amount": total_amount,
             "transaction_date": validated_data.get('transaction_date'),
-            "items": created_sales
+            "items": created_sales,
+            "idempotency_key": idempotency_key,
+            "duplicate": False,
+        }
+
+    def recorded(self, order):
+        """What create() returned the first time for `order`."""
+        return {
+            "order": order.pk,
+            "customer_name": order.customer_name,
+            "total_amount": order.total_amount,
+            "transaction_date": order.transaction_date,
+            "items": list(order.lines.all()),
+            "idempotency_key": order.idempotency_key,
+            "duplicate": True,
         }
         
         
 class CustomerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Customer
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        # The directory the customer is created in decides the business
+        read_only_fields = ['business']
+
+    def validate(self, attrs):
+        # customer_business_name_uniq would turn this into a 500 on save
+        if self.instance is not None:
+            business, name = self.instance.business, attrs.get('name', self.instance.name)
+        else:
+            request = self.context.get('request')
+            user = request.user if request and request.user.is_authenticated else None
+            business, name = (user.businesses.first() if user else None), attrs.get('name')
+        if name and customers.name_taken(business, name, exclude_pk=getattr(self.instance, 'pk', None)):
+            raise serializers.ValidationError({'name': customers.NAME_TAKEN_MESSAGE})
+        return attrs
+
+class CustomerPaymentSerializer(serializers.Serializer):
+    """Body of the payment on account API."""
+    amount = serializers.DecimalField(max_digits=14, decimal_places=2, min_value=Decimal('0.01'))
+    note = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    lines = SaleSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+
+class SaleReviewSerializer(serializers.Serializer):
+    """Body of the bulk approve/reject API: a list of ids or a cut-off time."""
+    action = serializers.ChoiceField(choices=['approve', 'reject'])
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False, max_length=5000)
+    before = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('before' in attrs):
+            raise serializers.ValidationError("Send either 'ids' or 'before'.")
+        if 'ids' in attrs:
+            # A sale listed twice is still one sale, for the skipped count too
+            attrs['ids'] = list(dict.fromkeys(attrs['ids']))
+        return attrs
@@ -0,0 +1,293 @@
+"""
+Stock movement ledger: every change to a product's quantity, sold_units and
+amount_collected is also appended to StockMovement, and StockSnapshot
+compacts a product's movements every now and then (`manage.py
+snapshot_stock`). Stock at any moment is then the latest snapshot before it
+plus the few movements after it, two indexed queries whatever the history.
+
+The Product columns stay the counters everything reads; the ledger is what
+they're checked against (`manage.py verify_stock`).
+
+A sale holds (product, units, amount) while it's neither rejected nor
+deleted, approved or not, like it always did on create. Every write path
+moves the difference between what a sale held before and after:
+- Sale.save() (create, edits, reject, soft delete),
+- the pre_delete receiver on Sale,
+- bulk paths that skip save(): checkout.checkout() logs its lines and
+  approvals.review_sales() gives rejected sales back with reverse_sales().
+Product.save() logs the counters set by hand (new products, restocks,
+corrections).
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import InsufficientStock, Product, Sale, StockMovement, StockSnapshot
+
+COUNTERS = ('quantity', 'sold_units', 'amount_collected')
+# Movements younger than this may belong to transactions that haven't
+# committed yet (ids are handed out before commit), so snapshots leave them
+# in the tail
+SNAPSHOT_LAG = timedelta(minutes=5)
+
+
+def held(product_id, units, amount, rejected, deleted):
+    """(product_id, units, amount) a sale keeps out of stock, None once it's given back."""
+    if rejected or deleted:
+        return None
+    return (product_id, units, amount)
+
+
+def held_by(sale):
+    return held(sale.product_id, sale.quantity_sold, sale.total_amount, sale.rejected, sale.deleted)
+
+
+# What held() needs from a stored sale
+HELD_FIELDS = ('product_id', 'quantity_sold', 'total_amount', 'rejected', 'deleted')
+
+
+def held_of_row(row):
+    """held() of a sale's .values() row (with HELD_FIELDS), None for no row."""
+    if row is None:
+        return None
+    return held(row['product_id'], row['quantity_sold'], row['total_amount'], row['rejected'], row['deleted'])
+
+
+def stored_held(pk):
+    """held_by() the row as it is in the database, locked until commit."""
+    return held_of_row(Sale.objects.select_for_update().filter(pk=pk).values(*HELD_FIELDS).first())
+
+
+def _movement(product_id, units, amount, kind, sale_id=None):
+    """A sale-side movement: `units` more sold (fewer in stock) and `amount` more collected."""
+    return StockMovement(
+        product_id=product_id, kind=kind, sale_id=sale_id,
+        quantity=-units, sold_units=units, amount_collected=amount,
+    )
+
+
+def _move(product_id, units, amount):
+    """
+    Sell `units` more of a product (negative to give them back). Taking
+    stock is a conditional decrement like Product.update_stock; giving it
+    back never fails. False if the product is gone.
+    """
+    products = Product.objects.filter(pk=product_id)
+    if units > 0:
+        products = products.filter(quantity__gte=units)
+    updated = products.update(
+        sold_units=F('sold_units') + units,
+        quantity=F('quantity') - units,
+        amount_collected=F('amount_collected') + amount,
+        updated_at=timezone.now(),
+    )
+    if not updated and units > 0 and Product.objects.filter(pk=product_id).exists():
+        raise InsufficientStock([product_id])
+    return bool(updated)
+
+
+def sale_changed(sale_id, before, after):
+    """
+    Move stock from what a sale held (`before`, see held()) to what it holds
+    now and log it. Call inside the transaction that changes the sale.
+    Raises InsufficientStock if the sale now needs more units than are left.
+    """
+    if before == after:
+        return
+    changes = []
+    if before is not None and after is not None and before[0] == after[0]:
+        units, amount = after[1] - before[1], after[2] - before[2]
+        kind = StockMovement.SALE if units > 0 else StockMovement.REVERSAL if units < 0 else StockMovement.ADJUSTMENT
+        changes.append((before[0], units, amount, kind))
+    else:
+        # Moved to another product, or started / stopped holding stock
+        if before is not None:
+            changes.append((before[0], -before[1], -before[2], StockMovement.REVERSAL))
+        if after is not None:
+            changes.append((after[0], after[1], after[2], StockMovement.SALE))
+    movements = [
+        _movement(product_id, units, amount, kind, sale_id)
+        for product_id, units, amount, kind in changes
+        if _move(product_id, units, amount)
+    ]
+    StockMovement.objects.bulk_create(movements)
+
+
+def log_sales(sales):
+    """SALE movements for freshly created sales whose stock was already taken."""
+    StockMovement.objects.bulk_create([
+        _movement(sale.product_id, sale.quantity_sold, sale.total_amount, StockMovement.SALE, sale.pk)
+        for sale in sales
+    ])
+
+
+def reverse_sales(rows):
+    """
+    Give back the stock of sales that stop holding it without save()
+    (approvals rejecting in bulk). rows: [(sale_id, product_id, units, amount)].
+    One UPDATE per product, one INSERT for the movements.
+    """
+    per_product = defaultdict(lambda: [0, Decimal(0)])
+    for _, product_id, units, amount in rows:
+        per_product[product_id][0] += units
+        per_product[product_id][1] += amount
+    for product_id, (units, amount) in sorted(per_product.items()):
+        _move(product_id, -units, -amount)
+    StockMovement.objects.bulk_create([
+        _movement(product_id, -units, -amount, StockMovement.REVERSAL, sale_id)
+        for sale_id, product_id, units, amount in rows
+    ])
+
+
+def stored_counters(pk):
+    """The product's counters as they are in the database, locked until commit."""
+    row = Product.objects.select_for_update().filter(pk=pk).values(*COUNTERS).first()
+    return None if row is None else _counters(row)
+
+
+def _counters(values):
+    return {field: values[field] or 0 for field in COUNTERS}
+
+
+def product_saved(product, before):
+    """
+    Log counters changed by saving the product itself: the opening stock of
+    a new product, a restock, or a correction. `before` is stored_counters()
+    from before the save, None for a new product.
+    """
+    after = _counters({field: getattr(product, field) for field in COUNTERS})
+    if before is None:
+        if any(after.values()):
+            StockMovement.objects.create(product_id=product.pk, kind=StockMovement.OPENING, **after)
+        return
+    change = {field: after[field] - before[field] for field in COUNTERS}
+    if not any(change.values()):
+        return
+    only_quantity_up = change['quantity'] > 0 and not change['sold_units'] and not change['amount_collected']
+    kind = StockMovement.RESTOCK if only_quantity_up else StockMovement.ADJUSTMENT
+    StockMovement.objects.create(product_id=product.pk, kind=kind, **change)
+
+
+def log_opening(products):
+    """OPENING movements for products created without save() (bulk imports)."""
+    StockMovement.objects.bulk_create([
+        StockMovement(product_id=product.pk, kind=StockMovement.OPENING,
+                      **_counters({field: getattr(product, field) for field in COUNTERS}))
+        for product in products
+        if any(getattr(product, field) for field in COUNTERS)
+    ])
+
+
+def _latest_snapshot(at=None):
+    snapshots = StockSnapshot.objects.filter(product_id=OuterRef('product_id'))
+    if at is not None:
+        snapshots = snapshots.filter(as_of__lte=at)
+    return snapshots.order_by('-through_movement_id')
+
+
+def _tail(movements, at=None):
+    """The movements of each product after its latest snapshot (as of `at`)."""
+    movements = movements.annotate(
+        since=Subquery(_latest_snapshot(at).values('through_movement_id')[:1])
+    ).filter(Q(since__isnull=True) | Q(id__gt=F('since')))
+    if at is not None:
+        movements = movements.filter(created_at__lte=at)
+    return movements
+
+
+def ledger_stock(product_ids=None, at=None):
+    """
+    {product_id: {'quantity', 'sold_units', 'amount_collected'}} from the
+    ledger, now or as of the aware datetime `at`. Products with no movements
+    by then are left out.
+    """
+    snapshots = StockSnapshot.objects.annotate(
+        latest=Subquery(_latest_snapshot(at).values('pk')[:1])
+    ).filter(pk=F('latest'))
+    movements = StockMovement.objects.all()
+    if product_ids is not None:
+        snapshots = snapshots.filter(product_id__in=product_ids)
+        movements = movements.filter(product_id__in=product_ids)
+
+    stock = {row['product_id']: _counters(row) for row in snapshots.values('product_id', *COUNTERS)}
+    tail = _tail(movements, at).values('product_id').annotate(
+        **{f'{field}_change': Sum(field) for field in COUNTERS}
+    ).order_by()
+    for row in tail:
+        counters = stock.setdefault(row['product_id'], dict.fromkeys(COUNTERS, 0))
+        for field in COUNTERS:
+            counters[field] += row[f'{field}_change'] or 0
+    return stock
+
+
+def stock_of(product_id, at=None):
+    """ledger_stock() of one product, zeros if it has no movements."""
+    return ledger_stock([product_id], at).get(product_id, dict.fromkeys(COUNTERS, 0))
+
+
+def take_snapshots(min_movements=1, lag=SNAPSHOT_LAG):
+    """
+    Fold every product's tail older than `lag` into a new snapshot, for the
+    products with at least `min_movements` of them. Returns how many were
+    taken.
+    """
+    cutoff = timezone.now() - lag
+    ends = {
+        row['product_id']: row['through']
+        for row in _tail(StockMovement.objects.filter(created_at__lte=cutoff))
+        .values('product_id').annotate(through=Max('id'), count=Count('id'))
+        .filter(count__gte=min_movements).order_by()
+    }
+    if not ends:
+        return 0
+    previous = {
+        row['product_id']: row
+        for row in StockSnapshot.objects.annotate(latest=Subquery(_latest_snapshot().values('pk')[:1]))
+        .filter(pk=F('latest'), product_id__in=ends).values('product_id', 'through_movement_id', *COUNTERS)
+    }
+    # Everything up to each product's end, not only what is older than the
+    # cutoff: ids and timestamps can disagree by a few milliseconds
+    totals = (
+        StockMovement.objects.filter(product_id__in=ends)
+        .annotate(since=Subquery(_latest_snapshot().values('through_movement_id')[:1]))
+        .filter(Q(since__isnull=True) | Q(id__gt=F('since')))
+        .values('product_id', 'id', 'created_at', *COUNTERS)
+    )
+    snapshots = {}
+    for row in totals:
+        product_id = row['product_id']
+        if row['id'] > ends[product_id]:
+            continue
+        snapshot = snapshots.get(product_id)
+        if snapshot is None:
+            base = previous.get(product_id)
+            snapshot = snapshots[product_id] = StockSnapshot(
+                product_id=product_id, through_movement_id=ends[product_id],
+                as_of=row['created_at'], **(_counters(base) if base else dict.fromkeys(COUNTERS, 0)),
+            )
+        snapshot.as_of = max(snapshot.as_of, row['created_at'])
+        for field in COUNTERS:
+            setattr(snapshot, field, getattr(snapshot, field) + row[field])
+    StockSnapshot.objects.bulk_create(snapshots.values())
+    return len(snapshots)
+
+
+def verify(product_ids=None):
+    """
+    [(product_id, counters, ledger)] for every product whose counters
+    disagree with the ledger.
+    """
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    counters = {row['pk']: _counters(row) for row in products.values('pk', *COUNTERS)}
+    ledger = ledger_stock(list(counters) if product_ids is not None else None)
+    empty = dict.fromkeys(COUNTERS, 0)
+    return [
+        (pk, values, ledger.get(pk, empty))
+        for pk, values in sorted(counters.items())
+        if values != ledger.get(pk, empty)
+    ]
@@ -0,0 +1,99 @@
+"""
+Streaming JSON arrays for very large list responses.
+
+The queryset is walked with .iterator(chunk_size) (a server-side cursor on
+PostgreSQL) and every row is serialized and written as soon as it is read,
+so a worker holds one chunk of rows at a time no matter how long the sales
+history is. The body is byte-for-byte what Response(Serializer(qs,
+many=True).data) would have rendered as JSON.
+
+Always JSON: msgpack needs the array length up front. CSV exports stream the
+same way, one chunk of lines at a time (streaming_csv_response).
+"""
+import csv
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+CHUNK_SIZE = 500
+
+_exhausted = object()
+
+
+class AsyncStreamingResponse(StreamingHttpResponse):
+    """
+    We run under daphne (ASGI), where Django consumes a sync iterator with
+    sync_to_async(list), i.e. the whole body in memory first. Pull it one
+    part at a time instead, on the same thread the view (and its database
+    connection) ran on. Used by both the JSON and the CSV streams.
+    """
+    async def __aiter__(self):
+        parts = iter(self.streaming_content)
+        next_part = sync_to_async(next, thread_sensitive=True)
+        while True:
+            part = await next_part(parts, _exhausted)
+            if part is _exhausted:
+                break
+            yield part
+
+
+def json_array_chunks(queryset, serializer_class, context=None, chunk_size=CHUNK_SIZE):
+    serializer = serializer_class(context=context or {})
+    render = JSONRenderer().render
+    yield b'['
+    separator = b''
+    rows = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        rows.append(render(serializer.to_representation(obj)))
+        if len(rows) >= chunk_size:
+            yield separator + b','.join(rows)
+            separator = b','
+            rows = []
+    if rows:
+        yield separator + b','.join(rows)
+    yield b']'
+
+
+def streaming_list_response(request, queryset, serializer_class, chunk_size=CHUNK_SIZE):
+    return AsyncStreamingResponse(
+        json_array_chunks(queryset, serializer_class, {'request': request}, chunk_size),
+        content_type='application/json',
+    )
+
+
+# A cell starting with one of these is a formula to Excel and LibreOffice
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_cell(value):
+    """`value` for a spreadsheet: text that would be read as a formula is quoted with a '."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """csv.writer target that hands each formatted line straight back."""
+    def write(self, value):
+        return value
+
+
+def csv_chunks(header, rows, chunk_size=CHUNK_SIZE):
+    """header: [(column title, row key)], rows: any iterable of dicts."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([title for title, _ in header]).encode()
+    lines = []
+    for row in rows:
+        lines.append(writer.writerow([csv_cell(row[key]) for _, key in header]))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines).encode()
+            lines = []
+    if lines:
+        yield ''.join(lines).encode()
+
+
+def streaming_csv_response(filename, header, rows, chunk_size=CHUNK_SIZE):
+    response = AsyncStreamingResponse(csv_chunks(header, rows, chunk_size), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,88 @@
+"""
+Batch upload of checkouts queued by a till while it was offline.
+
+The whole queue comes in one request and is recorded in one database
+transaction. Every checkout carries an idempotency key generated on the till
+(unique per user on Order, see order_idempotency_uniq), so re-sending a batch
+after a dropped connection records nothing twice: known keys just get their
+order back.
+
+Each checkout runs in its own savepoint, so one that is refused (bad
+product, not enough stock) is reported and rolled back on its own while the
+rest of the batch goes in. Products and the business are loaded once for
+the whole batch instead of per line.
+"""
+from django.db import transaction
+from rest_framework import serializers
+
+from .models import Order, Product
+from .serializers import TransactionSerializer
+
+MAX_BATCH = 500
+
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+REJECTED = 'rejected'
+
+
+class SyncTransactionSerializer(TransactionSerializer):
+    idempotency_key = serializers.CharField(max_length=64)
+
+
+def _product_ids(transactions):
+    ids = set()
+    for data in transactions:
+        items = data.get('items') if isinstance(data, dict) else None
+        for item in items if isinstance(items, list) else []:
+            try:
+                ids.add(int(item.get('product')))
+            except (AttributeError, TypeError, ValueError):
+                pass  # reported by the serializer
+    return ids
+
+
+def sync_transactions(request, transactions):
+    """
+    Record `transactions` (TransactionSerializer payloads, each with an
+    idempotency_key) for request.user. Returns one result per transaction,
+    in order: {'idempotency_key', 'status', 'order'} plus 'errors' when
+    rejected.
+    """
+    user = request.user
+    keys = {data.get('idempotency_key') for data in transactions if isinstance(data, dict)}
+    keys.discard(None)
+
+    results = []
+    with transaction.atomic():
+        recorded = dict(
+            Order.objects.filter(created_by=user, idempotency_key__in=[str(key) for key in keys])
+            .values_list('idempotency_key', 'pk')
+        )
+        context = {
+            'request': request,
+            'products': Product.objects.in_bulk(_product_ids(transactions)),
+            'business': user.businesses.first(),
+            'keys_checked': True,
+        }
+        for data in transactions:
+            serializer = SyncTransactionSerializer(data=data, context=context)
+            key = data.get('idempotency_key') if isinstance(data, dict) else None
+            if not serializer.is_valid():
+                results.append({'idempotency_key': key, 'status': REJECTED, 'order': None,
+                                'errors': serializer.errors})
+                continue
+            key = serializer.validated_data['idempotency_key']
+            if key in recorded:
+                results.append({'idempotency_key': key, 'status': DUPLICATE, 'order': recorded[key]})
+                continue
+            try:
+                with transaction.atomic():
+                    saved = serializer.save()
+            except serializers.ValidationError as e:
+                results.append({'idempotency_key': key, 'status': REJECTED, 'order': None, 'errors': e.detail})
+                continue
+            recorded[key] = saved['order']
+            # duplicate: another upload of the same key committed first
+            results.append({'idempotency_key': key, 'status': DUPLICATE if saved['duplicate'] else CREATED,
+                            'order': saved['order']})
+    return results
@@ -1,10 +1,65 @@
+import csv
+import html
+import io
+import json
+import re
+import uuid
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+import lz4.frame
+import msgpack
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 from channels.testing import ChannelsLiveServerTestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
 from selenium import webdriver
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.wait import WebDriverWait
 
+from authentication.models import User
+from home import autocomplete, balances, customers, leaderboard, list_cache, rollups, stock
+from home.approvals import REJECT, review_sales
+from home.checkout import checkout
+from home.models import (
+    Business, Customer, CustomerLedgerEntry, DailyBusinessRevenue, DailySalesRollup, InsufficientStock, Order, Product,
+    RevenueCheckpoint, Sale, StockMovement, Vehicle,
+)
+from home.renderers import MessagePackRenderer
+from home.search import search_product_queryset
+from home.serializers import FastProductListSerializer, ProductSerializer, SaleSerializer
+from home.streaming import AsyncStreamingResponse, json_array_chunks
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "list-cache-tests"}}
+
+
+class AuthenticatedClientMixin:
+    """self.user, a fresh account (with the business signup gives it), and self.client logged in as them."""
+    username = "cashier"
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username=self.username, password="secret")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class AuthenticatedTestCase(AuthenticatedClientMixin, TestCase):
+    pass
+
 
 class ChatTests(ChannelsLiveServerTestCase):
     serve_static = True  # emulate StaticLiveServerTestCase
@@ -102,4 +157,1457 @@ class ChatTests(ChannelsLiveServerTestCase):
     def _chat_log_value(self):
         return self.driver.find_element(
             by=By.CSS_SELECTOR, value="#chat-log"
-        ).get_property("value")
\ No newline at end of file
+        ).get_property("value")
+
+
+class ProductKeysetPaginationTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(25):
+            Product.objects.create(name=f"Part {i}", part_number=f"AA{i:03}", created_by=self.user)
+
+    def _walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row["id"] for row in response.data["results"]]
+            url = response.data["next"]
+        return seen
+
+    def test_cursor_pages_cover_catalog_once_in_stable_order(self):
+        expected = list(
+            Product.objects.filter(created_by=self.user).order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(self._walk("/products_api/?pagination=cursor&page_size=10"), expected)
+        self.assertEqual(self._walk("/api/products/?pagination=cursor&page_size=7"), expected)
+
+    def test_plain_list_is_unchanged_without_opt_in(self):
+        response = self.client.get("/products_api/")
+        self.assertEqual(len(response.data), 25)
+
+    def test_bad_cursor_is_404(self):
+        response = self.client.get("/products_api/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductSyncTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [
+            Product.objects.create(name=f"Part {i}", created_by=self.user) for i in range(5)
+        ]
+
+    def test_full_sync_then_only_changes(self):
+        response = self.client.get("/products_api/sync/?limit=3")
+        self.assertTrue(response.data["has_more"])
+        response = self.client.get(f"/products_api/sync/?since={response.data['watermark']}&limit=3")
+        self.assertFalse(response.data["has_more"])
+        self.assertEqual(len(response.data["changed"]), 2)
+        watermark = response.data["watermark"]
+
+        edited, soft_deleted, hard_deleted = self.products[:3]
+        edited.price = 10
+        edited.save()
+        soft_deleted.deleted = True
+        soft_deleted.save()
+        hard_deleted_id = hard_deleted.id
+        hard_deleted.delete()
+
+        response = self.client.get(f"/products_api/sync/?since={watermark}")
+        self.assertIn(edited.id, [row["id"] for row in response.data["changed"]])
+        self.assertIn(soft_deleted.id, response.data["deleted"])
+        self.assertIn(hard_deleted_id, response.data["deleted"])
+
+    def test_bad_watermark_is_400(self):
+        response = self.client.get("/products_api/sync/?since=garbage")
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cashier", password="secret")
+        self.pump = Product.objects.create(name="Water pump", part_number="AA070", brand="Toyota", created_by=self.user)
+        self.filter = Product.objects.create(name="Oil filter", part_number="4BA0A", description="fits the pump housing", created_by=self.user)
+        self.other = Product.objects.create(name="Water pump", part_number="AA071")
+
+    def test_prefix_matches_part_number_while_typing(self):
+        results = list(search_product_queryset(Product.objects.all(), "AA07"))
+        self.assertEqual(set(results), {self.pump, self.other})
+
+    def test_results_are_ranked_and_scoped(self):
+        scoped = Product.objects.filter(created_by=self.user)
+        results = list(search_product_queryset(scoped, "pump"))
+        self.assertEqual(results, [self.pump, self.filter])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.pump.name = "Radiator"
+        self.pump.save()
+        self.assertNotIn(self.pump, search_product_queryset(Product.objects.all(), "pump"))
+        self.other.delete()
+        self.assertEqual(list(search_product_queryset(Product.objects.all(), "AA071")), [])
+
+    def test_only_a_limited_search_is_cut_short(self):
+        extra = [Product.objects.create(name=f"Pump seal {i}", created_by=self.user) for i in range(3)]
+        scoped = Product.objects.filter(created_by=self.user)
+        results = search_product_queryset(scoped, "pump")
+        self.assertEqual(results.count(), 5)
+        ranked = list(results)
+        self.assertEqual(list(results[:2]) + list(results[2:]), ranked)  # pages line up
+        self.assertEqual(set(ranked), {self.pump, self.filter, *extra})
+        self.assertEqual(list(search_product_queryset(scoped, "pump", limit=2)), ranked[:2])
+
+
+class ProductAutocompleteTests(AuthenticatedClientMixin, TransactionTestCase):
+    def setUp(self):
+        autocomplete.reset()
+        super().setUp()
+        self.business = self.user.businesses.first()  # created on signup
+        self.pump = Product.objects.create(name="Water pump", part_number="AA-070", business=self.business)
+        Product.objects.create(name="Oil filter", part_number="4BA0A", business=self.business)
+        Product.objects.create(name="Water pump", part_number="AA071")  # another shop
+
+    def _ids(self, q):
+        response = self.client.get(f"/products_api/autocomplete/?q={q}")
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.data["results"]]
+
+    def test_prefix_lookup_is_scoped_to_business(self):
+        self.assertEqual(self._ids("aa07"), [self.pump.id])
+        self.assertEqual(self._ids("pum"), [self.pump.id])
+
+    def test_signals_keep_index_current(self):
+        self._ids("aa")  # build
+        added = Product.objects.create(name="Fan belt", part_number="AA080", business=self.business)
+        self.assertEqual(self._ids("aa08"), [added.id])
+        self.pump.deleted = True
+        self.pump.save()
+        self.assertEqual(self._ids("aa07"), [])
+        added.delete()
+        self.assertEqual(self._ids("aa08"), [])
+
+    def test_version_tracks_other_workers(self):
+        with override_settings(CACHES=LOCMEM_CACHE):  # the versions live in the shared cache
+            scope = autocomplete.scope_for_user(self.user)
+            index = autocomplete.get_index(scope)
+            self.pump.name = "Water hose"
+            self.pump.save()  # our own change is applied in place
+            self.assertFalse(index.is_stale())
+            self.assertEqual(self._ids("pump"), [])
+            self.assertEqual(self._ids("hos"), [self.pump.id])
+            Product.objects.filter(pk=self.pump.pk).update(quantity=5)  # stock moves send no signals
+            self.assertFalse(index.is_stale())
+            list_cache.bump(autocomplete._version_scope(scope))  # another worker saved a product
+            self.assertTrue(index.is_stale())
+
+    def test_reports_index_stats(self):
+        response = self.client.get("/products_api/autocomplete/?q=a")
+        self.assertEqual(response.data["index"]["products"], 2)
+        self.assertIsNotNone(response.data["index"]["rebuild_ms"])
+
+
+class ProductSerializerParityTests(TestCase):
+    def test_fast_path_renders_identical_json(self):
+        user = User.objects.create_user(username="cashier", password="secret")
+        corolla, hiace = Vehicle.objects.create(name="Corolla"), Vehicle.objects.create(name="Hiace")
+        first = Product.objects.create(name="Pump", price=Decimal("12.5"), buying_price=Decimal("7"),
+                                       created_by=user, business=user.businesses.first())
+        first.vehicles.add(corolla, hiace)
+        Product.objects.create(name=None, price=None, buying_price=None)
+
+        queryset = Product.objects.order_by("id")
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(FastProductListSerializer(queryset).data),
+            renderer.render(ProductSerializer(queryset, many=True).data),
+        )
+
+
+class ProductQueryCountTests(AuthenticatedTestCase):
+    """
+    Guard against N+1 queries on product reads: every endpoint must issue
+    the same number of queries for 3 products as for 12.
+    """
+    urls = [
+        "/api/products/",
+        "/api/products/?pagination=cursor",
+        "/products_api/",
+        "/products_api/?pagination=cursor",
+        "/products_api/sync/",
+        "/filter-products/",
+        "/filter-products/?query=part",
+        "/index/index/list_of_products",
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.vehicles = [Vehicle.objects.create(name=f"Vehicle {i}") for i in range(2)]
+
+    def add_products(self, count):
+        # Committed, as far as the list cache is concerned, so it is invalidated
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                product = Product.objects.create(name=f"Part {i}", created_by=self.user)
+                product.vehicles.add(*self.vehicles)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def assertQueriesDoNotScale(self, url):
+        small = self.count_queries(url)
+        self.add_products(9)
+        large = self.count_queries(url)
+        self.assertEqual(small, large, f"{url} issued {small} queries for 3 products but {large} for 12")
+
+    def test_product_reads_do_not_scale_with_row_count(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                with self.captureOnCommitCallbacks(execute=True):
+                    Product.objects.all().delete()
+                self.add_products(3)
+                self.assertQueriesDoNotScale(url)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ProductListCacheTests(AuthenticatedTestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.other = User.objects.create_user(username="other", password="secret")
+        self.product = Product.objects.create(name="Pump", created_by=self.user)
+
+    def test_second_request_is_a_hit_until_a_product_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get("/products_api/")
+        self.assertEqual(list_cache.stats()["misses"], 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/products_api/")
+        self.assertEqual(list_cache.stats()["hits"], 1)
+        self.assertFalse([q for q in queries if "home_product" in q["sql"]])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Water pump"
+            self.product.save()
+        response = self.client.get("/products_api/")
+        self.assertEqual(response.data[0]["name"], "Water pump")
+        self.assertEqual(list_cache.stats()["misses"], 2)
+
+    def test_other_users_changes_do_not_invalidate(self):
+        self.client.get("/products_api/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Belt", created_by=self.other)
+        self.client.get("/products_api/")
+        self.assertEqual(list_cache.stats()["hits"], 1)
+
+    def test_entries_expire(self):
+        with mock.patch.object(list_cache, "TIMEOUT", 0):  # gone as soon as it is stored
+            self.client.get("/products_api/")
+            self.client.get("/products_api/")
+        self.assertEqual(list_cache.stats()["misses"], 2)
+
+    def test_same_url_is_not_shared_between_accounts(self):
+        Product.objects.create(name="Belt", created_by=self.other)
+        Customer.objects.create(business=self.user.businesses.first(), name="Juma", remaining_balance=Decimal("50.00"))
+        mine = [self.client.get(url).data for url in ("/products_api/", "/customers_api/receivables/")]
+
+        self.client.force_authenticate(self.other)
+        products = self.client.get("/products_api/").data
+        receivables = self.client.get("/customers_api/receivables/").data
+        self.assertEqual([row["name"] for row in products], ["Belt"])
+        self.assertEqual(receivables["outstanding"], 0)
+        self.assertEqual([row["name"] for row in mine[0]], ["Pump"])
+        self.assertEqual(mine[1]["outstanding"], Decimal("50.00"))
+
+
+class ConditionalListTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(name="Pump", part_number="AA070", quantity=10, created_by=self.user)
+        self.sale = Sale.objects.create(product=self.product, quantity_sold=1, price_per_unit=Decimal("5.00"))
+
+    def assertRevalidates(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertNotIn("no-store", response["Cache-Control"])
+        etag = response["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304, url)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(len([q for q in queries if "home_" in q["sql"]]), 1)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_products(self):
+        def rename():
+            self.product.name = "Water pump"
+            self.product.save()
+        self.assertRevalidates("/api/products/", rename)
+
+    def test_products_soft_delete(self):
+        other = Product.objects.create(name="Belt", created_by=self.user)
+
+        def delete():
+            other.deleted = True
+            other.save()
+        self.assertRevalidates("/api/products/", delete)
+
+    def test_approved_sales(self):
+        self.sale.aproved = True
+        self.sale.save()
+
+        def rename_product():
+            # sales embed the product name
+            self.product.name = "Water pump"
+            self.product.save()
+        self.assertRevalidates("/api/sales/", rename_product)
+
+    def test_unverified_sales(self):
+        def approve():
+            self.sale.aproved = True
+            self.sale.save()
+        self.assertRevalidates("/sales/list_unverified_sales_api/", approve)
+
+    def test_vehicle_links_change_etag(self):
+        vehicle = Vehicle.objects.create(name="Corolla")
+        self.assertRevalidates("/api/products/", lambda: self.product.vehicles.add(vehicle))
+
+
+class MessagePackTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+        vehicle = Vehicle.objects.create(name="Corolla")
+        self.product = Product.objects.create(
+            name="Pump", part_number="AA070", price=Decimal("12.50"), quantity=10, created_by=self.user
+        )
+        self.product.vehicles.add(vehicle)
+        sale = Sale.objects.create(product=self.product, quantity_sold=1, price_per_unit=Decimal("12.50"))
+        sale.aproved = True
+        sale.save()
+
+    def assertSameAsJson(self, url):
+        expected = json.loads(self.client.get(url).content)
+
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertIn("Accept", response["Vary"])
+        self.assertIn("Authorization", response["Vary"])
+        self.assertEqual(msgpack.unpackb(response.content), expected)
+
+        response = self.client.get(url, HTTP_ACCEPT="application/x-msgpack-lz4")
+        self.assertEqual(response["Content-Type"], "application/x-msgpack-lz4")
+        self.assertEqual(msgpack.unpackb(lz4.frame.decompress(response.content)), expected)
+
+    def test_lists_match_json(self):
+        for url in ("/api/products/", "/api/sales/", "/sales/list_unverified_sales_api/"):
+            with self.subTest(url=url):
+                self.assertSameAsJson(url)
+
+    def test_json_is_still_the_default(self):
+        response = self.client.get("/api/products/")
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    def test_native_types_are_encoded_like_json(self):
+        data = {"amount": Decimal("1.10"), "id": uuid.UUID(int=1), "at": self.product.created_at}
+        self.assertEqual(
+            msgpack.unpackb(MessagePackRenderer().render(data)),
+            json.loads(JSONRenderer().render(data)),
+        )
+
+    def test_parses_msgpack_body(self):
+        body = msgpack.packb({"name": "Belt", "part_number": "BB100", "quantity": 3})
+        response = self.client.post("/api/products/", body, content_type="application/msgpack")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(Product.objects.filter(part_number="BB100").exists())
+
+        body = lz4.frame.compress(msgpack.packb({"name": "Hose", "part_number": "CC200"}))
+        response = self.client.post("/api/products/", body, content_type="application/x-msgpack-lz4")
+        self.assertEqual(response.status_code, 201, response.content)
+
+
+class StreamingSalesTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        product = Product.objects.create(name="Pump", part_number="AA070", quantity=100, created_by=self.user)
+        for i in range(7):
+            sale = Sale.objects.create(product=product, quantity_sold=1, price_per_unit=Decimal("5.50"))
+            sale.aproved = True
+            sale.save()
+
+    def expected(self, queryset):
+        return json.loads(JSONRenderer().render(SaleSerializer(queryset, many=True).data))
+
+    def test_endpoints_stream_the_same_json(self):
+        sales = Sale.objects.select_related("product").order_by("-date_sold")
+        for url in ("/sales/list_all_sales_api/", "/sales/get_yearly_sales_api/", "/sales/"):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.streaming)
+                body = b"".join(response.streaming_content)
+                self.assertEqual(sorted(json.loads(body), key=lambda s: s["id"]),
+                                 sorted(self.expected(sales), key=lambda s: s["id"]))
+
+    def test_chunk_boundaries(self):
+        sales = Sale.objects.select_related("product").order_by("id")
+        for chunk_size in (1, 3, 7, 100):
+            with self.subTest(chunk_size=chunk_size):
+                body = b"".join(json_array_chunks(sales, SaleSerializer, chunk_size=chunk_size))
+                self.assertEqual(json.loads(body), self.expected(sales))
+        body = b"".join(json_array_chunks(sales.none(), SaleSerializer))
+        self.assertEqual(body, b"[]")
+
+    def test_asgi_iteration_is_incremental(self):
+        sales = Sale.objects.select_related("product").order_by("id")
+        response = AsyncStreamingResponse(json_array_chunks(sales, SaleSerializer, chunk_size=2))
+
+        async def collect():
+            return [part async for part in response]
+
+        parts = async_to_sync(collect)()
+        self.assertEqual(len(parts), 6)  # '[', four chunks, ']'
+        self.assertEqual(json.loads(b"".join(parts)), self.expected(sales))
+
+
+class BulkCheckoutTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [
+            Product.objects.create(name=f"Part {i}", quantity=50, created_by=self.user) for i in range(6)
+        ]
+
+    def post(self, products, customer_name="Juma"):
+        items = [{"product": p.pk, "quantity_sold": 2, "price_per_unit": "7.50"} for p in products]
+        return self.client.post("/sales/", {
+            "customer_name": customer_name,
+            "total_amount": str(Decimal("15.00") * len(items)),
+            "transaction_date": "2026-01-05T10:00:00Z",
+            "items": items,
+        }, format="json")
+
+    def test_contract_and_effects(self):
+        response = self.post(self.products[:2] + self.products[:1])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data["message"], "Transaction recorded and customer balance updated!")
+        self.assertEqual(response.data["data"]["items"][0],
+                         {"product": self.products[0].pk, "quantity_sold": 2, "price_per_unit": "7.50"})
+
+        first = Product.objects.get(pk=self.products[0].pk)
+        self.assertEqual((first.quantity, first.sold_units, first.amount_collected), (46, 4, Decimal("30.00")))
+        self.assertEqual(Customer.objects.get(name="Juma").remaining_balance, 45)
+        sales = Sale.objects.filter(product=first)
+        self.assertEqual(sales.count(), 2)
+        self.assertEqual([(s.total_amount, str(s.created_by_id)) for s in sales], [(Decimal("15.00"), str(self.user.pk))] * 2)
+
+    def test_walking_customer_has_no_balance(self):
+        self.post(self.products[:1], customer_name="Walking Customer")
+        self.assertFalse(Customer.objects.exists())
+        self.assertIsNone(Sale.objects.get().customer)
+
+    def test_writes_do_not_scale_with_lines(self):
+        def writes(products):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.post(products).status_code, 201)
+            return len([q for q in queries if q["sql"].startswith(("INSERT", "UPDATE"))])
+
+        self.post(self.products[:1])  # creates the customer
+        self.assertEqual(writes(self.products[:1]), writes(self.products))
+
+
+class OversellTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(name="Pump", price=Decimal("10.00"), quantity=3, created_by=self.user)
+        self.other = Product.objects.create(name="Belt", price=Decimal("4.00"), quantity=10, created_by=self.user)
+
+    def test_sale_save_refuses_stale_quantity(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        Product.objects.filter(pk=self.product.pk).update(quantity=1)
+        with self.assertRaises(InsufficientStock):
+            Sale.objects.create(product=stale, quantity_sold=2, price_per_unit=Decimal("10.00"))
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).quantity, 1)
+
+    def test_stock_only_moves_when_the_sale_is_recorded(self):
+        sale = Sale.objects.create(product=self.product, quantity_sold=2, price_per_unit=Decimal("10.00"))
+        sale.aproved = True
+        sale.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.quantity, self.product.sold_units), (1, 2))
+
+    def test_product_sale_view(self):
+        response = self.client.post(f"/products_api/{self.product.pk}/sale/", {"quantity_sold": 3}, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data["new_stock"], 0)
+        response = self.client.post(f"/products_api/{self.product.pk}/sale/", {"quantity_sold": 1}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_checkout_is_all_or_nothing(self):
+        lines = [
+            {"product": self.other, "quantity_sold": 2, "price_per_unit": Decimal("4.00")},
+            {"product": self.product, "quantity_sold": 2, "price_per_unit": Decimal("10.00")},
+            {"product": self.product, "quantity_sold": 2, "price_per_unit": Decimal("10.00")},
+        ]
+        with self.assertRaises(InsufficientStock) as raised:
+            checkout(lines)
+        self.assertEqual(raised.exception.product_ids, [self.product.pk])
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.other.pk).quantity, 10)
+
+    def test_transaction_api_reports_short_items(self):
+        response = self.client.post("/sales/", {
+            "customer_name": "Juma",
+            "total_amount": "40.00",
+            "transaction_date": "2026-01-05T10:00:00Z",
+            "items": [{"product": self.product.pk, "quantity_sold": 4, "price_per_unit": "10.00"}],
+        }, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("items", response.data)
+        self.assertFalse(Customer.objects.exists())
+
+
+class OrderHeaderTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pump = Product.objects.create(name="Pump", quantity=10, created_by=self.user)
+        self.belt = Product.objects.create(name="Belt", quantity=10, created_by=self.user)
+
+    def checkout(self, when="2026-03-02T09:00:00Z", total="25.00"):
+        return self.client.post("/sales/", {
+            "customer_name": "Juma",
+            "total_amount": total,
+            "transaction_date": when,
+            "items": [
+                {"product": self.pump.pk, "quantity_sold": 1, "price_per_unit": "20.00"},
+                {"product": self.belt.pk, "quantity_sold": 1, "price_per_unit": "5.00"},
+            ],
+        }, format="json")
+
+    def test_checkout_writes_one_header(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201, response.content)
+        order = Order.objects.get()
+        self.assertEqual(response.data["data"]["order"], order.pk)
+        self.assertEqual(order.business, self.user.businesses.first())
+        self.assertEqual(order.customer.name, "Juma")
+        self.assertEqual(sorted(order.lines.values_list("product__name", flat=True)), ["Belt", "Pump"])
+
+    def test_total_is_what_the_lines_come_to(self):
+        response = self.checkout(total="24.999999")  # the till's float sum
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data["data"]["total_amount"], "25.00")
+        self.assertEqual(Order.objects.get().total_amount, Decimal("25.00"))
+        self.assertEqual(Customer.objects.get(name="Juma").remaining_balance, Decimal("25.00"))
+
+    def test_receipt(self):
+        order_id = self.checkout().data["data"]["order"]
+        with self.assertNumQueries(3):  # business, order, lines
+            response = self.client.get(f"/orders_api/{order_id}/")
+        self.assertEqual(response.data["total_amount"], "25.00")
+        self.assertEqual([line["product_name"] for line in response.data["lines"]], ["Pump", "Belt"])
+
+        other = User.objects.create_user(username="other", password="secret")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f"/orders_api/{order_id}/").status_code, 404)
+
+    def test_day_close(self):
+        self.checkout("2026-03-02T09:00:00Z")
+        self.checkout("2026-03-02T15:00:00Z")
+        self.checkout("2026-03-03T09:00:00Z")
+        response = self.client.get("/orders_api/", {"date": "2026-03-02"})
+        self.assertEqual(response.data["orders"], 2)
+        self.assertEqual(response.data["total_amount"], Decimal("50.00"))
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertEqual(self.client.get("/orders_api/", {"date": "2026-13-40"}).status_code, 400)
+
+
+class BulkReviewTests(AuthenticatedTestCase):
+    username = "owner"
+
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(username="other", password="secret")
+        mine = Product.objects.create(name="Pump", quantity=100, created_by=self.user)
+        theirs = Product.objects.create(name="Belt", quantity=100, created_by=self.other)
+        self.mine = [Sale.objects.create(product=mine, quantity_sold=1, price_per_unit=Decimal("10.00")) for _ in range(4)]
+        self.theirs = Sale.objects.create(product=theirs, quantity_sold=1, price_per_unit=Decimal("10.00"))
+        Sale.objects.filter(pk=self.mine[0].pk).update(date_sold=timezone.now() - timedelta(days=2))
+
+    def review(self, **body):
+        return self.client.post("/sales/bulk_review_sales_api/", body, format="json")
+
+    def test_approve_ids_in_one_update(self):
+        ids = [s.pk for s in self.mine[:3]] + [self.theirs.pk, self.mine[0].pk]  # one listed twice
+        with CaptureQueriesContext(connection) as queries:
+            response = self.review(action="approve", ids=ids)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.data["updated"], response.data["skipped"]), (3, 1))
+        self.assertEqual(response.data["total_amount"], Decimal("30.00"))
+        self.assertEqual(len([q for q in queries if q["sql"].startswith('UPDATE "home_sale"')]), 1)
+        self.assertEqual(Sale.objects.filter(aproved=True).count(), 3)
+        self.assertFalse(Sale.objects.get(pk=self.theirs.pk).aproved)
+
+    def test_reject_pending_before(self):
+        response = self.review(action="reject", before=(timezone.now() - timedelta(days=1)).isoformat())
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(list(Sale.objects.filter(rejected=True)), [self.mine[0]])
+
+    def test_reviewed_sales_are_not_touched_again(self):
+        self.review(action="approve", ids=[self.mine[1].pk])
+        response = self.review(action="reject", ids=[self.mine[1].pk])
+        self.assertEqual(response.data["updated"], 0)
+        self.assertFalse(Sale.objects.get(pk=self.mine[1].pk).rejected)
+
+    def test_one_notification(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f"user_{self.user.pk}", channel)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.review(action="approve", before=timezone.now().isoformat())
+        message = async_to_sync(layer.receive)(channel)
+        self.assertEqual(message["message"], "4 sales approved (40.00).")
+
+    def test_soft_deleted_sales_are_left_out(self):
+        gone = self.mine[1]
+        gone.deleted = True
+        gone.save()
+        response = self.review(action="approve", before=timezone.now().isoformat())
+        self.assertEqual(response.data["updated"], 3)
+        self.assertFalse(Sale.objects.get(pk=gone.pk).aproved)
+        rows = DailySalesRollup.objects.order_by("day").values_list("day", "sales_count", "units", "revenue")
+        counted = list(rows)
+        rollups.rebuild()
+        self.assertEqual(list(rows), counted)
+        self.assertEqual(sum(count for _, count, _, _ in counted), 3)
+
+    def test_bad_body(self):
+        self.assertEqual(self.review(action="approve").status_code, 400)
+        self.assertEqual(self.review(action="approve", ids=[1], before=timezone.now().isoformat()).status_code, 400)
+        self.assertEqual(self.review(action="delete", ids=[1]).status_code, 400)
+
+
+class SalesAnalyticsTests(AuthenticatedTestCase):
+    username = "owner"
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(name="Pump", quantity=100, created_by=self.user)
+        for quantity, price, approved, rejected in [(1, "10.00", True, False), (3, "20.00", True, False),
+                                                   (2, "5.00", False, False), (1, "7.00", False, True)]:
+            sale = Sale.objects.create(product=self.product, quantity_sold=quantity, price_per_unit=Decimal(price))
+            Sale.objects.filter(pk=sale.pk).update(aproved=approved, rejected=rejected)
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len([q for q in queries if "home_sale" in q["sql"]]), 1, url)
+        return response.data
+
+    def test_wrappers_keep_their_answers(self):
+        expected = {
+            "get_sales_summary_api": {"total_sales": 2, "total_revenue": Decimal("70.00"), "total_products_sold": 4},
+            "get_pending_sales_count_api": {"pending_sales_count": 1},  # the review queue, not rejected ones
+            "get_approved_sales_count_api": {"approved_sales_count": 2},
+            "get_rejected_sales_count_api": {"rejected_sales_count": 1},
+            "get_total_revenue_api": {"total_revenue": Decimal("70.00")},
+            "get_total_products_sold_api": {"total_products_sold": 4},
+            "get_highest_sale_api": {"highest_sale": Decimal("60.00")},
+            "get_lowest_sale_api": {"lowest_sale": Decimal("10.00")},
+            "get_sales_count_api": {"sales_count": 2},
+            "get_total_sales_amount_api": {"total_sales_amount": Decimal("70.00")},
+            "get_average_units_sold_per_sale_api": {"average_units_sold_per_sale": 2},
+        }
+        for name, body in expected.items():
+            with self.subTest(name=name):
+                self.assertEqual(self.get(f"/sales/{name}/"), body)
+        stats = self.get("/sales/get_sales_statistics_api/")
+        self.assertEqual((stats["max_sale_amount"], stats["min_sale_amount"]), (Decimal("60.00"), Decimal("10.00")))
+        self.assertEqual(self.get(f"/sales/get_product_sales_summary_api/{self.product.pk}/"),
+                         {"product_id": self.product.pk, "total_sold": 4, "total_revenue": Decimal("70.00")})
+
+    def test_analytics_mixes_conditions_in_one_query(self):
+        data = self.get("/sales/analytics_api/", metrics="total_revenue,pending_sales_count,rejected_sales_count")
+        self.assertEqual(data["metrics"], {"total_revenue": Decimal("70.00"), "pending_sales_count": 1,
+                                           "rejected_sales_count": 1})
+        self.assertEqual(len(self.get("/sales/analytics_api/")["metrics"]), 10)
+
+    def test_analytics_scope_and_range(self):
+        other = User.objects.create_user(username="other", password="secret")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.get("/sales/analytics_api/", metrics="total_sales")["metrics"], {"total_sales": 0})
+        self.client.force_authenticate(self.user)
+        data = self.get("/sales/analytics_api/", metrics="total_sales", start="2000-01-01", end="2000-12-31")
+        self.assertEqual(data["metrics"], {"total_sales": 0})
+        self.assertEqual(self.client.get("/sales/analytics_api/", {"metrics": "nope"}).status_code, 400)
+        self.assertEqual(self.client.get("/sales/analytics_api/", {"start": "2026-02-30"}).status_code, 400)
+
+
+class DailySalesRollupTests(AuthenticatedTestCase):
+    username = "owner"
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(name="Pump", quantity=100, buying_price=Decimal("6.00"),
+                                              created_by=self.user)
+
+    def sell(self, quantity=1, price="10.00"):
+        return Sale.objects.create(product=self.product, quantity_sold=quantity, price_per_unit=Decimal(price))
+
+    def rollup(self):
+        return list(DailySalesRollup.objects.values_list("sales_count", "units", "revenue", "cost"))
+
+    def snapshot_then_rebuild(self):
+        maintained = self.rollup()
+        call_command("rebuild_sales_rollups", stdout=io.StringIO())
+        self.assertEqual(self.rollup(), maintained)
+        return maintained
+
+    def test_follows_sale_lifecycle(self):
+        sale = self.sell(2)
+        self.assertEqual(self.rollup(), [])  # pending sales don't count
+
+        sale.aproved = True
+        sale.save()
+        self.assertEqual(self.snapshot_then_rebuild(), [(1, 2, Decimal("20.00"), Decimal("12.00"))])
+
+        sale.quantity_sold = 3
+        sale.save()
+        other = self.sell(1)
+        other.aproved = True
+        other.save()
+        self.assertEqual(self.snapshot_then_rebuild(), [(2, 4, Decimal("40.00"), Decimal("24.00"))])
+
+        sale.rejected = True
+        sale.save()
+        other.delete()
+        self.assertEqual(self.snapshot_then_rebuild(), [])
+
+    def test_bulk_approval(self):
+        ids = [self.sell().pk for _ in range(3)]
+        self.client.post("/sales/bulk_review_sales_api/", {"action": "approve", "ids": ids}, format="json")
+        self.assertEqual(self.snapshot_then_rebuild(), [(3, 3, Decimal("30.00"), Decimal("18.00"))])
+
+    def test_period_report(self):
+        for _ in range(2):
+            sale = self.sell(2)
+            sale.aproved = True
+            sale.save()
+        with self.assertNumQueries(1):
+            response = self.client.get("/sales/get_sales_period_report_api/", {"period": "month"})
+        self.assertEqual(len(response.data), 1)
+        row = response.data[0]
+        self.assertEqual(row["period"], timezone.localdate().replace(day=1))
+        self.assertEqual((row["sales_count"], row["units"], row["revenue"], row["profit"]),
+                         (2, 4, Decimal("40.00"), Decimal("16.00")))
+        trends = self.client.get("/sales/get_sales_trends_api/").data
+        self.assertEqual([(t["date"], t["total_sales"]) for t in trends], [(timezone.localdate(), 2)])
+
+
+class SalesHistogramTests(AuthenticatedTestCase):
+    username = "owner"
+
+    def setUp(self):
+        super().setUp()
+        business = self.user.businesses.first()
+        business.time_zone = "Africa/Dar_es_Salaam"  # UTC+3, no DST
+        business.save()
+        self.product = Product.objects.create(name="Pump", quantity=100, created_by=self.user)
+
+    def sell_at(self, when, quantity=1, aproved=True):
+        sale = Sale.objects.create(product=self.product, quantity_sold=quantity, price_per_unit=Decimal("10.00"))
+        Sale.objects.filter(pk=sale.pk).update(date_sold=when, aproved=aproved)
+
+    def test_days_in_business_time_zone_zero_filled(self):
+        # 22:30 UTC on the 1st is already the 2nd in Dar es Salaam
+        self.sell_at(datetime(2026, 3, 1, 22, 30, tzinfo=dt_timezone.utc), quantity=2)
+        self.sell_at(datetime(2026, 3, 2, 8, 0, tzinfo=dt_timezone.utc))
+        self.sell_at(datetime(2026, 3, 4, 8, 0, tzinfo=dt_timezone.utc), aproved=False)
+
+        with self.assertNumQueries(2):  # the business, the histogram
+            response = self.client.get("/sales/get_sales_histogram_api/",
+                                       {"bucket": "day", "start": "2026-03-01", "end": "2026-03-04"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["time_zone"], "Africa/Dar_es_Salaam")
+        rows = [(r["start"].isoformat(), r["count"], r["units"], r["revenue"]) for r in response.data["results"]]
+        self.assertEqual(rows, [
+            ("2026-03-01T00:00:00+03:00", 0, 0, 0),
+            ("2026-03-02T00:00:00+03:00", 2, 3, Decimal("30.00")),
+            ("2026-03-03T00:00:00+03:00", 0, 0, 0),
+            ("2026-03-04T00:00:00+03:00", 0, 0, 0),
+        ])
+
+    def test_hour_week_and_month_buckets(self):
+        self.sell_at(datetime(2026, 3, 2, 5, 15, tzinfo=dt_timezone.utc))
+        hours = self.client.get("/sales/get_sales_histogram_api/",
+                                {"bucket": "hour", "start": "2026-03-02", "end": "2026-03-02"}).data["results"]
+        self.assertEqual(len(hours), 24)
+        self.assertEqual([r["start"].hour for r in hours if r["count"]], [8])
+
+        weeks = self.client.get("/sales/get_sales_histogram_api/",
+                                {"bucket": "week", "start": "2026-02-25", "end": "2026-03-10"}).data["results"]
+        self.assertEqual([(r["start"].date().isoformat(), r["count"]) for r in weeks],
+                         [("2026-02-23", 0), ("2026-03-02", 1), ("2026-03-09", 0)])
+
+        months = self.client.get("/sales/get_sales_histogram_api/", {"bucket": "month"}).data["results"]
+        self.assertEqual(len(months), 12)
+        today = timezone.localdate(timezone=self.user.businesses.first().tzinfo)
+        self.assertEqual(months[-1]["start"].date(), today.replace(day=1))
+
+    def test_rejects_bad_input(self):
+        for params in ({"bucket": "minute"}, {"start": "2026-02-30"},
+                       {"bucket": "hour", "start": "2020-01-01", "end": "2026-01-01"}):
+            self.assertEqual(self.client.get("/sales/get_sales_histogram_api/", params).status_code, 400)
+
+
+class RevenueTotalsTests(AuthenticatedTestCase):
+    username = "owner"
+
+    def setUp(self):
+        super().setUp()
+        self.business = self.user.businesses.first()
+        self.product = Product.objects.create(name="Pump", quantity=100, created_by=self.user,
+                                              business=self.business)
+        self.today = timezone.localdate()
+
+    def approve_on(self, days_ago, amount):
+        sale = Sale.objects.create(product=self.product, quantity_sold=1, price_per_unit=Decimal(amount))
+        Sale.objects.filter(pk=sale.pk).update(date_sold=timezone.now() - timedelta(days=days_ago))
+        sale.refresh_from_db()
+        sale.aproved = True
+        sale.save()
+        return sale
+
+    def totals(self):
+        return list(DailyBusinessRevenue.objects.order_by("day").values_list("day", "revenue"))
+
+    def test_backdated_changes_add_to_later_totals(self):
+        self.approve_on(0, "10.00")
+        late = self.approve_on(3, "4.00")  # approved after today's sale
+        self.assertEqual(self.totals(), [(self.today - timedelta(days=3), Decimal("4.00")),
+                                         (self.today, Decimal("10.00"))])
+        through = rollups.revenue_through([self.today - timedelta(days=1), self.today], Business.objects.all())
+        self.assertEqual(list(through.values()), [Decimal("4.00"), Decimal("14.00")])
+
+        late.rejected = True
+        late.save()
+        maintained = self.totals()
+        call_command("rebuild_sales_rollups", stdout=io.StringIO())
+        self.assertEqual(self.totals(), maintained)
+        self.assertEqual(maintained, [(self.today, Decimal("10.00"))])
+
+        through = rollups.revenue_through([self.today - timedelta(days=1), self.today + timedelta(days=5)],
+                                          Business.objects.all())
+        self.assertEqual(list(through.values()), [0, Decimal("10.00")])
+
+    def test_checkpoints_fold_old_days(self):
+        self.approve_on(10, "20.00")
+        self.approve_on(5, "5.00")
+        self.approve_on(0, "10.00")  # too recent to fold
+        call_command("checkpoint_revenue", stdout=io.StringIO())
+        checkpoints = RevenueCheckpoint.objects.values_list("day", "cumulative_revenue")
+        self.assertEqual(list(checkpoints.all()), [(self.today - timedelta(days=5), Decimal("25.00"))])
+
+        self.approve_on(7, "3.00")  # before the checkpoint, so it adds to it
+        self.assertEqual(list(checkpoints.all()), [(self.today - timedelta(days=5), Decimal("28.00"))])
+        days = [self.today - timedelta(days=8), self.today - timedelta(days=6), self.today]
+        through = rollups.revenue_through(days, Business.objects.all())
+        self.assertEqual(list(through.values()), [Decimal("20.00"), Decimal("23.00"), Decimal("38.00")])
+
+        call_command("rebuild_sales_rollups", stdout=io.StringIO())
+        self.assertEqual(list(checkpoints.all()), [(self.today - timedelta(days=5), Decimal("28.00"))])
+        self.assertEqual(rollups.revenue_through(days, Business.objects.all()), through)
+
+    def test_days_are_the_business_days(self):
+        self.business.time_zone = "Pacific/Kiritimati"  # UTC+14
+        self.business.save()
+        sale = Sale.objects.create(product=self.product, quantity_sold=1, price_per_unit=Decimal("7.00"))
+        Sale.objects.filter(pk=sale.pk).update(date_sold=datetime(2026, 3, 2, 11, 0, tzinfo=dt_timezone.utc))
+        sale.refresh_from_db()
+        sale.aproved = True
+        sale.save()
+        self.assertEqual(self.totals(), [(date(2026, 3, 3), Decimal("7.00"))])
+        call_command("rebuild_sales_rollups", stdout=io.StringIO())
+        self.assertEqual(self.totals(), [(date(2026, 3, 3), Decimal("7.00"))])
+
+    def test_growth_endpoint(self):
+        self.approve_on(40, "20.00")
+        self.approve_on(7, "5.00")
+        self.approve_on(0, "10.00")
+        with self.assertNumQueries(1):
+            response = self.client.get("/sales/get_sales_growth_rate_api/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["revenue_before_start"], response.data["revenue_through_end"]),
+                         (Decimal("20.00"), Decimal("35.00")))
+        self.assertEqual(response.data["sales_growth_rate"], Decimal("75"))
+        self.assertEqual(response.data["week_to_date"],
+                         {"current": Decimal("10.00"), "previous": Decimal("5.00"), "growth_rate": Decimal("100")})
+        self.assertEqual(self.client.get("/sales/get_sales_growth_rate_api/", {"start": "nope"}).status_code, 400)
+
+
+@override_settings(LEADERBOARD_REDIS_URL=None)
+class LeaderboardTests(AuthenticatedTestCase):
+    username = "owner"
+
+    def setUp(self):
+        leaderboard.reset()
+        super().setUp()
+        business = self.user.businesses.first()
+        self.pump = Product.objects.create(name="Pump", quantity=100, created_by=self.user, business=business)
+        self.belt = Product.objects.create(name="Belt", quantity=100, created_by=self.user, business=business)
+
+    def tearDown(self):
+        leaderboard.reset()
+
+    def approve(self, product, quantity, days_ago=0):
+        sale = Sale.objects.create(product=product, quantity_sold=quantity, price_per_unit=Decimal("1.00"))
+        Sale.objects.filter(pk=sale.pk).update(date_sold=timezone.now() - timedelta(days=days_ago))
+        sale.refresh_from_db()
+        sale.aproved = True
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.save()
+        return sale
+
+    def ranking(self, window):
+        response = self.client.get("/sales/get_top_selling_products_api/", {"window": window})
+        return [(row["product__name"], row["total_sold"]) for row in response.data]
+
+    def test_windows_follow_approvals(self):
+        self.approve(self.pump, 1)
+        self.approve(self.belt, 3, days_ago=10)  # first read builds the board from the sales
+        self.assertEqual(self.ranking("7d"), [("Pump", 1)])
+
+        self.approve(self.pump, 4, days_ago=2)
+        late = self.approve(self.belt, 5)
+        self.assertEqual(self.ranking("today"), [("Belt", 5), ("Pump", 1)])
+        self.assertEqual(self.ranking("7d"), [("Pump", 5), ("Belt", 5)])
+        self.assertEqual(self.ranking("all"), [("Belt", 8), ("Pump", 5)])
+
+        late.rejected = True
+        with self.captureOnCommitCallbacks(execute=True):
+            late.save()
+        self.assertEqual(self.ranking("today"), [("Pump", 1)])
+
+        with self.assertNumQueries(2):  # the business, the product names
+            self.ranking("30d")
+        maintained = {window: self.ranking(window) for window in leaderboard.WINDOWS}
+        leaderboard.rebuild()
+        self.assertEqual({window: self.ranking(window) for window in leaderboard.WINDOWS}, maintained)
+
+    def test_scoped_to_business(self):
+        other = User.objects.create_user(username="other", password="secret")
+        self.approve(Product.objects.create(name="Hose", quantity=10, created_by=other,
+                                            business=other.businesses.first()), 2)
+        self.approve(self.pump, 1)
+        self.assertEqual(self.ranking("all"), [("Pump", 1)])
+        self.assertEqual(self.client.get("/sales/get_top_selling_products_api/", {"window": "90d"}).status_code, 400)
+        self.assertEqual(self.client.get("/sales/get_top_selling_products_api/", {"limit": "0"}).status_code, 400)
+        # Only the scope that was read got built
+        board = leaderboard.get_board()
+        self.assertFalse(board.is_stale(leaderboard._prefix(leaderboard.scope_for_user(self.user))))
+        self.assertTrue(board.is_stale(leaderboard._prefix(leaderboard.scope_for_user(other))))
+
+    def test_redis_dropping_falls_back_to_memory(self):
+        self.approve(self.pump, 2)
+        gone = redis.ConnectionError("Connection refused")
+        client = mock.Mock(**{"exists.side_effect": gone, "zrevrange.side_effect": gone})
+        with mock.patch.object(leaderboard, "_board", leaderboard.RedisBoard(client)):
+            self.assertEqual(self.ranking("all"), [("Pump", 2)])
+            self.assertIsInstance(leaderboard.get_board(), leaderboard.LocalBoard)
+            self.approve(self.belt, 3)
+            self.assertEqual(self.ranking("all"), [("Belt", 3), ("Pump", 2)])
+
+
+class KeysetSalesListTests(AuthenticatedTestCase):
+    username = "owner"
+
+    def setUp(self):
+        super().setUp()
+        self.pump = Product.objects.create(name="Pump", quantity=1000, created_by=self.user)
+        self.belt = Product.objects.create(name="Belt", quantity=1000, created_by=self.user)
+        now = timezone.now()
+        for i in range(30):
+            sale = Sale.objects.create(product=self.pump if i % 3 else self.belt, quantity_sold=1,
+                                       price_per_unit=Decimal("1.00"), created_by=self.user)
+            # Pairs of sales share a timestamp, so ties are broken on id
+            Sale.objects.filter(pk=sale.pk).update(date_sold=now - timedelta(days=i // 2), aproved=i % 5 != 0)
+
+    def walk(self, url, params):
+        ids, pages = [], 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [row["id"] for row in response.data["results"]]
+            pages += 1
+            if response.data["next"] is None:
+                return ids, pages
+            response = self.client.get(response.data["next"])
+
+    def test_pages_cover_everything_once_in_order(self):
+        ids, pages = self.walk("/sales/list_sales_api/", {"page_size": 7})
+        expected = list(Sale.objects.order_by("-date_sold", "-id").values_list("id", flat=True))
+        self.assertEqual((ids, pages), (expected, 5))
+
+    def test_filters(self):
+        ids, _ = self.walk("/sales/list_sales_api/", {"status": "pending", "product": self.belt.pk, "page_size": 2})
+        self.assertEqual(ids, list(Sale.objects.filter(aproved=False, product=self.belt)
+                                   .order_by("-date_sold", "-id").values_list("id", flat=True)))
+        self.assertEqual(len(ids), 2)
+
+        today = timezone.localdate().isoformat()
+        ids, _ = self.walk("/sales/list_sales_api/", {"start": today, "end": today, "seller": str(self.user.pk)})
+        self.assertEqual(len(ids), 2)
+
+        for params in ({"status": "sold"}, {"product": "x"}, {"seller": "nope"}, {"end": "2026-02-30"}):
+            self.assertEqual(self.client.get("/sales/list_sales_api/", params).status_code, 400)
+        self.assertEqual(self.client.get("/sales/list_sales_api/", {"cursor": "garbage"}).status_code, 404)
+
+    def test_deep_page_costs_the_same(self):
+        first = self.client.get("/sales/list_sales_api/", {"page_size": 2})
+        with CaptureQueriesContext(connection) as page_one:
+            self.client.get(first.data["next"])
+        response = first
+        for _ in range(10):
+            response = self.client.get(response.data["next"])
+        with CaptureQueriesContext(connection) as deep:
+            self.client.get(response.data["next"])
+        self.assertEqual(len(page_one), len(deep))
+        self.assertNotIn("OFFSET", deep[-1]["sql"].upper())
+
+    def test_viewset_and_htmx_list(self):
+        response = self.client.get("/api/sales/", {"pagination": "cursor", "status": "approved", "page_size": 5})
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertTrue(all(row["aproved"] for row in response.data["results"]))
+
+        self.client.force_login(self.user)
+        page = self.client.get("/index/sales/", {"page_size": 20})
+        self.assertEqual(len(page.context["sales"]), 20)
+        self.assertContains(page, "Older sales")
+
+        older = self.client.get("/index/sales/", {"page_size": 20, "cursor": page.context["next_cursor"]})
+        self.assertEqual((len(older.context["sales"]), older.context["next_cursor"]), (10, None))
+
+        page = self.client.get("/index/sales/", {"status": "approved", "page_size": 5})
+        link = re.search(r'hx-get="([^"]+)"[^>]*>Older sales', page.content.decode()).group(1)
+        older = self.client.get(html.unescape(link))
+        self.assertEqual(len(older.context["sales"]), 5)
+        self.assertTrue(all(sale.aproved for sale in older.context["sales"]))
+
+
+class OfflineSyncTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pump = Product.objects.create(name="Pump", quantity=10, created_by=self.user)
+
+    def queued(self, key, quantity=1, product=None):
+        return {
+            "idempotency_key": key,
+            "customer_name": "Walking Customer",
+            "total_amount": f"{quantity * 20}.00",
+            "transaction_date": "2026-03-02T09:00:00Z",
+            "items": [{"product": product or self.pump.pk, "quantity_sold": quantity, "price_per_unit": "20.00"}],
+        }
+
+    def sync(self, transactions):
+        return self.client.post("/orders_api/sync/", {"transactions": transactions}, format="json")
+
+    def test_batch_with_retries_and_refusals(self):
+        batch = [self.queued("a"), self.queued("b", 2), self.queued("a"), self.queued("c", 50),
+                 self.queued("d", product=999999), self.queued(None)]
+        response = self.sync(batch)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["status"] for r in response.data["results"]],
+                         ["created", "created", "duplicate", "rejected", "rejected", "rejected"])
+        self.assertEqual((response.data["created"], response.data["duplicate"], response.data["rejected"]), (2, 1, 3))
+        self.assertIn("items", response.data["results"][3]["errors"])
+        self.pump.refresh_from_db()
+        self.assertEqual(self.pump.quantity, 7)  # the refused checkout rolled back alone
+
+        # The connection dropped before the response, the till sends it all again
+        again = self.sync(batch[:2])
+        self.assertEqual([r["status"] for r in again.data["results"]], ["duplicate", "duplicate"])
+        self.assertEqual([r["order"] for r in again.data["results"]],
+                         [r["order"] for r in response.data["results"][:2]])
+        self.assertEqual(Order.objects.count(), 2)
+        self.pump.refresh_from_db()
+        self.assertEqual(self.pump.quantity, 7)
+
+    def test_queries_per_batch(self):
+        self.sync([self.queued("warm-up")])
+        with CaptureQueriesContext(connection) as small:
+            self.sync([self.queued(f"s{i}") for i in range(2)])
+        with CaptureQueriesContext(connection) as large:
+            self.sync([self.queued(f"l{i}") for i in range(4)])
+        # Keys and products are looked up once per batch, whatever its size
+        def lookups(queries):
+            return [q["sql"] for q in queries
+                    if q["sql"].startswith("SELECT") and ('FROM "home_product"' in q["sql"]
+                                                          or 'FROM "home_order"' in q["sql"])]
+        self.assertEqual(len(lookups(small)), len(lookups(large)))
+        self.assertEqual(len(lookups(large)), 2)
+
+    def test_single_post_is_idempotent_too(self):
+        first = self.client.post("/sales/", self.queued("k1"), format="json")
+        second = self.client.post("/sales/", self.queued("k1"), format="json")
+        self.assertEqual(first.data["data"]["order"], second.data["data"]["order"])
+        self.assertTrue(second.data["data"]["duplicate"])
+        self.assertEqual(Sale.objects.count(), 1)
+
+    def test_bad_body(self):
+        self.assertEqual(self.sync([]).status_code, 400)
+        self.assertEqual(self.client.post("/orders_api/sync/", {"transactions": "x"}, format="json").status_code, 400)
+
+
+class StockLedgerTests(AuthenticatedTestCase):
+    username = "storekeeper"
+
+    def setUp(self):
+        super().setUp()
+        self.pump = Product.objects.create(name="Pump", quantity=10, created_by=self.user)
+
+    def counters(self):
+        self.pump.refresh_from_db()
+        return self.pump.quantity, self.pump.sold_units, self.pump.amount_collected
+
+    def kinds(self):
+        return list(StockMovement.objects.filter(product_id=self.pump.pk).order_by('id').values_list('kind', flat=True))
+
+    def test_edit_reads_the_stored_sale_once(self):
+        sale = Sale.objects.create(product=self.pump, quantity_sold=2, price_per_unit=Decimal("5.00"))
+        sale.quantity_sold = 3
+        with CaptureQueriesContext(connection) as queries:
+            sale.save()
+        reads = [q["sql"] for q in queries if q["sql"].startswith("SELECT") and 'FROM "home_sale"' in q["sql"]]
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(self.counters()[:2], (7, 3))
+
+    def test_edits_rejects_and_deletes_give_stock_back(self):
+        sale = Sale.objects.create(product=self.pump, quantity_sold=3, price_per_unit=Decimal("20.00"), created_by=self.user)
+        self.assertEqual(self.counters(), (7, 3, Decimal("60.00")))
+
+        # Editing moves only the difference, not the whole quantity again
+        sale.quantity_sold = 5
+        sale.save()
+        self.assertEqual(self.counters(), (5, 5, Decimal("100.00")))
+        response = self.client.patch(f"/sales/{sale.pk}/", {"quantity_sold": 50}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.counters(), (5, 5, Decimal("100.00")))
+
+        sale.rejected = True
+        sale.save()
+        self.assertEqual(self.counters(), (10, 0, Decimal("0.00")))
+        sale.save()  # saving a rejected sale again changes nothing
+        self.assertEqual(self.counters(), (10, 0, Decimal("0.00")))
+
+        other = Sale.objects.create(product=self.pump, quantity_sold=2, price_per_unit=Decimal("20.00"), created_by=self.user)
+        other.delete()
+        self.assertEqual(self.counters(), (10, 0, Decimal("0.00")))
+        self.assertEqual(self.kinds(), ["opening", "sale", "sale", "reversal", "sale", "reversal"])
+        self.assertEqual(stock.verify(), [])
+
+    def test_bulk_paths_and_manual_changes(self):
+        checkout([{"product": self.pump, "quantity_sold": 4, "price_per_unit": Decimal("5.00")}], created_by=self.user)
+        Sale.objects.create(product=self.pump, quantity_sold=1, price_per_unit=Decimal("5.00"), created_by=self.user)
+        self.assertEqual(review_sales(self.user, REJECT)[0], 2)
+        self.assertEqual(self.counters(), (10, 0, Decimal("0.00")))
+
+        self.pump.quantity = 25
+        self.pump.save()
+        self.pump.quantity = 24  # one broken in the store
+        self.pump.save()
+        self.pump.save(update_fields=["name"])
+        self.assertEqual(self.kinds(), ["opening", "sale", "sale", "reversal", "reversal", "restock", "adjustment"])
+        self.assertEqual(stock.verify(), [])
+        call_command("verify_stock", stdout=io.StringIO())
+
+        # A counter written around the ledger is caught
+        Product.objects.filter(pk=self.pump.pk).update(quantity=30)
+        self.assertEqual(stock.verify(), [(self.pump.pk, {"quantity": 30, "sold_units": 0, "amount_collected": 0},
+                                           {"quantity": 24, "sold_units": 0, "amount_collected": 0})])
+        with self.assertRaises(CommandError):
+            call_command("verify_stock", stdout=io.StringIO())
+
+    def test_snapshots_and_stock_at_a_past_moment(self):
+        for _ in range(3):
+            Sale.objects.create(product=self.pump, quantity_sold=1, price_per_unit=Decimal("20.00"), created_by=self.user)
+        before_snapshot = timezone.now()
+        self.assertEqual(stock.take_snapshots(lag=timedelta(0)), 1)
+        self.assertEqual(stock.take_snapshots(lag=timedelta(0)), 0)  # nothing new to fold
+        Sale.objects.create(product=self.pump, quantity_sold=2, price_per_unit=Decimal("20.00"), created_by=self.user)
+        self.pump.refresh_from_db()
+        self.pump.quantity += 5
+        self.pump.save()
+
+        # Snapshot + the two movements after it, in two queries
+        with self.assertNumQueries(2):
+            now = stock.stock_of(self.pump.pk)
+        self.assertEqual(now, {"quantity": 10, "sold_units": 5, "amount_collected": Decimal("100.00")})
+        self.assertEqual(stock.stock_of(self.pump.pk, at=before_snapshot),
+                         {"quantity": 7, "sold_units": 3, "amount_collected": Decimal("60.00")})
+        self.assertEqual(stock.stock_of(self.pump.pk, at=before_snapshot - timedelta(days=1)),
+                         {"quantity": 0, "sold_units": 0, "amount_collected": 0})
+        self.assertEqual(stock.take_snapshots(lag=timedelta(0)), 1)
+        self.assertEqual(stock.stock_of(self.pump.pk), now)
+        self.assertEqual(stock.verify(), [])
+
+        response = self.client.get(f"/products_api/{self.pump.pk}/stock/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["quantity"], response.data["counters"]["quantity"])
+        self.assertEqual(response.data["movements"][0]["kind"], "restock")
+        response = self.client.get(f"/products_api/{self.pump.pk}/stock/", {"at": before_snapshot.isoformat()})
+        self.assertEqual(response.data["quantity"], 7)
+
+
+class CustomerLedgerTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pump = Product.objects.create(name="Pump", quantity=10, created_by=self.user)
+
+    def sell_on_account(self, total, when="2026-03-02T09:00:00Z"):
+        response = self.client.post("/sales/", {
+            "customer_name": "Juma",
+            "total_amount": total,
+            "transaction_date": when,
+            "items": [{"product": self.pump.pk, "quantity_sold": 1, "price_per_unit": total}],
+        }, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        return response
+
+    def test_charges_payments_and_hand_edits_all_land(self):
+        self.sell_on_account("40.50")
+        self.sell_on_account("60.00")
+        juma = Customer.objects.get(name="Juma")
+        self.assertEqual(juma.remaining_balance, Decimal("100.50"))
+
+        # Another till charges the account while this instance is open
+        balances.charge(juma.pk, Decimal("20.00"))
+        juma.phone = "0700000000"
+        juma.save()
+        self.assertEqual(Customer.objects.get(pk=juma.pk).remaining_balance, Decimal("120.50"))
+
+        juma.remaining_balance += 5  # corrected by hand
+        juma.save()
+        self.assertEqual(juma.remaining_balance, Decimal("125.50"))
+        self.assertEqual(juma.pay_balance(Decimal("25.50")).amount, Decimal("-25.50"))
+        self.assertEqual(juma.pay_balance(Decimal("500")).amount, Decimal("-100.00"))  # never below zero
+        juma.refresh_from_db()
+        self.assertEqual(juma.remaining_balance, 0)
+
+        entries = list(CustomerLedgerEntry.objects.filter(customer=juma).order_by("id").values_list("kind", "amount", "balance_after"))
+        self.assertEqual(entries, [
+            ("charge", Decimal("40.50"), Decimal("40.50")),
+            ("charge", Decimal("60.00"), Decimal("100.50")),
+            ("charge", Decimal("20.00"), Decimal("120.50")),
+            ("adjustment", Decimal("5.00"), Decimal("125.50")),
+            ("payment", Decimal("-25.50"), Decimal("100.00")),
+            ("payment", Decimal("-100.00"), Decimal("0.00")),
+        ])
+        self.assertTrue(CustomerLedgerEntry.objects.filter(customer=juma, kind="charge", order__isnull=False).exists())
+
+    def test_statement_and_receivables(self):
+        self.sell_on_account("100.00")
+        juma = Customer.objects.get(name="Juma")
+        CustomerLedgerEntry.objects.filter(customer=juma).update(created_at=timezone.now() - timedelta(days=40))
+        response = self.client.post(f"/customers_api/{juma.pk}/payments/", {"amount": "30", "note": "cash"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["balance"], Decimal("70.00"))
+        for amount in ["-1", "0", "0.001", "NaN", "Infinity", "abc", None]:
+            response = self.client.post(f"/customers_api/{juma.pk}/payments/", {"amount": amount}, format="json")
+            self.assertEqual(response.status_code, 400, amount)
+        self.sell_on_account("15.00")
+
+        # Opening balance is the entry before the period, not a replay of it
+        with self.assertNumQueries(3):
+            account = balances.statement(juma.pk, timezone.now() - timedelta(days=30), timezone.now() + timedelta(days=1))
+        self.assertEqual((account["opening_balance"], account["closing_balance"]), (Decimal("100.00"), Decimal("85.00")))
+        self.assertEqual((account["charges"], account["payments"]), (Decimal("15.00"), Decimal("30.00")))
+
+        response = self.client.get(f"/customers_api/{juma.pk}/statement/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry["kind"] for entry in response.data["entries"]], ["payment", "charge"])
+        response = self.client.get("/customers_api/receivables/")
+        self.assertEqual((response.data["customers_owing"], response.data["outstanding"]), (1, Decimal("85.00")))
+        self.assertEqual((response.data["charged"], response.data["paid"]), (Decimal("15.00"), Decimal("30.00")))
+
+        stranger = User.objects.create_user(username="stranger", password="secret")
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.client.get(f"/customers_api/{juma.pk}/statement/").status_code, 404)
+        self.assertEqual(self.client.get("/customers_api/receivables/").data["outstanding"], 0)
+
+    def test_opening_entry_is_the_opening_balance(self):
+        asha = Customer.objects.create(name="Asha", business=self.user.businesses.first(), remaining_balance=Decimal("40.00"))
+        balances.charge(asha.pk, Decimal("10.00"))
+        response = self.client.get(f"/customers_api/{asha.pk}/statement/")
+        self.assertEqual([entry["kind"] for entry in response.data["entries"]], ["opening", "charge"])
+        self.assertEqual((response.data["opening_balance"], response.data["charges"], response.data["closing_balance"]),
+                         (Decimal("40.00"), Decimal("10.00"), Decimal("50.00")))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ReceivablesAgingTests(AuthenticatedTestCase):
+    username = "owner"
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.juma = self.account("Juma", [(100, 100), (50, 45), (30, 5)])
+        self.amina = self.account("Amina", [(200, 75)])
+        balances.pay(self.juma.pk, Decimal("120"))  # settles the oldest charges first
+        Customer.objects.create(name="Settled")
+
+    def account(self, name, charges):
+        customer = Customer.objects.create(name=name, business=self.user.businesses.first())
+        order = Order.objects.create(business=self.user.businesses.first(), customer=customer, customer_name=name,
+                                     total_amount=0, transaction_date=timezone.now(), created_by=self.user)
+        for amount, days_ago in charges:
+            entry = balances.charge(customer.pk, Decimal(amount), order=order)
+            CustomerLedgerEntry.objects.filter(pk=entry.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return customer
+
+    def test_buckets_in_one_query(self):
+        with self.assertNumQueries(3):  # the business (time zone, scope), then the report
+            response = self.client.get("/customers_api/receivables/aging/")
+        self.assertEqual(response.status_code, 200)
+        rows = {row["name"]: row for row in response.data["customers"]}
+        self.assertEqual(list(rows), ["Amina", "Juma"])
+        self.assertEqual([rows["Juma"][label] for label in response.data["buckets"]],
+                         [Decimal("30.00"), Decimal("30.00"), 0, 0])
+        self.assertEqual([rows["Amina"][label] for label in response.data["buckets"]],
+                         [0, 0, Decimal("200.00"), 0])
+        self.assertEqual(response.data["totals"]["balance"], Decimal("260.00"))
+
+    def test_cached_until_a_charge_or_payment(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get("/customers_api/receivables/aging/")
+        with self.assertNumQueries(1):  # only the business's time zone
+            self.client.get("/customers_api/receivables/aging/")
+        rival = User.objects.create_user(username="rival", password="secret").businesses.first()
+        with self.captureOnCommitCallbacks(execute=True):  # another business's customer
+            balances.charge(Customer.objects.create(name="Juma", business=rival).pk, Decimal("10"))
+        with self.assertNumQueries(1):
+            self.client.get("/customers_api/receivables/aging/")
+        with self.captureOnCommitCallbacks(execute=True):
+            balances.pay(self.amina.pk, Decimal("200"))
+        response = self.client.get("/customers_api/receivables/aging/")
+        self.assertEqual([row["name"] for row in response.data["customers"]], ["Juma"])
+
+    def test_csv_export(self):
+        response = self.client.get("/customers_api/receivables/aging/export/")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(lines[0], ["Customer ID", "Name", "Phone", "0-30 days", "31-60 days", "61-90 days",
+                                    "90+ days", "Balance"])
+        self.assertEqual(lines[2], [str(self.juma.pk), "Juma", "", "30.00", "30.00", "0.00", "0.00", "60.00"])
+
+        Customer.objects.filter(pk=self.amina.pk).update(name='=HYPERLINK("http://x")', phone="+255 712")
+        response = self.client.get("/customers_api/receivables/aging/export/")
+        lines = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(lines[1][1:3], ['\'=HYPERLINK("http://x")', "'+255 712"])
+
+        stranger = User.objects.create_user(username="stranger", password="secret")
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.client.get("/customers_api/receivables/aging/").data["customers"], [])
+
+
+class CustomerDirectoryTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = self.user.businesses.first()
+        self.pump = Product.objects.create(name="Pump", quantity=10, created_by=self.user)
+        for name, phone in [("Juma Ali", "0712 345 678"), ("Judith", "0722-000-111"), ("Amina", ""),
+                            ("Baraka", "0712 999 000"), ("Zawadi", "")]:
+            Customer.objects.create(name=name, phone=phone, business=self.business)
+        other = User.objects.create_user(username="rival", password="secret").businesses.first()
+        Customer.objects.create(name="Juma Ali", business=other)
+
+    def names(self, response):
+        return [row["name"] for row in response.data["results"]]
+
+    def test_checkout_finds_the_account_in_any_case(self):
+        for name in ["juma  ALI", "Mwajuma"]:
+            response = self.client.post("/sales/", {
+                "customer_name": name, "total_amount": "10.00", "transaction_date": "2026-03-02T09:00:00Z",
+                "items": [{"product": self.pump.pk, "quantity_sold": 1, "price_per_unit": "10.00"}],
+            }, format="json")
+            self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Customer.objects.get(business=self.business, normalized_name="juma ali").remaining_balance,
+                         Decimal("10.00"))
+        self.assertTrue(Customer.objects.filter(business=self.business, name="Mwajuma").exists())
+        with self.assertNumQueries(1):  # one hit on customer_business_name_uniq
+            self.assertEqual(customers.find_or_create(self.business, "JUMA ali").name, "Juma Ali")
+        with self.assertRaises(IntegrityError):
+            Customer.objects.create(name="JUMA ali", business=self.business)
+
+    def test_names_are_unique_without_a_business_too(self):
+        Customer.objects.create(name="Juma")
+        self.assertTrue(customers.name_taken(None, "juma "))
+        self.assertEqual(customers.find_or_create(None, "JUMA").name, "Juma")
+        with self.assertRaises(IntegrityError):
+            Customer.objects.create(name="juma")
+
+    def test_directory_pages_and_searches(self):
+        pages = []
+        response = self.client.get("/customers_api/", {"page_size": 2})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(self.names(response))
+            if response.data["next"] is None:
+                break
+            response = self.client.get("/customers_api/", {"page_size": 2, "cursor": response.data["next_cursor"]})
+        self.assertEqual(pages, [["Amina", "Baraka"], ["Judith", "Juma Ali"], ["Zawadi"]])
+
+        self.assertEqual(self.names(self.client.get("/customers_api/", {"q": "JU"})), ["Judith", "Juma Ali"])
+        self.assertEqual(self.names(self.client.get("/customers_api/", {"q": "0712"})), ["Baraka", "Juma Ali"])
+        self.assertEqual(self.names(self.client.get("/customers_api/", {"name": " juma ali"})), ["Juma Ali"])
+        self.assertEqual(self.names(self.client.get("/customers_api/", {"phone": "0722000111"})), ["Judith"])
+        self.assertEqual(self.client.get("/customers_api/", {"cursor": "garbage"}).status_code, 404)
+
+        response = self.client.get("/api/customers/", {"pagination": "cursor", "q": "z"})
+        self.assertEqual(self.names(response), ["Zawadi"])
+        self.assertEqual(len(self.client.get("/api/customers/").data), 5)
+
+    def test_html_list_is_paged(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.get("/customers/", {"q": "ju"})
+        self.assertEqual([customer.name for customer in response.context["customers"]], ["Judith", "Juma Ali"])
+        self.assertIsNone(response.context["next_cursor"])
+
+    def test_api_refuses_a_taken_name(self):
+        response = self.client.post("/api/customers/", {"name": "juma  ali "}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("name", response.data)
+        judith = Customer.objects.get(business=self.business, name="Judith")
+        response = self.client.patch(f"/api/customers/{judith.pk}/", {"name": "JUMA ALI"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        # Renaming to itself, and a name another business uses, are fine
+        response = self.client.patch(f"/api/customers/{judith.pk}/", {"name": "judith"}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.post("/api/customers/", {"name": "Rehema"}, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_form_refuses_a_taken_name(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.post("/customers/create/", {"name": "JUMA ali", "remaining_balance": "0"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("name", response.context["form"].errors)
+        judith = Customer.objects.get(business=self.business, name="Judith")
+        response = client.post(f"/customers/{judith.pk}/update/", {"name": "Juma Ali", "remaining_balance": "0"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("name", response.context["form"].errors)
+        response = client.post("/customers/create/", {"name": "Rehema", "remaining_balance": "0"})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Customer.objects.filter(business=self.business, name="Rehema").exists())
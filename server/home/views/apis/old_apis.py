@@ -5,7 +5,7 @@ from rest_framework.decorators import api_view
 from rest_framework import serializers
 from django.contrib.auth.hashers import make_password
 from rest_framework import permissions, viewsets
-from ...serializers import TransactionSerializer, UserSerializer,SaleSerializer, Sale,CustomerSerializer, ProductSerializer
+from ...serializers import TransactionSerializer, UserSerializer,SaleSerializer, Sale,CustomerSerializer, ProductSerializer, FastProductListSerializer
 from rest_framework.authtoken.models import Token
 from django.contrib.auth.hashers import make_password
 from rest_framework.authtoken.views import obtain_auth_token
@@ -14,7 +14,7 @@ from rest_framework.exceptions import NotFound
 from django.views.decorators.cache import cache_page
 from django.utils.decorators import method_decorator
 from rest_framework.decorators import action
-from ...models import Customer, Product
+from ...models import Customer, InsufficientStock, Product
 from django.core.cache import cache
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
@@ -26,6 +26,13 @@ from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from django.views.decorators.cache import never_cache
 from rest_framework import viewsets, permissions, status
+from ...pagination import CustomerKeysetPagination, ProductKeysetPagination, SaleKeysetPagination
+from ... import customers, leaderboard, list_cache
+from ...conditional import ListValidators, revalidate
+from ...streaming import streaming_list_response
+from .product_apis import get_user_cache_scopes
+from .sales_apis import sales_page_response
+from .customer_apis import customer_page_response
 
 
 # isAuthenticated = AllowAny
@@ -114,14 +121,13 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         if user.username == 'nsaro' or user.username == 'testuser':
             print("User is staff, returning all products")
-            return Product.objects.all()
+            return Product.objects.prefetch_related('vehicles')
         
         products = Product.objects.filter(
             # business__members=user, 
             created_by=user, 
             deleted=False
-        )
-        print(products.count())
+        ).prefetch_related('vehicles')
         return products
 
     def perform_create(self, serializer):
@@ -143,20 +149,34 @@ class ProductViewSet(viewsets.ModelViewSet):
         # based on the new stock levels
         return Response(serializer.data)  
     
+    # Clients keep the list and revalidate with If-None-Match, the
+    # server-side copy is list_cache below
+    @method_decorator(revalidate)
     def list(self, request, *args, **kwargs):
         print("Received GET request for product list")
-        cache_key = f'product_list_user__{request.user.id}'
-        cached_data = cache.get(cache_key)
-        
-        if cached_data:
-            print("Returning cached data for user:", request.user.id)
-            # return Response(cached_data)
-        
-        # This super().list() is what actually calls get_queryset()
-        response = super().list(request, *args, **kwargs)
-        
-        # cache.set(cache_key, response.data, timeout=60 * 15)
-        return response
+        validators = ListValidators(request, self.filter_queryset(self.get_queryset()))
+        not_modified = validators.not_modified()
+        if not_modified is not None:
+            return validators.finalize(not_modified)
+        if self.paginator is not None:
+            return validators.finalize(super().list(request, *args, **kwargs))
+
+        def build():
+            # Opt-in keyset pagination (?pagination=cursor), the old Expo client
+            # still gets the full list below.
+            if ProductKeysetPagination.is_requested(request):
+                paginator = ProductKeysetPagination()
+                page = paginator.paginate_queryset(self.filter_queryset(self.get_queryset()), request, view=self)
+                serializer = self.get_serializer(page, many=True)
+                return paginator.get_paginated_response(serializer.data).data
+
+            # Full list: skip per-field DRF serialization, same JSON
+            return FastProductListSerializer(self.filter_queryset(self.get_queryset())).data
+
+        # Cached until a Product/Sale signal bumps the user's version
+        return validators.finalize(Response(
+            list_cache.cached_list('product_viewset', request, get_user_cache_scopes(request.user), build)
+        ))
 
 
 
@@ -170,17 +190,16 @@ class ProductListView(APIView):
         user = request.user
 
         if False:
-            products = Product.objects.filter(deleted=False)
+            products = Product.objects.filter(deleted=False).prefetch_related('vehicles')
         else:
             # 2. Employees only see products for businesses they belong to
             # This follows the Business -> members (User) relationship
             products = Product.objects.filter(
                 business__members=user, 
                 deleted=False
-            ).distinct()
+            ).distinct().prefetch_related('vehicles')
 
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        return Response(FastProductListSerializer(products).data)
 
 
 class ProductDetailView(APIView):
@@ -189,8 +208,8 @@ class ProductDetailView(APIView):
 
     def get_queryset(self, user):
         if user.is_staff:
-            return Product.objects.all()
-        return Product.objects.filter(business__members=user, deleted=False).distinct()
+            return Product.objects.prefetch_related('vehicles')
+        return Product.objects.filter(business__members=user, deleted=False).distinct().prefetch_related('vehicles')
 
     def get(self, request, pk, *args, **kwargs):
         print(f"Received GET request for product ID: {pk} by user: {request.user.username}")
@@ -255,14 +274,14 @@ def sales_summary_view(request):
 # Shows products sorted by the number of units sold.
 def best_sellers_view(request):
     """
-    Lists products ordered by the number of units sold (descending).
+    Lists products ordered by the number of approved units sold (descending).
     """
-    # Filter for products that have actually been sold
-    best_sellers = Product.objects.filter(
-        sold_units__gt=0
-    ).order_by(
-        '-sold_units', '-amount_collected' # Primary sort by units, secondary by revenue
-    )[:10] # Top 10 best sellers
+    # Ranking comes from the leaderboard, no grouping of sales per request
+    scope = leaderboard.scope_for_user(request.user) if request.user.is_authenticated else list_cache.ALL
+    window = request.GET.get('window') if request.GET.get('window') in leaderboard.WINDOWS else 'all'
+    ranking = leaderboard.top(scope, window, 10) # Top 10 best sellers
+    products = Product.objects.in_bulk([pk for pk, _ in ranking])
+    best_sellers = [products[pk] for pk, _ in ranking if pk in products]
 
     context = {
         'products': best_sellers,
@@ -302,8 +321,9 @@ class SaleListView(APIView):
     def get(self, request, *args, **kwargs):
         print("Received GET request for sales list")
         sales = Sale.objects.select_related('product').order_by('-date_sold')
-        serializer = SaleSerializer(sales, many=True)
-        return Response(serializer.data)
+        if SaleKeysetPagination.is_requested(request):
+            return sales_page_response(request, sales)
+        return streaming_list_response(request, sales, SaleSerializer)
 
     # POST method - Create a new sale
     # @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
@@ -341,7 +361,11 @@ class SaleDetailView(APIView):
         
         serializer = SaleSerializer(sale, data=request.data, partial=False)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except InsufficientStock as e:
+                # Asked for more units than the product has left
+                return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -354,7 +378,11 @@ class SaleDetailView(APIView):
         
         serializer = SaleSerializer(sale, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                serializer.save()
+            except InsufficientStock as e:
+                # Asked for more units than the product has left
+                return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -401,7 +429,6 @@ class SaleViewSet(viewsets.ModelViewSet):
         ).filter(aproved=True) if not (user.username == 'nsaro' or user.username == 'testuser'
                   ) else Sale.objects.select_related('product').order_by('-date_sold')
         # print(sales.query)  # Debug: Print the actual SQL query being executed
-        print(f"Found {sales.count()} sales for user: {user.username}")
         return sales
 
     def perform_create(self, serializer):
@@ -410,10 +437,20 @@ class SaleViewSet(viewsets.ModelViewSet):
         """
         serializer.save(processed_by=self.request.user)
 
-    @method_decorator(never_cache)
+    @method_decorator(revalidate)
     def list(self, request, *args, **kwargs):
         print("Received GET request for sales list")
-        return super().list(request, *args, **kwargs)
+        # Opt-in keyset pagination and filters (?pagination=cursor), before
+        # the validators so a page never aggregates the whole history
+        if SaleKeysetPagination.is_requested(request):
+            return sales_page_response(request, self.filter_queryset(self.get_queryset()))
+        validators = ListValidators(
+            request, self.filter_queryset(self.get_queryset()), ('updated_at', 'product__updated_at')
+        )
+        not_modified = validators.not_modified()
+        if not_modified is not None:
+            return validators.finalize(not_modified)
+        return validators.finalize(super().list(request, *args, **kwargs))
 
     @method_decorator(never_cache)
     def retrieve(self, request, *args, **kwargs):
@@ -436,5 +473,20 @@ class SaleViewSet(viewsets.ModelViewSet):
 
 
 class CustomerViewSet(viewsets.ModelViewSet):
-    queryset = Customer.objects.all()
+    # Scoped to the caller's business now, so it needs a caller
+    permission_classes = [IsAuthenticated]
+    queryset = Customer.objects.all()  # for the router, get_queryset() scopes it
     serializer_class = CustomerSerializer
+
+    def get_queryset(self):
+        return customers.directory(self.request.user).order_by('normalized_name', 'id')
+
+    def list(self, request, *args, **kwargs):
+        # Opt-in cursor pages and search (?pagination=cursor&q=), like
+        # customers_api/
+        if CustomerKeysetPagination.is_requested(request):
+            return customer_page_response(request, self.get_queryset())
+        return super().list(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(business=self.request.user.businesses.first())
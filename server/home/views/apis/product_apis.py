@@ -10,35 +10,68 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.core.cache import cache
-from ...models import Product, Sale
-from ...serializers import ProductSerializer
+from django.views.decorators.cache import never_cache
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
+from ...models import InsufficientStock, Product, ProductTombstone, Sale, StockMovement
+from ...serializers import ProductSerializer, FastProductListSerializer
+from ...pagination import ProductKeysetPagination, decode_position, encode_position
+from ... import autocomplete, list_cache, stock
 
 # --- HELPERS ---
 def get_user_queryset(user):
     """Replicates the logic from your original get_queryset"""
     if user.username in ['nsaro', 'testuser']:
-        return Product.objects.all()
-    return Product.objects.filter(created_by=user, deleted=False)
+        return Product.objects.prefetch_related('vehicles')
+    return Product.objects.filter(created_by=user, deleted=False).prefetch_related('vehicles')
+
+def get_user_cache_scopes(user):
+    """list_cache scopes whose version covers get_user_queryset(user)"""
+    if user.username in ['nsaro', 'testuser']:
+        return [list_cache.ALL]
+    return [list_cache.user_scope(user.pk)]
+
+
+def get_user_sync_querysets(user):
+    """Same scope as get_user_queryset, but keeps soft-deleted rows and
+    hard-delete tombstones so the sync feed can report removals."""
+    if user.username in ['nsaro', 'testuser']:
+        return Product.objects.prefetch_related('vehicles'), ProductTombstone.objects.all()
+    return (Product.objects.filter(created_by=user).prefetch_related('vehicles'),
+            ProductTombstone.objects.filter(created_by=user))
+
+
+SYNC_BATCH_SIZE = 500
+SYNC_MAX_BATCH_SIZE = 5000
+# Rows saved just before a drained sync may commit after we read; re-sending
+# this window on the next poll is cheaper than missing them.
+SYNC_OVERLAP = timedelta(seconds=5)
 
 # --- VIEWS ---
 
+@never_cache
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def product_list_view(request):
     print("Received GET request for product list")
     user = request.user
 
-    # Cache Logic
-    # cache_key = f'product_list_user__{user.id}'
-    # cached_data = cache.get(cache_key)
-    # if cached_data:
-        # print("Returning cached data")
-        # return Response(cached_data)
+    def build():
+        queryset = get_user_queryset(user)
 
-    queryset = get_user_queryset(user)
-    serializer = ProductSerializer(queryset, many=True)
-    print(serializer.data)
-    return Response(serializer.data)
+        # ?pagination=cursor -> pages keyed on (created_at, id)
+        if ProductKeysetPagination.is_requested(request):
+            paginator = ProductKeysetPagination()
+            page = paginator.paginate_queryset(queryset, request)
+            serializer = ProductSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data).data
+
+        return FastProductListSerializer(queryset).data
+
+    # Cached until a Product/Sale signal bumps the user's version
+    return Response(list_cache.cached_list('products_api', request, get_user_cache_scopes(user), build))
 
 
 @api_view(['POST'])
@@ -106,23 +139,23 @@ def product_sale_view(request, pk):
     except (ValueError, TypeError):
         return Response({"error": "Invalid data format."}, status=status.HTTP_400_BAD_REQUEST)
 
-    if qty_to_sell > product.quantity:
+    # Cheap early answer only, product.quantity may already be stale. The
+    # real check is the conditional decrement in Product.update_stock.
+    if qty_to_sell > (product.quantity or 0):
         return Response({"error": "Not enough stock available."}, status=status.HTTP_400_BAD_REQUEST)
 
     # 2. Process Sale
     try:
         with transaction.atomic():
             # Simply create the sale. 
-            # The Sale.save() method will automatically call update_stock.
+            # The Sale.save() method will automatically call update_stock,
+            # which also refreshes product's stock fields.
             sale = Sale.objects.create(
                 product=product,
                 quantity_sold=qty_to_sell,
                 price_per_unit=price_per_unit,
                 created_by=user
             )
-            
-            # Refresh product to get updated values from the save() trigger
-            product.refresh_from_db()
 
         return Response({
             "message": "Sale successful",
@@ -131,5 +164,118 @@ def product_sale_view(request, pk):
             "profit_to_date": product.profit
         }, status=status.HTTP_201_CREATED)
 
+    except InsufficientStock:
+        # Someone else sold the units between our read and the decrement
+        return Response({"error": "Not enough stock available."}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+STOCK_RECENT_MOVEMENTS = 20
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def product_stock_view(request, pk):
+    """
+    Stock from the movement ledger, now or at a past moment:
+        ?at=2026-03-01T18:00:00+03:00
+    Now also returns the product's counters, which should match, and its
+    latest movements.
+    """
+    product = get_object_or_404(get_user_queryset(request.user), pk=pk)
+    at = None
+    if request.query_params.get('at'):
+        at = parse_datetime(request.query_params['at'])
+        if at is None:
+            return Response({"error": "at must be an ISO 8601 datetime."}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+
+    data = {'product': product.pk, 'at': at or timezone.now(), **stock.stock_of(product.pk, at)}
+    if at is None:
+        data['counters'] = {field: getattr(product, field) or 0 for field in stock.COUNTERS}
+        data['movements'] = list(
+            StockMovement.objects.filter(product_id=product.pk).order_by('-id')
+            .values('id', 'kind', 'sale_id', 'quantity', 'sold_units', 'amount_collected', 'created_at')
+            [:STOCK_RECENT_MOVEMENTS]
+        )
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def product_sync_view(request):
+    """
+    Delta feed for the mobile catalog.
+
+    GET products_api/sync/?since=<watermark>&limit=<n>
+    Returns the products created or changed since the watermark, the ids of
+    products deleted since then, and a new watermark to send next time. No
+    'since' means a full sync. Keep calling while has_more is true.
+    """
+    started_at = timezone.now()
+    products, tombstones = get_user_sync_querysets(request.user)
+
+    try:
+        limit = int(request.query_params.get('limit', SYNC_BATCH_SIZE))
+    except ValueError:
+        return Response({"error": "Invalid limit."}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, SYNC_MAX_BATCH_SIZE))
+
+    since = request.query_params.get('since')
+    if since:
+        try:
+            since_at, since_id = decode_position(since)
+        except ValueError:
+            return Response({"error": "Invalid watermark."}, status=status.HTTP_400_BAD_REQUEST)
+        products = products.filter(
+            Q(updated_at__gte=since_at),
+            Q(updated_at__gt=since_at) | Q(id__gt=since_id),
+        )
+        tombstones = tombstones.filter(deleted_at__gte=since_at)
+
+    rows = list(products.order_by('updated_at', 'id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if has_more:
+        # Resume right after the last row we sent
+        watermark_at, watermark_id = rows[-1].updated_at, rows[-1].id
+        tombstones = tombstones.filter(deleted_at__lte=watermark_at)
+    else:
+        watermark_at, watermark_id = started_at - SYNC_OVERLAP, 0
+        if since and since_at > watermark_at:
+            watermark_at, watermark_id = since_at, since_id
+
+    changed = [product for product in rows if not product.deleted]
+    deleted = [product.id for product in rows if product.deleted]
+    deleted += list(tombstones.values_list('product_id', flat=True))
+
+    return Response({
+        "changed": ProductSerializer(changed, many=True).data,
+        "deleted": deleted,
+        "watermark": encode_position(watermark_at, watermark_id),
+        "has_more": has_more,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def product_autocomplete_view(request):
+    """
+    GET products_api/autocomplete/?q=AA07&limit=10
+    Prefix match on part number and name words, answered from the in-memory
+    index of the user's business (see home/autocomplete.py).
+    """
+    try:
+        limit = int(request.query_params.get('limit', autocomplete.DEFAULT_LIMIT))
+    except ValueError:
+        return Response({"error": "Invalid limit."}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, autocomplete.MAX_LIMIT))
+
+    index = autocomplete.get_index(autocomplete.scope_for_user(request.user))
+    return Response({
+        "results": index.lookup(request.query_params.get('q', ''), limit),
+        "index": index.stats(),
+    })
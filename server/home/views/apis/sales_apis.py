@@ -1,21 +1,37 @@
 from django.views.decorators.cache import cache_control
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from home.models import Sale
-from home.serializers import SaleSerializer
+from home.models import Business, DailySalesRollup, Product, Sale
+from home.serializers import SaleReviewSerializer, SaleSerializer
+from home.approvals import review_sales
+from home import leaderboard
+from home.rollups import revenue_through
+from home.analytics import DEFAULT_METRICS, HISTOGRAM_BUCKETS, METRICS, histogram, summarize
+from django.utils.dateparse import parse_date
+from django.db.models import F
+from django.db.models.functions import TruncMonth, TruncYear
+from home.conditional import ListValidators, revalidate
+from home.streaming import streaming_list_response
+from home.pagination import SaleKeysetPagination
+from home.sale_filters import filter_sales
 from django.db import models
 from django.utils import timezone
 from datetime import timedelta
 from django.db.models import Sum
 from django.db.models import Count,Avg, Max, Min# SALES APIS
 
-@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+# Polled by the app: no-cache + ETag instead of no-store, so an unchanged
+# list costs one aggregate query and a 304
+@revalidate
 @api_view(['GET'])
 def list_unverified_sales_api(request):
     sales = Sale.objects.select_related('product').filter(aproved=False,product__created_by=request.user).order_by('-date_sold')
-    print(sales)
+    validators = ListValidators(request, sales, ('updated_at', 'product__updated_at'))
+    not_modified = validators.not_modified()
+    if not_modified is not None:
+        return validators.finalize(not_modified)
     serializer = SaleSerializer(sales, many=True)
-    return Response(serializer.data)
+    return validators.finalize(Response(serializer.data))
 
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
@@ -41,6 +57,27 @@ def reject_sale_api(request, pk):
     except Sale.DoesNotExist:
         return Response({'status': 'error', 'message': 'Sale not found.'}, status=404)
     
+@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@api_view(['POST'])
+def bulk_review_sales_api(request):
+    """
+    End-of-day approval in one request:
+        {"action": "approve", "ids": [1, 2, 3]}
+        {"action": "reject", "before": "2026-03-02T18:00:00Z"}
+    Only the caller's pending sales are touched, see home/approvals.py.
+    """
+    serializer = SaleReviewSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    count, total = review_sales(request.user, data['action'], ids=data.get('ids'), before=data.get('before'))
+    return Response({
+        'status': 'success',
+        'action': data['action'],
+        'updated': count,
+        'total_amount': total,
+        'skipped': len(data['ids']) - count if 'ids' in data else 0,
+    })
+
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def list_approved_sales_api(request):
@@ -59,8 +96,36 @@ def list_rejected_sales_api(request):
 @api_view(['GET'])
 def list_all_sales_api(request):
     sales = Sale.objects.select_related('product').filter(product__created_by=request.user).order_by('-date_sold')
-    serializer = SaleSerializer(sales, many=True)
-    return Response(serializer.data)
+    # whole history, stream it instead of building the list in memory
+    return streaming_list_response(request, sales, SaleSerializer)
+
+def sales_page_response(request, sales):
+    """One cursor page of `sales`, filtered by the query params (home/sale_filters.py)."""
+    try:
+        sales = filter_sales(sales, request.query_params)
+    except ValueError as e:
+        return Response({'status': 'error', 'message': str(e)}, status=400)
+    paginator = SaleKeysetPagination()
+    page = paginator.paginate_queryset(sales.select_related('product'), request)
+    serializer = SaleSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@api_view(['GET'])
+def list_sales_api(request):
+    """
+    Sales newest first, a page at a time:
+        ?status=pending|approved|rejected&product=12&customer=3&seller=<user id>
+         &start=2026-01-01&end=2026-01-31&page_size=50&cursor=<next_cursor>
+    Follow `next` until it is null. Covers the caller's products (everything
+    for the staff accounts).
+    """
+    sales = Sale.objects.all()
+    if request.user.username not in ['nsaro', 'testuser']:
+        sales = sales.filter(product__created_by=request.user)
+    return sales_page_response(request, sales)
+
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
@@ -75,17 +140,151 @@ def get_sale_details_api(request, pk):
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_sales_summary_api(request):
-    total_sales = Sale.objects.filter(aproved=True,product__created_by=request.user).count()
-    total_revenue = Sale.objects.filter(aproved=True,product__created_by=request.user).aggregate(total=models.Sum('total_amount'))['total'] or 0
-    total_products_sold = Sale.objects.filter(aproved=True,product__created_by=request.user).aggregate(total=models.Sum('quantity_sold'))['total'] or 0
-
-    summary = {
-        'total_sales': total_sales,
-        'total_revenue': total_revenue,
-        'total_products_sold': total_products_sold,
-    }
+    summary = summarize(Sale.objects.filter(product__created_by=request.user),
+                        ['total_sales', 'total_revenue', 'total_products_sold'])
     return Response(summary)
 
+
+def _parse_day(value):
+    if not value:
+        return None
+    day = parse_date(value)  # raises ValueError for 2026-02-30
+    if day is None:
+        raise ValueError(value)
+    return day
+
+
+def metric_response(sales, key, metric):
+    """Body of the old one-number endpoints, now a wrapper over summarize()."""
+    return {key: summarize(sales, [metric])[metric]}
+
+
+@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@api_view(['GET'])
+def sales_analytics_api(request):
+    """
+    Any set of sales metrics in one query:
+        ?metrics=total_revenue,highest_sale&start=2026-01-01&end=2026-01-31&product=12
+    All metrics when none are asked for. start/end are inclusive local dates.
+    Covers the caller's products (everything for the staff accounts).
+    """
+    metrics = [m for m in request.query_params.get('metrics', '').split(',') if m] or DEFAULT_METRICS
+    unknown = sorted(set(metrics) - set(METRICS))
+    if unknown:
+        return Response({'status': 'error', 'message': f"Unknown metrics: {', '.join(unknown)}",
+                         'available': list(METRICS)}, status=400)
+
+    sales = Sale.objects.all()
+    if request.user.username not in ['nsaro', 'testuser']:
+        sales = sales.filter(product__created_by=request.user)
+    try:
+        start = _parse_day(request.query_params.get('start'))
+        end = _parse_day(request.query_params.get('end'))
+        product = int(request.query_params['product']) if request.query_params.get('product') else None
+    except ValueError:
+        return Response({'status': 'error', 'message': 'start/end must be YYYY-MM-DD, product an id.'}, status=400)
+    if start:
+        sales = sales.filter(date_sold__gte=timezone.make_aware(timezone.datetime.combine(start, timezone.datetime.min.time())))
+    if end:
+        sales = sales.filter(date_sold__lt=timezone.make_aware(timezone.datetime.combine(end + timedelta(days=1), timezone.datetime.min.time())))
+    if product is not None:
+        sales = sales.filter(product_id=product)
+
+    return Response({'start': start, 'end': end, 'metrics': summarize(sales, metrics)})
+
+
+ROLLUP_PERIODS = {'day': None, 'month': TruncMonth, 'year': TruncYear}
+
+
+@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@api_view(['GET'])
+def get_sales_period_report_api(request):
+    """
+    Approved sales totals per day, month or year, read from the daily rollups:
+        ?period=month&start=2026-01-01&end=2026-12-31&product=12
+    Defaults to daily totals of the last 30 days.
+    """
+    period = request.query_params.get('period', 'day')
+    if period not in ROLLUP_PERIODS:
+        return Response({'status': 'error', 'message': 'period must be day, month or year.'}, status=400)
+    try:
+        start = _parse_day(request.query_params.get('start'))
+        end = _parse_day(request.query_params.get('end'))
+        product = int(request.query_params['product']) if request.query_params.get('product') else None
+    except ValueError:
+        return Response({'status': 'error', 'message': 'start/end must be YYYY-MM-DD, product an id.'}, status=400)
+    if start is None and end is None and period == 'day':
+        start = timezone.localdate() - timedelta(days=30)
+
+    rollups = DailySalesRollup.objects.all()
+    if request.user.username not in ['nsaro', 'testuser']:
+        rollups = rollups.filter(product__created_by=request.user)
+    if start:
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        rollups = rollups.filter(day__lte=end)
+    if product is not None:
+        rollups = rollups.filter(product_id=product)
+
+    trunc = ROLLUP_PERIODS[period]
+    report = (
+        rollups.values(period=trunc('day') if trunc else F('day'))
+        .annotate(sales_count=Sum('sales_count'), units=Sum('units'), revenue=Sum('revenue'), cost=Sum('cost'))
+        .order_by('period')
+    )
+    return Response([
+        {**row, 'profit': row['revenue'] - row['cost']} for row in report
+    ])
+
+
+# How far back each bucket size looks when no start is given, in days
+# (the bucket holding start is included, so 334 days is 12 months)
+HISTOGRAM_DEFAULT_SPAN = {'hour': 0, 'day': 29, 'week': 7 * 11, 'month': 334}
+
+
+@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+@api_view(['GET'])
+def get_sales_histogram_api(request):
+    """
+    Approved sales per hour, day, week or month, with empty buckets filled in:
+        ?bucket=day&start=2026-01-01&end=2026-01-31&product=12
+    start/end are inclusive dates in the business's time zone. Defaults to
+    today by hour, the last 30 days, 12 weeks or 12 months.
+    """
+    bucket = request.query_params.get('bucket', 'day')
+    if bucket not in HISTOGRAM_BUCKETS:
+        return Response({'status': 'error', 'message': 'bucket must be hour, day, week or month.'}, status=400)
+    try:
+        start = _parse_day(request.query_params.get('start'))
+        end = _parse_day(request.query_params.get('end'))
+        product = int(request.query_params['product']) if request.query_params.get('product') else None
+    except ValueError:
+        return Response({'status': 'error', 'message': 'start/end must be YYYY-MM-DD, product an id.'}, status=400)
+
+    business = request.user.businesses.first()
+    tz = business.tzinfo if business else timezone.get_default_timezone()
+    end = end or timezone.localdate(timezone=tz)
+    start = start or end - timedelta(days=HISTOGRAM_DEFAULT_SPAN[bucket])
+    if start > end:
+        return Response({'status': 'error', 'message': 'start is after end.'}, status=400)
+
+    sales = Sale.objects.all()
+    if request.user.username not in ['nsaro', 'testuser']:
+        sales = sales.filter(product__created_by=request.user)
+    if product is not None:
+        sales = sales.filter(product_id=product)
+    try:
+        results = histogram(
+            sales, bucket,
+            timezone.make_aware(timezone.datetime.combine(start, timezone.datetime.min.time()), tz),
+            timezone.make_aware(timezone.datetime.combine(end + timedelta(days=1), timezone.datetime.min.time()), tz),
+            tz,
+        )
+    except ValueError as e:
+        return Response({'status': 'error', 'message': f'{e}, use a bigger bucket or a shorter range.'}, status=400)
+    return Response({'bucket': bucket, 'time_zone': str(tz), 'start': start, 'end': end, 'results': results})
+
+
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_product_sales_api(request, product_id):
@@ -130,8 +329,7 @@ def get_yearly_sales_api(request):
     end_of_year = timezone.make_aware(timezone.datetime.combine(today.replace(month=12, day=31), timezone.datetime.max.time()))
 
     sales = Sale.objects.select_related('product').filter(date_sold__range=(start_of_year, end_of_year), aproved=True)
-    serializer = SaleSerializer(sales, many=True)
-    return Response(serializer.data)
+    return streaming_list_response(request, sales, SaleSerializer)
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
@@ -147,76 +345,80 @@ def get_sales_by_date_range_api(request, start_date, end_date):
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_top_selling_products_api(request, top_n=5):
-
-    top_products = (Sale.objects.filter(aproved=True)
-                    .values('product__id', 'product__name')
-                    .annotate(total_sold=Sum('quantity_sold'))
-                    .order_by('-total_sold')[:top_n])
-
+    """
+    Best sellers by approved units, from the leaderboard (home/leaderboard.py):
+        ?window=today|7d|30d|all&limit=5
+    Covers the caller's business (everything for the staff accounts).
+    """
+    window = request.query_params.get('window', 'all')
+    if window not in leaderboard.WINDOWS:
+        return Response({'status': 'error', 'message': f"window must be one of {', '.join(leaderboard.WINDOWS)}."},
+                        status=400)
+    try:
+        top_n = min(int(request.query_params.get('limit', top_n)), leaderboard.MAX_LIMIT)
+    except ValueError:
+        return Response({'status': 'error', 'message': 'limit must be a number.'}, status=400)
+    if top_n < 1:
+        return Response({'status': 'error', 'message': 'limit must be at least 1.'}, status=400)
+
+    ranking = leaderboard.top(leaderboard.scope_for_user(request.user), window, top_n)
+    names = dict(Product.objects.filter(pk__in=[pk for pk, _ in ranking]).values_list('pk', 'name'))
+    top_products = [
+        {'product__id': pk, 'product__name': names[pk], 'total_sold': units}
+        for pk, units in ranking if pk in names
+    ]
     return Response(top_products)
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_sales_statistics_api(request):
 
-    stats = Sale.objects.filter(aproved=True).aggregate(
-        average_sale_amount=Avg('total_amount'),
-        max_sale_amount=Max('total_amount'),
-        min_sale_amount=Min('total_amount'),
-    )
-
-    return Response(stats)
+    stats = summarize(Sale.objects.all(), ['average_sale_value', 'highest_sale', 'lowest_sale'], default=None)
+    return Response({
+        'average_sale_amount': stats['average_sale_value'],
+        'max_sale_amount': stats['highest_sale'],
+        'min_sale_amount': stats['lowest_sale'],
+    })
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_pending_sales_count_api(request):
-    pending_count = Sale.objects.filter(aproved=False).count()
-    return Response({'pending_sales_count': pending_count}) 
+    return Response(metric_response(Sale.objects.all(), 'pending_sales_count', 'pending_sales_count'))
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_approved_sales_count_api(request):
-    approved_count = Sale.objects.filter(aproved=True).count()
-    return Response({'approved_sales_count': approved_count})
+    return Response(metric_response(Sale.objects.all(), 'approved_sales_count', 'approved_sales_count'))
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_rejected_sales_count_api(request):
-    rejected_count = Sale.objects.filter(rejected=True).count()
-    return Response({'rejected_sales_count': rejected_count})
+    return Response(metric_response(Sale.objects.all(), 'rejected_sales_count', 'rejected_sales_count'))
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_total_revenue_api(request):
-    total_revenue = Sale.objects.filter(aproved=True).aggregate(total=models.Sum('total_amount'))['total'] or 0
-    return Response({'total_revenue': total_revenue})
+    return Response(metric_response(Sale.objects.all(), 'total_revenue', 'total_revenue'))
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_total_products_sold_api(request):
-    total_products_sold = Sale.objects.filter(aproved=True).aggregate(total=models.Sum('quantity_sold'))['total'] or 0
-    return Response({'total_products_sold': total_products_sold})
+    return Response(metric_response(Sale.objects.all(), 'total_products_sold', 'total_products_sold'))
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_average_sale_value_api(request):
-
-    average_sale_value = Sale.objects.filter(aproved=True).aggregate(average=models.Avg('total_amount'))['average'] or 0
-    return Response({'average_sale_value': average_sale_value})
+    return Response(metric_response(Sale.objects.all(), 'average_sale_value', 'average_sale_value'))
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_highest_sale_api(request):
-
-    highest_sale = Sale.objects.filter(aproved=True).aggregate(highest=models.Max('total_amount'))['highest'] or 0
-    return Response({'highest_sale': highest_sale})
+    return Response(metric_response(Sale.objects.all(), 'highest_sale', 'highest_sale'))
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_lowest_sale_api(request):
-
-    lowest_sale = Sale.objects.filter(aproved=True).aggregate(lowest=models.Min('total_amount'))['lowest'] or 0
-    return Response({'lowest_sale': lowest_sale})
+    return Response(metric_response(Sale.objects.all(), 'lowest_sale', 'lowest_sale'))
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
@@ -224,10 +426,11 @@ def get_sales_trends_api(request):
     today = timezone.now().date()
     start_date = today - timedelta(days=30)
 
-    sales_trends = (Sale.objects.filter(date_sold__date__gte=start_date, aproved=True)
-                    .extra({'date': "date(date_sold)"})
-                    .values('date')
-                    .annotate(total_sales=Count('id'))
+    # From the daily rollups, 30 days is a few rows per product instead of
+    # every sale of the month
+    sales_trends = (DailySalesRollup.objects.filter(day__gte=start_date)
+                    .values(date=F('day'))
+                    .annotate(total_sales=Sum('sales_count'))
                     .order_by('date'))
 
     return Response(sales_trends)
@@ -236,15 +439,13 @@ def get_sales_trends_api(request):
 @api_view(['GET'])
 def get_product_sales_summary_api(request, product_id):
 
-    total_sold = Sale.objects.filter(product__id=product_id, aproved=True).aggregate(total=models.Sum('quantity_sold'))['total'] or 0
-    total_revenue = Sale.objects.filter(product__id=product_id, aproved=True).aggregate(total=models.Sum('total_amount'))['total'] or 0
-
+    totals = summarize(Sale.objects.filter(product__id=product_id), ['total_products_sold', 'total_revenue'])
     summary = {
         'product_id': product_id,
-        'total_sold': total_sold,
-        'total_revenue': total_revenue,
+        'total_sold': totals['total_products_sold'],
+        'total_revenue': totals['total_revenue'],
     }
-    return Response(summary)    
+    return Response(summary)
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
@@ -256,44 +457,86 @@ def get_recent_sales_api(request, limit=10):
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_sales_count_api(request):
-    sales_count = Sale.objects.filter(aproved=True).count()
-    return Response({'sales_count': sales_count})
+    return Response(metric_response(Sale.objects.all(), 'sales_count', 'total_sales'))
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_total_sales_amount_api(request):
-    total_sales_amount = Sale.objects.filter(aproved=True).aggregate(total=models.Sum('total_amount'))['total'] or 0
-    return Response({'total_sales_amount': total_sales_amount})
+    return Response(metric_response(Sale.objects.all(), 'total_sales_amount', 'total_revenue'))
 
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_average_units_sold_per_sale_api(request):
+    return Response(metric_response(Sale.objects.all(), 'average_units_sold_per_sale', 'average_units_sold_per_sale'))
+
+def _growth_rate(current, previous):
+    return 0 if not previous else ((current - previous) / previous) * 100
 
-    average_units_sold = Sale.objects.filter(aproved=True).aggregate(average=models.Avg('quantity_sold'))['average'] or 0
-    return Response({'average_units_sold_per_sale': average_units_sold})    
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
-def get_sales_growth_rate_api(request, start_date, end_date):
-
-    start_date = timezone.make_aware(timezone.datetime.strptime(start_date, '%Y-%m-%d'))
-    end_date = timezone.make_aware(timezone.datetime.strptime(end_date, '%Y-%m-%d') + timezone.timedelta(days=1) - timezone.timedelta(seconds=1))
-
-    sales_start = Sale.objects.filter(date_sold__lte=start_date, aproved=True).aggregate(total=models.Sum('total_amount'))['total'] or 0
-    sales_end = Sale.objects.filter(date_sold__lte=end_date, aproved=True).aggregate(total=models.Sum('total_amount'))['total'] or 0
-
-    if sales_start == 0:
-        growth_rate = 0
-    else:
-        growth_rate = ((sales_end - sales_start) / sales_start) * 100
-
-    return Response({'sales_growth_rate': growth_rate})
+def get_sales_growth_rate_api(request):
+    """
+    ?start=2026-01-01&end=2026-01-31 (defaults: the last 30 days)
+
+    sales_growth_rate is approved revenue up to the end of `end` against
+    revenue before `start`, as before. week_to_date and month_to_date compare
+    this week and this month so far with the same days of the previous week
+    and month. Everything comes from the running totals kept in
+    RevenueCheckpoint and DailyBusinessRevenue, in one query.
+    """
+    try:
+        start = _parse_day(request.query_params.get('start'))
+        end = _parse_day(request.query_params.get('end'))
+    except ValueError:
+        return Response({'status': 'error', 'message': 'start/end must be YYYY-MM-DD.'}, status=400)
+    today = timezone.localdate()
+    end = end or today
+    start = start or end - timedelta(days=30)
+
+    businesses = Business.objects.all()
+    if request.user.username not in ['nsaro', 'testuser']:
+        businesses = businesses.filter(members=request.user)
+
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    last_month_end = month_start - timedelta(days=1)
+    last_month_start = last_month_end.replace(day=1)
+    periods = {
+        'week_to_date': ((week_start, today), (week_start - timedelta(days=7), today - timedelta(days=7))),
+        # Same number of days into last month, cut at its end (March 31st vs February 28th)
+        'month_to_date': ((month_start, today),
+                          (last_month_start, min(last_month_start + (today - month_start), last_month_end))),
+    }
+    days = {start - timedelta(days=1), end}
+    for ranges in periods.values():
+        for first, last in ranges:
+            days.update((first - timedelta(days=1), last))
+    through = revenue_through(days, businesses)
+
+    def revenue(first, last):
+        return through[last] - through[first - timedelta(days=1)]
+
+    response = {
+        'start': start,
+        'end': end,
+        'revenue_before_start': through[start - timedelta(days=1)],
+        'revenue_through_end': through[end],
+        'sales_growth_rate': _growth_rate(through[end], through[start - timedelta(days=1)]),
+    }
+    for name, (current, previous) in periods.items():
+        current_revenue, previous_revenue = revenue(*current), revenue(*previous)
+        response[name] = {
+            'current': current_revenue,
+            'previous': previous_revenue,
+            'growth_rate': _growth_rate(current_revenue, previous_revenue),
+        }
+    return Response(response)
 
 
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @api_view(['GET'])
 def get_average_order_value_api(request):
-    average_order_value = Sale.objects.filter(aproved=True).aggregate(average=models.Avg('total_amount'))['average'] or 0
-    return Response({'average_order_value': average_order_value})
+    return Response(metric_response(Sale.objects.all(), 'average_order_value', 'average_sale_value'))
 
@@ -1,12 +1,19 @@
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404, JsonResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.core.paginator import Paginator
 from django.db.models import Q
 from django.urls import reverse
 from django.shortcuts import get_object_or_404, redirect, render
-from ..models import Product,Sale, Vehicle
+from ..models import InsufficientStock, Product,Sale, Vehicle
+from ..search import search_product_queryset
+from ..pagination import CustomerKeysetPagination, SaleKeysetPagination
+from ..sale_filters import filter_sales
+from .. import autocomplete, customers
 from django.views.decorators.cache import never_cache, cache_control
 from django import forms
 from django.shortcuts import render, redirect
@@ -67,7 +74,7 @@ def search_vehicles(request):
 @never_cache
 @login_required
 def index(request):
-    products = Product.objects.all() 
+    products = Product.objects.prefetch_related('vehicles')
     print(products)
     context ={
         "products":products
@@ -100,7 +107,7 @@ def product_create(request):
 
 @login_required
 def list_of_products(request):
-    products = Product.objects.all()
+    products = Product.objects.prefetch_related('vehicles')
     vehicles = Vehicle.objects.all()
     context ={
         "products":products,
@@ -118,32 +125,30 @@ def product_list(request):
     price_min = request.GET.get('price_min', '')
     price_max = request.GET.get('price_max', '')
 
-    p = Product.objects.all().select_related().prefetch_related('vehicles')
-    # Search
-    if query:
-        products = p.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(brand__icontains=query) |
-            Q(part_number__icontains=query)
-        )
+    products = Product.objects.all().select_related().prefetch_related('vehicles')
 
     # Brand filter
     if brand_filter:
-        products = p.filter(brand__iexact=brand_filter)
+        products = products.filter(brand__iexact=brand_filter)
 
     # Vehicle filter
     if vehicle_filter:
-        products = p.filter(Q(vehicles__name__icontains=vehicle_filter))
+        products = products.filter(Q(vehicles__name__icontains=vehicle_filter)).distinct()
 
     # Price range
     if price_min:
-        products = p.filter(price__gte=price_min)
+        products = products.filter(price__gte=price_min)
     if price_max:
-        products = p.filter(price__lte=price_max)
+        products = products.filter(price__lte=price_max)
+
+    # Search last, it ranks (and orders) whatever the filters left
+    if query:
+        products = search_product_queryset(products, query)
+    else:
+        products = products.order_by('-id')
 
     # Pagination
-    paginator = Paginator(p.distinct(), 10)  # 10 per page
+    paginator = Paginator(products, 10)  # 10 per page
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -170,7 +175,7 @@ def product_details(request, pk):
     Designed to return an HTML fragment for HTMX consumption.
     """
     # Use get_object_or_404 to fetch the product or return a 404 error
-    product = get_object_or_404(Product, pk=pk)
+    product = get_object_or_404(Product.objects.prefetch_related('vehicles'), pk=pk)
     
     context = {
         'product': product,
@@ -202,7 +207,7 @@ def product_delete(request, pk):
     # HTMX uses the 'HX-Trigger' header to trigger client-side events.
     # response['HX-Trigger'] = '{"productDeleted": true, "message": "Bidhaa ' + product_name + ' imefutwa."}'
 
-    return render (request, "products/list.html", {"products": Product.objects.all()})
+    return render (request, "products/list.html", {"products": Product.objects.prefetch_related('vehicles')})
 
     # Option 2: If the delete button was on the list page (table row), 
     # the HTMX request would simply target and remove the table row, and the view
@@ -314,8 +319,20 @@ def sales_delete(request):
 
 @login_required
 def list_sales(request):
-    sales = Sale.objects.select_related('product').order_by('-date_sold')
-    return render(request, 'sales/list.html', {'sales': sales})
+    # One keyset page at a time (?cursor=), same filters as list_sales_api
+    paginator = SaleKeysetPagination()
+    try:
+        sales = paginator.paginate_queryset(
+            filter_sales(Sale.objects.select_related('product'), request.GET), Request(request)
+        )
+    except (ValueError, NotFound):
+        raise Http404("Invalid sales filter or cursor")
+    # The next page keeps the filters, only the cursor changes
+    filters = request.GET.copy()
+    filters.pop('cursor', None)
+    return render(request, 'sales/list.html', {
+        'sales': sales, 'next_cursor': paginator.next_cursor, 'filters': filters.urlencode(),
+    })
 
 
 @login_required
@@ -395,17 +412,25 @@ def create_sale(request):
     if request.method == 'POST':
         form = SaleForm(request.POST)
         if form.is_valid():
-            form.save()
-            return redirect(reverse('list_sales'))
+            try:
+                form.save()
+            except InsufficientStock as e:
+                form.add_error('quantity_sold', e.message)
+            else:
+                return redirect(reverse('list_sales'))
     return render(request, 'sales/create.html', {'form': form})
 
 @login_required
 def search_products(request):
-    query = request.GET.get('query', '')
+    # Hit on every keystroke from sales/create.html (which sends ?q=), so it
+    # is answered from the in-memory prefix index instead of the database.
+    query = request.GET.get('q') or request.GET.get('query', '')
     if query:
-        # Assuming your Product model has a 'name' field
-        products = Product.objects.filter(name__icontains=query)
-        results = [{"id": product.id, "text": product.name} for product in products]
+        index = autocomplete.get_index(autocomplete.scope_for_user(request.user))
+        results = [
+            {"id": row["id"], "text": row["name"]}
+            for row in index.lookup(query, autocomplete.MAX_LIMIT)
+        ]
     else:
         results = []
     return JsonResponse({"products": results})
@@ -417,8 +442,12 @@ def edit_sale(request, pk):
     if request.method == 'POST':
         form = SaleForm(request.POST, instance=sale)
         if form.is_valid():
-            form.save()
-            return redirect(reverse('list_sales'))
+            try:
+                form.save()
+            except InsufficientStock as e:
+                form.add_error('quantity_sold', e.message)
+            else:
+                return redirect(reverse('list_sales'))
     return render(request, 'sales/edit.html', {'form': form, 'sale': sale})
 
 
@@ -484,48 +513,93 @@ class CustomerForm(forms.ModelForm):
         model = Customer
         fields = ['name', 'email', 'phone', 'remaining_balance']
 
+    def __init__(self, *args, business=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The directory the customer goes in: the instance's on edits
+        self.business = self.instance.business if self.instance.pk else business
+
+    def clean_name(self):
+        name = self.cleaned_data['name']
+        if customers.name_taken(self.business, name, exclude_pk=self.instance.pk):
+            raise forms.ValidationError(customers.NAME_TAKEN_MESSAGE)
+        return name
+
 
 # Customer Create View (Create)
-class CustomerCreateView(CreateView):
+class CustomerCreateView(LoginRequiredMixin, CreateView):
     model = Customer
     template_name = 'customers/customer_form.html'
-    # form_class = forms.ModelForm
-    fields = ['name', 'email', 'phone', 'sale', 'remaining_balance']
+    form_class = CustomerForm
+
+    def get_form_kwargs(self):
+        # Goes in the creator's business directory
+        return {**super().get_form_kwargs(), 'business': self.request.user.businesses.first()}
+
+    def form_valid(self, form):
+        form.instance.business = form.business
+        return super().form_valid(form)
 
     def get_success_url(self):
         return reverse_lazy('customer_list')  # Redirect to the customer list after success
 
 # Customer List View (Read all)
-class CustomerListView(ListView):
+class CustomerListView(LoginRequiredMixin, ListView):
     model = Customer
     template_name = 'customers/customer_list.html'
     context_object_name = 'customers'
 
+    def get_queryset(self):
+        # One A-Z keyset page of the business's customers at a time
+        # (?cursor=, ?q=), same as customers_api/
+        queryset = customers.directory(self.request.user)
+        if self.request.GET.get('q'):
+            queryset = customers.search(queryset, self.request.GET['q'])
+        self.keyset = CustomerKeysetPagination()
+        try:
+            return self.keyset.paginate_queryset(queryset, Request(self.request))
+        except NotFound:
+            raise Http404("Invalid cursor")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.keyset.next_cursor
+        context['q'] = self.request.GET.get('q', '')
+        return context
+
 
 # Customer Detail View (Read one)
-class CustomerDetailView(DetailView):
+class CustomerDetailView(LoginRequiredMixin, DetailView):
     model = Customer
     template_name = 'customers/customer_detail.html'
     context_object_name = 'customer'
 
+    def get_queryset(self):
+        return customers.directory(self.request.user)
+
 
 # Customer Update View (Update)
-class CustomerUpdateView(UpdateView):
+class CustomerUpdateView(LoginRequiredMixin, UpdateView):
     model = Customer
     template_name = 'customers/customer_form.html'
-    fields = ['name', 'email', 'phone', 'sale', 'remaining_balance']
+    form_class = CustomerForm
+
+    def get_queryset(self):
+        return customers.directory(self.request.user)
 
     def get_success_url(self):
         return reverse_lazy('customer_list')  # Redirect to the customer list after success
 
 
 # Customer Delete View (Delete)
-class CustomerDeleteView(DeleteView):
+class CustomerDeleteView(LoginRequiredMixin, DeleteView):
     model = Customer
     template_name = 'customers/customer_confirm_delete.html'
     context_object_name = 'customer'
     success_url = reverse_lazy('customer_list')  # Redirect to the customer list after deletion
 
+    def get_queryset(self):
+        return customers.directory(self.request.user)
+
 
 def terms_of_services(request):
     return render(request, 'terms_of_services.html')
@@ -37,13 +37,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-        #        "django.middleware.cache.UpdateCacheMiddleware",
+    # No site-wide page cache (UpdateCacheMiddleware/FetchFromCacheMiddleware):
+    # it keys on the URL alone and API responses depend on who is asking.
+    # Lists are cached per user by home/list_cache.py instead.
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.cache.UpdateCacheMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.cache.FetchFromCacheMiddleware',
+    'home.middleware.ApiVaryMiddleware',
     #'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -308,7 +309,22 @@ REST_FRAMEWORK = {
      'DEFAULT_PERMISSION_CLASSES': [
          'rest_framework.permissions.AllowAny',
          'rest_framework.permissions.IsAuthenticated',
-     ]
+     ],
+     # JSON stays the default, msgpack only when the client asks for it
+     # through Accept / Content-Type, see home/renderers.py
+     'DEFAULT_RENDERER_CLASSES': [
+         'rest_framework.renderers.JSONRenderer',
+         'rest_framework.renderers.BrowsableAPIRenderer',
+         'home.renderers.MessagePackRenderer',
+         'home.renderers.LZ4MessagePackRenderer',
+     ],
+     'DEFAULT_PARSER_CLASSES': [
+         'rest_framework.parsers.JSONParser',
+         'rest_framework.parsers.FormParser',
+         'rest_framework.parsers.MultiPartParser',
+         'home.renderers.MessagePackParser',
+         'home.renderers.LZ4MessagePackParser',
+     ],
 } 
 
 INSTALLED_APPS += ['knox']
@@ -375,11 +391,22 @@ SIMPLE_JWT = {
     "CHECK_USER_IS_ACTIVE": True,
 }
 
+# Shared by every worker: the list cache (home/list_cache.py) and the
+# autocomplete versions only stay correct across workers with one cache, so
+# no per-process backend here. Same Redis as CHANNEL_LAYERS.
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/1",
+        "KEY_PREFIX": "onepoint",
     }
 }
+# Seconds a cached list response is kept (home/list_cache.py)
+LIST_CACHE_TIMEOUT = 60 * 60
+
+# Top sellers leaderboard (home/leaderboard.py), shared by every worker.
+# None (or Redis down at startup) keeps it in each process's memory.
+LEADERBOARD_REDIS_URL = "redis://127.0.0.1:6379/2"
 
 import os
 